@@ -1,88 +1,443 @@
-import pandas as pd
-import pyarrow.parquet as pq
-import os
-import csv
-import time
-from tqdm import tqdm  # 进度条支持（可选）
-
-
-def convert_parquet_to_csv(input_parquet, output_csv, sample_rows=10000):
-    """
-    高效读取大型Parquet文件的前N行并保存为CSV（解决乱码问题）
-
-    参数:
-        input_parquet: Parquet文件路径（如 "C:/path/to/file.parquet"）
-        output_csv: 输出CSV路径
-        sample_rows: 提取行数（默认10000）
-    """
-    print(f"开始处理文件: {input_parquet}")
-    start_time = time.time()
-
-    try:
-        # 方法1：使用PyArrow直接读取（内存效率更高）
-        parquet_file = pq.ParquetFile(input_parquet)
-
-        # 获取总行数信息
-        total_rows = parquet_file.metadata.num_rows
-        print(f"文件总行数: {total_rows:,} | 目标提取行数: {sample_rows}")
-
-        # 分批次读取（避免内存不足）
-        batches = []
-        remaining_rows = sample_rows
-
-        for batch in tqdm(
-            parquet_file.iter_batches(batch_size=100000), desc="读取进度"
-        ):
-            batches.append(batch)
-            remaining_rows -= len(batch)
-            if remaining_rows <= 0:
-                break
-
-        # 合并批次并截取所需行数
-        table = pa.Table.from_batches(batches)
-        df = table.to_pandas().head(sample_rows)
-
-    except Exception as e:
-        print(f"PyArrow读取失败: {e} \n回退到Pandas方式...")
-        # 方法2：使用Pandas作为备选
-        df = pd.read_parquet(input_parquet).head(sample_rows)
-
-    # 处理可能的乱码问题
-    for col in df.columns:
-        # 处理二进制列
-        if df[col].dtype == object and isinstance(df[col].iloc[0], (bytes, bytearray)):
-            df[col] = df[col].apply(
-                lambda x: x.decode('utf-8', errors='replace') if x else None
-            )
-        # 处理其他非字符串列
-        elif not pd.api.types.is_string_dtype(df[col]):
-            df[col] = df[col].astype(str)
-
-    # 保存CSV（解决中文乱码）
-    df.to_csv(
-        output_csv,
-        index=False,
-        encoding='utf-8-sig',  # 添加BOM头（兼容Excel）
-        quoting=csv.QUOTE_NONNUMERIC,  # 非数字内容加引号
-        escapechar='\\',  # 转义特殊字符
-    )
-
-    # 打印统计信息
-    end_time = time.time()
-    input_size = os.path.getsize(input_parquet) / (1024**3)  # GB
-    output_size = os.path.getsize(output_csv) / (1024**2)  # MB
-
-    print(f"\n转换完成！")
-    print(f"- 输入文件: {input_parquet} ({input_size:.2f} GB)")
-    print(f"- 输出文件: {output_csv} ({output_size:.2f} MB)")
-    print(f"- 实际提取行数: {len(df)}")
-    print(f"- 耗时: {end_time - start_time:.2f} 秒")
-
-
-if __name__ == "__main__":
-    # 配置路径（根据实际修改）
-    input_parquet = "C:/Users/East/Desktop/预处理数据/10G/processed_part-00000.parquet"
-    output_csv = "C:/Users/East/Desktop/processed_part-00000.csv"
-
-    # 执行转换
-    convert_parquet_to_csv(input_parquet, output_csv)
+import os
+import json
+import time
+import sys
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+
+# 共享工具模块位于任务2目录
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "任务2")
+)
+from run_metrics import RunMetrics
+from profiling import run_profiled
+
+# 配置参数（命令行参数可覆盖）
+input_parquet = "C:/Users/East/Desktop/预处理数据/10G/processed_part-00000.parquet"
+output_path = "C:/Users/East/Desktop/processed_part-00000.csv"
+sample_rows = 10000  # 默认提取行数
+batch_size = 65536  # 流式写出的批大小
+max_workers = os.cpu_count() or 4  # 分片导出的并行进程数
+
+metrics = RunMetrics("trans")
+
+# 过滤运算符：字符串 -> pyarrow.compute 函数
+FILTER_OPS = {
+    '==': pc.equal,
+    '!=': pc.not_equal,
+    '>=': pc.greater_equal,
+    '<=': pc.less_equal,
+    '>': pc.greater,
+    '<': pc.less,
+}
+
+
+def parse_filter(expr):
+    """解析过滤表达式，如 "payment_status==已退款" 或 "item_count>5" """
+    # 先匹配两字符运算符，避免 ">=" 被拆成 ">"
+    for op in sorted(FILTER_OPS, key=len, reverse=True):
+        if op in expr:
+            column, value = expr.split(op, 1)
+            column, value = column.strip(), value.strip()
+            try:
+                value = json.loads(value)  # 数字/布尔按JSON解析
+            except ValueError:
+                pass  # 其余按字符串处理
+            return column, op, value
+    raise ValueError(f"无法解析过滤条件: {expr}")
+
+
+def row_group_may_match(row_group, schema, filters):
+    """根据行组统计信息判断该行组是否可能包含匹配行"""
+    for column, op, value in filters:
+        if column not in schema.names:
+            raise KeyError(f"过滤列不存在: {column}")
+        idx = schema.names.index(column)
+        stats = row_group.column(idx).statistics
+        if stats is None or not stats.has_min_max:
+            continue  # 无统计信息时只能读取
+        lo, hi = stats.min, stats.max
+        try:
+            if op == '==' and (value < lo or value > hi):
+                return False
+            if op in ('>', '>=') and (hi < value or (op == '>' and hi == value)):
+                return False
+            if op in ('<', '<=') and (lo > value or (op == '<' and lo == value)):
+                return False
+        except TypeError:
+            continue  # 统计值与过滤值类型不可比
+    return True
+
+
+def decode_binary_columns(batch):
+    """向量化解码二进制列为UTF-8字符串（解决乱码问题）"""
+    columns = []
+    fields = []
+    for field, column in zip(batch.schema, batch.columns):
+        if pa.types.is_binary(field.type) or pa.types.is_large_binary(field.type):
+            try:
+                # 整列一次性校验并转换
+                column = column.cast(pa.string())
+            except pa.ArrowInvalid:
+                # 含非法UTF-8时逐值替换，仅在脏数据上退化
+                column = pa.array(
+                    [
+                        v.decode('utf-8', errors='replace') if v else None
+                        for v in column.to_pylist()
+                    ],
+                    type=pa.string(),
+                )
+            field = pa.field(field.name, pa.string())
+        columns.append(column)
+        fields.append(field)
+    return pa.RecordBatch.from_arrays(columns, schema=pa.schema(fields))
+
+
+def encode_nested_columns(batch):
+    """列表/结构等嵌套列编码为JSON字符串（CSV不支持嵌套类型，如item_ids、items）"""
+    columns = []
+    fields = []
+    for field, column in zip(batch.schema, batch.columns):
+        if pa.types.is_nested(field.type):
+            column = pa.array(
+                [
+                    (
+                        None
+                        if v is None
+                        else json.dumps(v, ensure_ascii=False, default=str)
+                    )
+                    for v in column.to_pylist()
+                ],
+                type=pa.string(),
+            )
+            field = pa.field(field.name, pa.string())
+        columns.append(column)
+        fields.append(field)
+    return pa.RecordBatch.from_arrays(columns, schema=pa.schema(fields))
+
+
+def apply_filters(batch, filters):
+    """在批次上应用过滤条件"""
+    if not filters:
+        return batch
+    mask = None
+    for column, op, value in filters:
+        cond = FILTER_OPS[op](batch.column(column), pa.scalar(value))
+        mask = cond if mask is None else pc.and_(mask, cond)
+    return batch.filter(pc.fill_null(mask, False))
+
+
+class BatchWriter:
+    """流式写出器：CSV / JSONL / Arrow IPC，按批写出保持内存恒定"""
+
+    def __init__(self, path, fmt, schema):
+        self.path = path
+        self.fmt = fmt
+        self.rows = 0
+        if fmt == 'csv':
+            self.sink = open(path, 'wb')
+            self.sink.write('\ufeff'.encode('utf-8'))  # 添加BOM头（兼容Excel）
+            empty = pa.RecordBatch.from_pylist([], schema=schema)
+            self.writer = pacsv.CSVWriter(
+                self.sink, encode_nested_columns(empty).schema
+            )
+        elif fmt == 'jsonl':
+            self.sink = open(path, 'w', encoding='utf-8')
+            self.writer = None
+        elif fmt == 'arrow':
+            self.sink = pa.OSFile(path, 'wb')
+            self.writer = pa.ipc.new_file(self.sink, schema)
+        else:
+            raise ValueError(f"不支持的输出格式: {fmt}")
+
+    def write(self, batch):
+        if batch.num_rows == 0:
+            return
+        if self.fmt == 'jsonl':
+            df = batch.to_pandas()
+            self.sink.write(
+                df.to_json(
+                    orient='records',
+                    lines=True,
+                    force_ascii=False,
+                    date_format='iso',
+                )
+            )
+        elif self.fmt == 'csv':
+            self.writer.write_batch(encode_nested_columns(batch))
+        else:
+            self.writer.write_batch(batch)
+        self.rows += batch.num_rows
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.sink.close()
+
+
+def output_schema(parquet_file, columns=None):
+    """计算解码后的输出Schema"""
+    schema = parquet_file.schema_arrow
+    if columns:
+        schema = pa.schema([schema.field(c) for c in columns])
+    empty = pa.RecordBatch.from_pylist([], schema=schema)
+    return decode_binary_columns(empty).schema
+
+
+def iter_row_groups(parquet_file, row_groups, columns=None):
+    """逐个行组流式读取"""
+    for rg in row_groups:
+        for batch in parquet_file.iter_batches(
+            batch_size=batch_size, row_groups=[rg], columns=columns
+        ):
+            yield rg, batch
+
+
+def row_group_offsets(metadata):
+    """返回每个行组的起始行号"""
+    sizes = [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)]
+    return np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+
+
+def iter_range(parquet_file, start, stop, columns=None):
+    """读取[start, stop)行，只访问相交的行组"""
+    offsets = row_group_offsets(parquet_file.metadata)
+    first = int(np.searchsorted(offsets, start, side='right')) - 1
+    row_groups = [
+        rg for rg in range(max(first, 0), len(offsets) - 1) if offsets[rg] < stop
+    ]
+    current = None
+    for rg, batch in iter_row_groups(parquet_file, row_groups, columns):
+        # 每个批次在文件中的全局起始行号
+        if rg != current:
+            current, batch_start = rg, int(offsets[rg])
+        lo = max(start - batch_start, 0)
+        hi = min(stop - batch_start, batch.num_rows)
+        if hi > lo:
+            yield batch.slice(lo, hi - lo)
+        batch_start += batch.num_rows
+        if batch_start >= stop:
+            break  # 区间已读完，之后的批次不再读取解码
+
+
+def iter_sample(parquet_file, n, seed, columns=None):
+    """按种子无放回随机抽样n行，只读取包含样本的行组"""
+    metadata = parquet_file.metadata
+    total = metadata.num_rows
+    rng = np.random.default_rng(seed)
+    picks = np.sort(rng.choice(total, size=min(n, total), replace=False))
+    offsets = row_group_offsets(metadata)
+    for rg in range(metadata.num_row_groups):
+        lo, hi = np.searchsorted(picks, [offsets[rg], offsets[rg + 1]])
+        if lo == hi:
+            continue  # 该行组没有被抽中的行，直接跳过
+        local = picks[lo:hi] - offsets[rg]
+        table = parquet_file.read_row_group(rg, columns=columns)
+        for batch in table.take(pa.array(local)).to_batches(max_chunksize=batch_size):
+            yield batch
+
+
+def iter_filtered(parquet_file, filters, columns=None, limit=None):
+    """按条件提取，利用行组统计信息跳过不可能匹配的行组"""
+    metadata = parquet_file.metadata
+    schema = parquet_file.schema
+    row_groups = [
+        rg
+        for rg in range(metadata.num_row_groups)
+        if row_group_may_match(metadata.row_group(rg), schema, filters)
+    ]
+    # 过滤列必须读取，输出时再投影回用户指定的列
+    read_columns = None
+    if columns:
+        read_columns = list(dict.fromkeys(columns + [f[0] for f in filters]))
+    emitted = 0
+    for _, batch in iter_row_groups(parquet_file, row_groups, read_columns):
+        batch = apply_filters(batch, filters)
+        if columns:
+            batch = batch.select(columns)
+        if limit is not None:
+            batch = batch.slice(0, limit - emitted)
+        emitted += batch.num_rows
+        yield batch
+        if limit is not None and emitted >= limit:
+            return
+
+
+def export_shard(input_path, output_file, fmt, row_groups, columns):
+    """导出一个分片（在子进程中执行）"""
+    parquet_file = pq.ParquetFile(input_path)
+    writer = BatchWriter(output_file, fmt, output_schema(parquet_file, columns))
+    try:
+        for _, batch in iter_row_groups(parquet_file, row_groups, columns):
+            writer.write(decode_binary_columns(batch))
+    finally:
+        writer.close()
+    return writer.rows
+
+
+def export_sharded(input_path, output_path, fmt='csv', shards=None, columns=None):
+    """全量导出：按行组切分为多个分片并行写出"""
+    parquet_file = pq.ParquetFile(input_path)
+    num_row_groups = parquet_file.metadata.num_row_groups
+    shards = min(shards or max_workers, max(num_row_groups, 1))
+    base, ext = os.path.splitext(output_path)
+
+    tasks = []
+    for i in range(shards):
+        row_groups = list(range(i, num_row_groups, shards))
+        tasks.append((f"{base}-{i:05d}{ext}", row_groups))
+
+    with ProcessPoolExecutor(max_workers=shards) as executor:
+        futures = [
+            executor.submit(export_shard, input_path, path, fmt, rgs, columns)
+            for path, rgs in tasks
+        ]
+        rows = sum(f.result() for f in futures)
+    return [path for path, _ in tasks], rows
+
+
+def export_parquet(
+    input_path,
+    output_path,
+    mode='head',
+    fmt='csv',
+    rows=sample_rows,
+    start=0,
+    stop=None,
+    seed=42,
+    filters=None,
+    columns=None,
+):
+    """
+    从大型Parquet文件中按需提取数据并流式导出
+
+    参数:
+        mode: head（前N行）/ range（[start, stop)）/ sample（随机抽样）/
+              filter（条件提取）/ full（全量分片导出）
+        fmt: csv / jsonl / arrow
+        filters: [(列名, 运算符, 值), ...]
+    """
+    print(f"开始处理文件: {input_path}")
+    start_time = time.time()
+
+    parquet_file = pq.ParquetFile(input_path)
+    total_rows = parquet_file.metadata.num_rows
+    print(
+        f"文件总行数: {total_rows:,} | 行组数: {parquet_file.metadata.num_row_groups}"
+    )
+
+    name = os.path.basename(input_path)
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    if mode == 'full':
+        with metrics.phase('export', file=name) as m:
+            outputs, written = export_sharded(
+                input_path, output_path, fmt, columns=columns
+            )
+            m.rows = written
+    else:
+        if mode == 'head':
+            batches = iter_range(parquet_file, 0, rows, columns)
+        elif mode == 'range':
+            batches = iter_range(
+                parquet_file,
+                start,
+                total_rows if stop is None else stop,
+                columns,
+            )
+        elif mode == 'sample':
+            batches = iter_sample(parquet_file, rows, seed, columns)
+        elif mode == 'filter':
+            batches = iter_filtered(parquet_file, filters or [], columns, limit=rows)
+        else:
+            raise ValueError(f"不支持的导出模式: {mode}")
+
+        # 读取/解码/写出按批流水进行，分别累计耗时
+        writer = BatchWriter(output_path, fmt, output_schema(parquet_file, columns))
+        try:
+            while True:
+                with metrics.phase('read', file=name) as m:
+                    batch = next(batches, None)
+                    m.rows = batch.num_rows if batch is not None else 0
+                    m.bytes = batch.nbytes if batch is not None else 0
+                if batch is None:
+                    break
+                with metrics.phase('decode', file=name) as m:
+                    batch = decode_binary_columns(batch)
+                    m.rows = batch.num_rows
+                with metrics.phase('write', file=name) as m:
+                    writer.write(batch)
+                    m.rows = batch.num_rows
+        finally:
+            writer.close()
+        outputs, written = [output_path], writer.rows
+
+    # 打印统计信息
+    end_time = time.time()
+    input_size = os.path.getsize(input_path) / (1024**3)  # GB
+    output_size = sum(os.path.getsize(p) for p in outputs) / (1024**2)  # MB
+
+    print("\n转换完成！")
+    print(f"- 输入文件: {input_path} ({input_size:.2f} GB)")
+    print(f"- 输出文件: {', '.join(outputs)} ({output_size:.2f} MB)")
+    print(f"- 实际提取行数: {written}")
+    print(f"- 耗时: {end_time - start_time:.2f} 秒")
+    metrics.write(os.path.dirname(os.path.abspath(output_path)))
+    return outputs
+
+
+def convert_parquet_to_csv(input_parquet, output_csv, sample_rows=sample_rows):
+    """读取大型Parquet文件的前N行并保存为CSV（兼容旧接口）"""
+    return export_parquet(input_parquet, output_csv, mode='head', rows=sample_rows)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Parquet 抽样/导出工具")
+    parser.add_argument('input', nargs='?', default=input_parquet)
+    parser.add_argument('output', nargs='?', default=output_path)
+    parser.add_argument(
+        '--mode',
+        default='head',
+        choices=['head', 'range', 'sample', 'filter', 'full'],
+    )
+    parser.add_argument('--format', default=None, choices=['csv', 'jsonl', 'arrow'])
+    parser.add_argument('--rows', type=int, default=sample_rows)
+    parser.add_argument('--start', type=int, default=0)
+    parser.add_argument('--stop', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument(
+        '--filter', action='append', default=[], help="如 payment_status==已退款"
+    )
+    parser.add_argument('--columns', default=None, help="逗号分隔的列名")
+    return parser.parse_known_args()
+
+
+def main(args):
+    # 未指定格式时按输出文件扩展名推断
+    fmt = args.format or {'.jsonl': 'jsonl', '.arrow': 'arrow'}.get(
+        os.path.splitext(args.output)[1], 'csv'
+    )
+    export_parquet(
+        args.input,
+        args.output,
+        mode=args.mode,
+        fmt=fmt,
+        rows=args.rows,
+        start=args.start,
+        stop=args.stop,
+        seed=args.seed,
+        filters=[parse_filter(f) for f in args.filter],
+        columns=args.columns.split(',') if args.columns else None,
+    )
+
+
+if __name__ == "__main__":
+    # 分析开关（--profile / --trace-alloc）由 run_profiled 处理
+    args, _ = parse_args()
+    output_dir = os.path.dirname(os.path.abspath(args.output))
+    run_profiled(main, output_dir, "trans", args)
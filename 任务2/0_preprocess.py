@@ -1,146 +1,455 @@
-import os
-import json
-import pandas as pd
-
-
-INPUT_DIR = "C:/Users/East/Desktop/原数据/30G_data_new"  # 输入目录路径
-PROCESSED_DIR = "C:/Users/East/Desktop/预处理数据/30G"  # 输出目录路径
-PRODUCT_CATALOG_FILE = "C:/Users/East/Desktop/code/数据挖掘/任务2/product_catalog.json"
-
-
-def create_category_mapper():
-    # 商品分类层级映射
-    category_tree = {
-        "电子产品": [
-            "智能手机",
-            "笔记本电脑",
-            "平板电脑",
-            "智能手表",
-            "耳机",
-            "音响",
-            "相机",
-            "摄像机",
-            "游戏机",
-        ],
-        "服装": [
-            "上衣",
-            "裤子",
-            "裙子",
-            "内衣",
-            "鞋子",
-            "帽子",
-            "手套",
-            "围巾",
-            "外套",
-        ],
-        "食品": [
-            "零食",
-            "饮料",
-            "调味品",
-            "米面",
-            "水产",
-            "肉类",
-            "蛋奶",
-            "水果",
-            "蔬菜",
-        ],
-        "家居": ["家具", "床上用品", "厨具", "卫浴用品"],
-        "办公": ["文具", "办公用品"],
-        "运动户外": ["健身器材", "户外装备"],
-        "玩具": ["玩具", "模型", "益智玩具"],
-        "母婴": ["婴儿用品", "儿童课外读物"],
-        "汽车用品": ["车载电子", "汽车装饰"],
-    }
-
-    # 反向映射：子类别 -> 父类别
-    reverse_mapper = {}
-    for parent, children in category_tree.items():
-        for child in children:
-            reverse_mapper[child] = parent
-    return reverse_mapper
-
-
-def load_product_catalog():
-    """加载商品目录并创建映射"""
-    with open(PRODUCT_CATALOG_FILE, 'r', encoding='utf-8') as f:
-        catalog = json.load(f)
-
-    category_mapper = create_category_mapper()
-
-    product_map = {}
-    for product in catalog['products']:
-        parent_category = category_mapper.get(product['category'], "其他")
-        product_map[product['id']] = {
-            'parent_category': parent_category,
-            'sub_category': product['category'],
-            'price': product['price'],
-        }
-    return product_map
-
-
-def process_purchase_history(record, product_map):
-    """处理单个购买记录"""
-    try:
-        history = json.loads(record)
-        items = history.get('items', [])
-
-        item_details = []
-        for item in items:
-            product = product_map.get(item['id'], {})
-            item_details.append(
-                {
-                    'parent_category': product.get('parent_category', '未知'),
-                    'sub_category': product.get('sub_category', '未知'),
-                    'price': product.get('price', 0.0),
-                }
-            )
-
-        return {
-            'payment_method': history.get('payment_method', ''),
-            'payment_status': history.get('payment_status', ''),
-            'purchase_date': pd.to_datetime(history.get('purchase_date', '')),
-            'items_json': json.dumps(item_details, ensure_ascii=False),
-            'total_price': sum(item['price'] for item in item_details),
-            'item_count': len(items),
-        }
-    except Exception as e:
-        print(f"处理错误：{str(e)}")
-        return None
-
-
-def process_single_file(input_path, output_path, product_map):
-    """处理单个文件"""
-    df = pd.read_parquet(input_path)
-
-    # 处理每条记录
-    processed_data = []
-    for _, row in df.iterrows():
-        result = process_purchase_history(row['purchase_history'], product_map)
-        if result:
-            processed_data.append(result)
-
-    # 保存处理结果
-    pd.DataFrame(processed_data).to_parquet(output_path)
-    print(
-        f"已处理完成：{os.path.basename(input_path)} → {os.path.basename(output_path)}"
-    )
-
-
-def main():
-    # 创建输出目录
-    os.makedirs(PROCESSED_DIR, exist_ok=True)
-
-    # 加载商品数据
-    product_map = load_product_catalog()
-    print(f"已加载 {len(product_map)} 条商品映射信息")
-
-    # 处理所有文件
-    for filename in os.listdir(INPUT_DIR):
-        if filename.endswith(".parquet"):
-            input_file = os.path.join(INPUT_DIR, filename)
-            output_file = os.path.join(PROCESSED_DIR, f"processed_{filename}")
-            process_single_file(input_file, output_file, product_map)
-
-
-if __name__ == "__main__":
-    main()
+import os
+import json
+import argparse
+import multiprocessing
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from run_metrics import RunMetrics, parquet_bytes
+from profiling import run_profiled
+from dead_letter import DEAD_LETTER_DIR, DeadLetterSink
+from partial_cache import file_fingerprint
+from lease import LeaseManager, default_worker_id, task_key
+from catalog import load_product_catalog, product_map_fingerprint
+from dataset_io import arrow_path, write_arrow
+from bitmap_index import BitmapIndex, index_path
+from stages import run_script_function
+from order_items import ITEMS, ITEM_TYPE, ITEM_DICTIONARY_COLUMNS
+
+INPUT_DIR = "C:/Users/East/Desktop/原数据/30G_data_new"  # 输入目录路径
+PROCESSED_DIR = "C:/Users/East/Desktop/预处理数据/30G"  # 输出目录路径
+PRODUCT_CATALOG_FILE = "C:/Users/East/Desktop/code/数据挖掘/任务2/product_catalog.json"
+OUTPUT_PROFILE = "balanced"  # 输出存储配置，见 OUTPUT_PROFILES
+# 输出格式：parquet / arrow / both
+#   arrow 为未压缩的Arrow IPC文件，分析脚本以内存映射方式零拷贝读取，省去解压与解码；
+#   体积约为Parquet的数倍，适合在同一台机器上反复运行分析
+OUTPUT_FORMAT = "parquet"
+# 为每个输出文件写出旁路位图索引（同名 .bitmap）：各父类别、各支付状态 -> 行号，
+# 筛选类分析（退款、目标类别）据此只读取命中的行组与行
+BITMAP_INDEX = True
+
+# 多机分布式处理：各机器运行 --distributed，共享输入/输出目录，通过租约文件认领任务
+DISTRIBUTED = False
+WORKER_ID = None  # 工作进程标识，默认 主机名-进程号
+LOCAL_WORKERS = 0  # 大于0时在本机启动N个分布式工作进程（单机测试或多核并行）
+LEASE_DIR = None  # 租约目录，默认 PROCESSED_DIR/.leases
+LEASE_TTL = 60.0  # 超过该秒数未心跳的租约视为失效，可被回收
+ROW_GROUPS_PER_TASK = None  # 大文件按N个行组切分为多个任务，None表示整个文件为一个任务
+# 本机工作进程需要的配置：spawn方式启动的子进程会重新加载本脚本，命令行参数等对
+# 模块级配置的覆盖不会继承，需显式传入
+WORKER_SETTINGS = [
+    'INPUT_DIR',
+    'PROCESSED_DIR',
+    'PRODUCT_CATALOG_FILE',
+    'OUTPUT_PROFILE',
+    'OUTPUT_FORMAT',
+    'BITMAP_INDEX',
+    'LEASE_DIR',
+    'LEASE_TTL',
+    'ROW_GROUPS_PER_TASK',
+]
+
+# 输出存储配置
+#   compression / compression_level: 压缩算法与级别（zstd 1-22）
+#   row_group_size: 行组行数，与下游按批扫描的 batch_size 对齐
+#   dictionary_columns: 低基数字符串列，写为字典编码（读回为category类型）
+#   sort_by: 写出前排序的列，使行组统计信息更集中，便于跳过行组
+OUTPUT_PROFILES = {
+    # 与旧版输出一致：pandas默认设置
+    'legacy': {
+        'compression': 'snappy',
+        'compression_level': None,
+        'row_group_size': None,
+        'dictionary_columns': [],
+        'sort_by': None,
+    },
+    'balanced': {
+        'compression': 'zstd',
+        'compression_level': 3,
+        'row_group_size': 65536,
+        'dictionary_columns': ['payment_method', 'payment_status'],
+        'sort_by': None,
+    },
+    # 体积最小，按日期排序，适合按时间范围过滤的分析
+    'compact': {
+        'compression': 'zstd',
+        'compression_level': 9,
+        'row_group_size': 65536,
+        'dictionary_columns': ['payment_method', 'payment_status'],
+        'sort_by': ['purchase_date'],
+    },
+    # 按支付状态排序，退款分析可按行组统计直接跳过非退款行组
+    'by_status': {
+        'compression': 'zstd',
+        'compression_level': 3,
+        'row_group_size': 65536,
+        'dictionary_columns': ['payment_method', 'payment_status'],
+        'sort_by': ['payment_status', 'purchase_date'],
+    },
+}
+
+# 预处理输出的列类型；某个文件的记录全部被隔离时按此写出空文件
+PROCESSED_DTYPES = {
+    'user_id': 'int64',
+    'payment_method': 'str',
+    'payment_status': 'str',
+    'purchase_date': 'datetime64[us]',
+    ITEMS: 'object',
+    'item_ids': 'object',
+    'item_count': 'int64',
+}
+INT32_MAX = 2**31 - 1  # item_ids 写为int32
+
+metrics = RunMetrics("0_preprocess")
+dead_letters = DeadLetterSink("0_preprocess")
+
+
+def item_id(value):
+    """校验商品ID：需为int32范围内的整数，否则抛出异常（整条记录被隔离）"""
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise TypeError(f"商品ID不是整数：{value!r}")
+    if not 0 <= value <= INT32_MAX:
+        raise ValueError(f"商品ID超出范围：{value}")
+    return value
+
+
+def process_purchase_history(record, product_map):
+    """处理单个购买记录（格式错误时抛出异常，由调用方隔离）"""
+    history = json.loads(record)
+    items = history.get('items', [])
+    item_ids = [item_id(item['id']) for item in items]
+
+    item_details = []
+    for product_id in item_ids:
+        product = product_map.get(product_id, {})
+        item_details.append(
+            {
+                'parent_category': product.get('parent_category', '未知'),
+                'sub_category': product.get('sub_category', '未知'),
+                'price': product.get('price', 0.0),
+            }
+        )
+
+    return {
+        'payment_method': history.get('payment_method', ''),
+        'payment_status': history.get('payment_status', ''),
+        'purchase_date': pd.to_datetime(history.get('purchase_date', '')),
+        ITEMS: item_details,
+        # 原始商品ID（与items依次对应），供商品级的共购分析使用
+        'item_ids': item_ids,
+        'item_count': len(items),
+    }
+
+
+def write_processed(
+    df,
+    output_path,
+    profile,
+    output_format="parquet",
+    bitmap_index=False,
+    catalog=None,
+):
+    """按存储配置写出预处理结果，返回写出的文件列表；catalog 为商品目录指纹"""
+    if df.empty:
+        df = pd.DataFrame(
+            {name: pd.Series(dtype=dtype) for name, dtype in PROCESSED_DTYPES.items()}
+        )
+    if profile['sort_by']:
+        df = df.sort_values(profile['sort_by'], kind='stable', ignore_index=True)
+    for column in profile['dictionary_columns']:
+        if column in df.columns:
+            df[column] = df[column].astype('category')
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if ITEMS in table.column_names:
+        table = table.set_column(
+            table.column_names.index(ITEMS),
+            ITEMS,
+            table[ITEMS].cast(pa.list_(ITEM_TYPE)),
+        )
+    if 'item_ids' in table.column_names:
+        table = table.set_column(
+            table.column_names.index('item_ids'),
+            'item_ids',
+            table['item_ids'].cast(pa.list_(pa.int32())),
+        )
+    for i, field in enumerate(table.schema):
+        if pa.types.is_dictionary(field.type) and pa.types.is_null(
+            field.type.value_type
+        ):
+            # 空文件中的字典编码列没有值，无法推断字典类型
+            string_type = pa.dictionary(field.type.index_type, pa.string())
+            table = table.set_column(i, field.name, table.column(i).cast(string_type))
+    written = []
+    if output_format in ('parquet', 'both'):
+        pq.write_table(
+            table,
+            output_path,
+            compression=profile['compression'],
+            compression_level=profile['compression_level'],
+            row_group_size=profile['row_group_size'],
+            # 只对低基数列（含商品的父类别/子类别）做字典编码，
+            # 高基数列字典编码只会增加开销
+            use_dictionary=(
+                profile['dictionary_columns'] + ITEM_DICTIONARY_COLUMNS
+                if profile['dictionary_columns']
+                else True
+            ),
+            write_statistics=True,
+        )
+        written.append(output_path)
+    if output_format in ('arrow', 'both'):
+        write_arrow(
+            table, arrow_path(output_path), max_chunksize=profile['row_group_size']
+        )
+        written.append(arrow_path(output_path))
+    if bitmap_index:
+        # 行号按排序后的顺序，在数据文件写出后建立，记录其指纹
+        BitmapIndex.build(df).write(index_path(output_path), written, catalog)
+        written.append(index_path(output_path))
+    return written
+
+
+def process_single_file(input_path, output_path, product_map, row_groups=None):
+    """处理单个文件（指定row_groups时只处理这些行组）"""
+    name = os.path.basename(input_path)
+    first_row = 0
+    with metrics.phase('read', file=name) as m:
+        if row_groups is None:
+            df = pd.read_parquet(input_path)
+        else:
+            parquet_file = pq.ParquetFile(input_path)
+            df = parquet_file.read_row_groups(row_groups).to_pandas()
+            first_row = sum(
+                parquet_file.metadata.row_group(i).num_rows
+                for i in range(row_groups[0])
+            )
+        m.rows = len(df)
+        m.bytes = parquet_bytes(input_path, row_groups=row_groups)
+
+    # 处理每条记录
+    with metrics.phase('decode', file=name) as m:
+        processed_data = []
+        for row, (user_id, record) in enumerate(
+            zip(df['id'], df['purchase_history']), first_row
+        ):
+            try:
+                processed = process_purchase_history(record, product_map)
+                # 保留用户ID，供去重买家数等按用户的统计使用
+                processed_data.append({'user_id': user_id, **processed})
+            except Exception as e:
+                dead_letters.add(name, row, e, record)
+        m.rows = len(df)
+
+    # 保存处理结果
+    with metrics.phase('write', file=name) as m:
+        written = write_processed(
+            pd.DataFrame(processed_data),
+            output_path,
+            OUTPUT_PROFILES[OUTPUT_PROFILE],
+            OUTPUT_FORMAT,
+            BITMAP_INDEX,
+            product_map_fingerprint(product_map),
+        )
+        m.rows = len(processed_data)
+        m.bytes = sum(os.path.getsize(p) for p in written)
+    print(
+        f"已处理完成：{os.path.basename(input_path)} → "
+        + ", ".join(os.path.basename(p) for p in written)
+    )
+    return written
+
+
+def list_tasks():
+    """
+    划分分布式任务：任务名 -> (输入文件名, 行组列表或None, 输出文件名)
+
+    输出文件名由任务唯一确定，重复处理同一任务只会原子覆盖同一文件，结果不会重复。
+    """
+    tasks = {}
+    for filename in sorted(os.listdir(INPUT_DIR)):
+        if not filename.endswith(".parquet"):
+            continue
+        if ROW_GROUPS_PER_TASK is None:
+            tasks[filename] = (filename, None, f"processed_{filename}")
+            continue
+        stem = filename[: -len(".parquet")]
+        num_row_groups = pq.ParquetFile(
+            os.path.join(INPUT_DIR, filename)
+        ).num_row_groups
+        for start in range(0, num_row_groups, ROW_GROUPS_PER_TASK):
+            row_groups = list(
+                range(start, min(start + ROW_GROUPS_PER_TASK, num_row_groups))
+            )
+            tasks[f"{filename}#rg{start}"] = (
+                filename,
+                row_groups,
+                f"processed_{stem}.rg{start:05d}.parquet",
+            )
+    return tasks
+
+
+def task_signatures(tasks, product_map):
+    """
+    各任务的签名：输入文件指纹、商品目录指纹与输出配置
+
+    记入完成标记，原始数据重新生成、目录或输出配置变化后任务会被重新处理。
+    """
+    catalog = product_map_fingerprint(product_map)
+    fingerprints = {}
+    signatures = {}
+    for task, (filename, row_groups, _) in tasks.items():
+        if filename not in fingerprints:
+            fingerprints[filename] = file_fingerprint(os.path.join(INPUT_DIR, filename))
+        signatures[task] = {
+            'input': fingerprints[filename],
+            'row_groups': row_groups,
+            'catalog': catalog,
+            'output': [OUTPUT_PROFILE, OUTPUT_FORMAT, BITMAP_INDEX],
+        }
+    return signatures
+
+
+def run_worker(worker_id=None, settings=None):
+    """
+    分布式工作进程：循环认领并处理任务，直到全部任务完成
+
+    settings 为父进程的 WORKER_SETTINGS 配置，在本进程中先应用再开始处理。
+    """
+    globals().update(settings or {})
+    os.makedirs(PROCESSED_DIR, exist_ok=True)
+    leases = LeaseManager(
+        LEASE_DIR or os.path.join(PROCESSED_DIR, ".leases"),
+        worker_id or WORKER_ID,
+        ttl=LEASE_TTL,
+    )
+    # 运行报告按工作进程分开写，避免多个进程写同一文件
+    label = task_key(leases.worker_id)
+
+    product_map = load_product_catalog(PRODUCT_CATALOG_FILE)
+    tasks = list_tasks()
+    signatures = task_signatures(tasks, product_map)
+    print(f"工作进程 {leases.worker_id}：共 {len(tasks)} 个任务")
+
+    # 先写入本进程的临时目录，确认仍持有租约后再原子替换为正式输出
+    tmp_dir = os.path.join(PROCESSED_DIR, f".tmp.{label}")
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    def process(task, lease):
+        filename, row_groups, output_name = tasks[task]
+        # 隔离记录按任务写出并随输出一起提交：跳过的已完成任务保留上次的记录，
+        # 重新处理的任务替换自己的记录
+        dead_letters.script = f"0_preprocess.{os.path.splitext(output_name)[0]}"
+        dead_letters.open(tmp_dir)
+        written = process_single_file(
+            os.path.join(INPUT_DIR, filename),
+            os.path.join(tmp_dir, output_name),
+            product_map,
+            row_groups,
+        )
+        quarantine = dead_letters.finish()
+        quarantine_path = os.path.join(
+            PROCESSED_DIR, DEAD_LETTER_DIR, f"{dead_letters.script}.parquet"
+        )
+        files = [(p, os.path.join(PROCESSED_DIR, os.path.basename(p))) for p in written]
+        if quarantine:
+            os.makedirs(os.path.dirname(quarantine_path), exist_ok=True)
+            files.append((quarantine, quarantine_path))
+        if not lease.commit(files):
+            print(f"租约已被回收，放弃结果：{task}")
+            return False
+        if not quarantine and os.path.exists(quarantine_path):
+            os.remove(quarantine_path)
+        return True
+
+    completed = leases.run(list(tasks), process, signatures=signatures)
+    if os.path.isdir(os.path.join(tmp_dir, DEAD_LETTER_DIR)):
+        os.rmdir(os.path.join(tmp_dir, DEAD_LETTER_DIR))
+    os.rmdir(tmp_dir)
+    metrics.count('tasks_completed', len(completed))
+    print(f"工作进程 {leases.worker_id} 完成 {len(completed)} 个任务，全部任务已完成")
+    dead_letters.close(metrics)
+    metrics.write(PROCESSED_DIR, f"run_report_0_preprocess.{label}.json")
+    return completed
+
+
+def run_local_workers(n):
+    """在本机启动N个分布式工作进程并等待结束"""
+    base = WORKER_ID or default_worker_id()
+    settings = {name: globals()[name] for name in WORKER_SETTINGS}
+    script = os.path.abspath(__file__)
+    workers = [
+        multiprocessing.Process(
+            target=run_script_function,
+            args=(script, 'run_worker', f"{base}-{i}", settings),
+        )
+        for i in range(n)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    failed = [w.name for w in workers if w.exitcode != 0]
+    if failed:
+        raise RuntimeError(f"工作进程异常退出：{failed}")
+
+
+def main():
+    if LOCAL_WORKERS:
+        return run_local_workers(LOCAL_WORKERS)
+    if DISTRIBUTED:
+        return run_worker()
+
+    # 创建输出目录
+    os.makedirs(PROCESSED_DIR, exist_ok=True)
+    dead_letters.open(PROCESSED_DIR)
+
+    # 加载商品数据
+    product_map = load_product_catalog(PRODUCT_CATALOG_FILE)
+    print(f"已加载 {len(product_map)} 条商品映射信息")
+
+    # 处理所有文件
+    for filename in os.listdir(INPUT_DIR):
+        if filename.endswith(".parquet"):
+            input_file = os.path.join(INPUT_DIR, filename)
+            output_file = os.path.join(PROCESSED_DIR, f"processed_{filename}")
+            process_single_file(input_file, output_file, product_map)
+
+    dead_letters.close(metrics)
+    metrics.write(PROCESSED_DIR)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="预处理原始购买记录")
+    parser.add_argument(
+        '--distributed',
+        action='store_true',
+        help="分布式模式：与其他机器上的工作进程共享输出目录，通过租约文件认领任务",
+    )
+    parser.add_argument('--worker-id', default=None)
+    parser.add_argument(
+        '--local-workers', type=int, default=0, help="在本机启动N个分布式工作进程"
+    )
+    parser.add_argument('--lease-ttl', type=float, default=None)
+    parser.add_argument(
+        '--row-groups-per-task', type=int, default=None, help="按行组切分大文件"
+    )
+    parser.add_argument(
+        '--format', default=None, choices=['parquet', 'arrow', 'both'], help="输出格式"
+    )
+    parser.add_argument(
+        '--no-bitmap-index', action='store_true', help="不写出旁路位图索引"
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    DISTRIBUTED = args.distributed
+    WORKER_ID = args.worker_id
+    LOCAL_WORKERS = args.local_workers
+    LEASE_TTL = args.lease_ttl or LEASE_TTL
+    ROW_GROUPS_PER_TASK = args.row_groups_per_task or ROW_GROUPS_PER_TASK
+    OUTPUT_FORMAT = args.format or OUTPUT_FORMAT
+    BITMAP_INDEX = BITMAP_INDEX and not args.no_bitmap_index
+    run_profiled(main, PROCESSED_DIR, "0_preprocess")
@@ -1,140 +1,305 @@
-import os
-import json
-from collections import defaultdict
-import pandas as pd
-import matplotlib.pyplot as plt
-from itertools import combinations
-
-# 配置参数
-input_dir = "C:/Users/East/Desktop/预处理数据/30G"
-output_dir = "C:/Users/East/Desktop/output2/30g/1"
-target_category = "电子产品"  # 目标分析类别
-max_combo_length = 3  # 分析的最大组合长度
-top_n = 50  # 可视化显示前N个组合
-
-# 设置中文显示
-plt.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei', 'KaiTi']
-plt.rcParams['axes.unicode_minus'] = False
-
-
-def load_and_count_combos():
-    """加载数据并统计组合频率"""
-    combo_counter = defaultdict(int)
-
-    for file in os.listdir(input_dir):
-        if file.endswith(".parquet"):
-            file_path = os.path.join(input_dir, file)
-            df = pd.read_parquet(file_path, columns=['items_json'])
-
-            for items_json in df['items_json']:
-                try:
-                    items = json.loads(items_json)
-                    categories = list(set([item['parent_category'] for item in items]))
-
-                    # 生成所有可能组合（长度2到max_combo_length）
-                    for r in range(2, max_combo_length + 1):
-                        for combo in combinations(categories, r):
-                            sorted_combo = tuple(sorted(combo))  # 标准化排序
-                            combo_counter[sorted_combo] += 1
-
-                except Exception as e:
-                    continue
-
-    return combo_counter
-
-
-def format_combo_name(combo):
-    """格式化组合名称，确保电子产品在首位"""
-    categories = list(combo)
-    # 如果包含电子产品则调整顺序
-    if '电子产品' in categories:
-        # 将电子产品移到首位
-        categories.remove('电子产品')
-        sorted_rest = sorted(categories)  # 其他类别按字母排序
-        return '电子产品 & ' + ' & '.join(sorted_rest)
-    else:
-        # 普通组合按字母排序
-        return ' & '.join(sorted(categories))
-
-
-def filter_electronics_combos(combo_counter):
-    """筛选并格式化含电子产品的组合"""
-    electronics_combos = {}
-    for combo, count in combo_counter.items():
-        if '电子产品' in combo:
-            # 使用标准化格式命名
-            combo_str = format_combo_name(combo)
-            electronics_combos[combo_str] = count
-    return electronics_combos
-
-
-def visualize_combos(combos_dict, title, filename):
-    """可视化组合频率"""
-    os.makedirs(output_dir, exist_ok=True)
-
-    # 转换为DataFrame并排序
-    df = (
-        pd.DataFrame(
-            {'组合': list(combos_dict.keys()), '出现次数': list(combos_dict.values())}
-        )
-        .sort_values('出现次数', ascending=False)
-        .head(top_n)
-    )
-
-    # 可视化
-    plt.figure(figsize=(14, 10))
-    bars = plt.barh(df['组合'], df['出现次数'], color='#2ca02c')
-    plt.title(f"{title}\n(TOP {top_n} 高频组合)")
-    plt.xlabel("出现次数")
-    plt.gca().invert_yaxis()  # 降序排列
-
-    # 添加数据标签
-    for bar in bars:
-        width = bar.get_width()
-        plt.text(
-            width + max(df['出现次数']) * 0.01,
-            bar.get_y() + bar.get_height() / 2,
-            f'{width:,}',
-            va='center',
-        )
-
-    plt.savefig(os.path.join(output_dir, filename), bbox_inches='tight', dpi=300)
-    plt.close()
-
-
-def main():
-    print("开始统计组合频率...")
-    combo_counter = load_and_count_combos()
-    print(f"发现 {len(combo_counter)} 种不同组合")
-
-    if not combo_counter:
-        print("无有效组合数据，分析终止")
-        return
-
-    print("\n可视化全部高频组合...")
-    all_combos = {f"{' & '.join(k)}": v for k, v in combo_counter.items()}
-    visualize_combos(all_combos, "全部商品组合", "1_all_combos.png")
-
-    print("\n筛选电子产品相关组合...")
-    electronics_combos = filter_electronics_combos(combo_counter)
-    print(f"找到 {len(electronics_combos)} 个相关组合")
-
-    if electronics_combos:
-        visualize_combos(
-            electronics_combos, "含电子产品的组合", "2_electronics_combos.png"
-        )
-    else:
-        print("无电子产品相关组合")
-
-    # 保存CSV
-    pd.DataFrame(
-        {'组合': list(all_combos.keys()), '出现次数': list(all_combos.values())}
-    ).to_csv(
-        os.path.join(output_dir, "all_combos.csv"), index=False, encoding='utf-8-sig'
-    )
-
-    print(f"分析完成！结果保存至: {output_dir}")
-
-
-if __name__ == "__main__":
-    main()
+import os
+from collections import defaultdict
+import pandas as pd
+from itertools import combinations
+from run_metrics import RunMetrics, parquet_bytes
+from dataset_io import list_data_files, read_columns, data_bytes
+from profiling import run_profiled
+from chart_render import ChartJob, render_charts, load_pyplot
+from dead_letter import DeadLetterSink
+from pipeline import code_fingerprint
+from partial_cache import PartialCache, encode_counter, decode_counter, merge_counts
+from sketches import HeavyHitters
+from bitmap_index import read_indexed_rows
+from order_items import (
+    DEFAULT_CATALOG_FILE,
+    load_catalog,
+    catalog_fingerprint,
+    item_columns,
+    attach_items,
+)
+
+# 配置参数
+input_dir = "C:/Users/East/Desktop/预处理数据/30G"
+output_dir = "C:/Users/East/Desktop/output2/30g/1"
+target_category = "电子产品"  # 目标分析类别
+max_combo_length = 3  # 分析的最大组合长度
+combo_field = "parent_category"  # 组合的类别层级，可改为 "sub_category"
+top_n = 50  # 可视化显示前N个组合
+use_cache = True  # 缓存每个文件的部分统计，重跑时只扫描新增/变化的文件
+cache_dir = None  # 缓存目录，默认 input_dir/.partial_cache
+# 只分析含目标类别的订单：含目标类别的组合计数与全量分析相同，其余组合只计这些订单；
+# 有预处理写出的位图索引时只读取这些订单所在的行组与行
+target_only = False
+use_bitmap_index = True
+# 商品目录：扫描时按商品ID关联当前目录的类别，None表示使用预处理写入的类别
+catalog_file = DEFAULT_CATALOG_FILE
+
+# 高频组合模式：不保存全部组合的精确计数，只以固定内存跟踪最高频的组合，
+# 子类别或较长组合时组合种类随长度组合爆炸，应开启
+heavy_hitters = False
+sketch_capacity = 2000  # Space-Saving 保留的候选组合数，应明显大于top_n
+sketch_epsilon = 0.0005  # Count-Min 相对误差：高估量不超过 ε × 组合总数
+sketch_delta = 0.01  # Count-Min 误差界不成立的概率
+
+# 设置中文显示
+PLOT_STYLE = {
+    'font.sans-serif': ['SimHei', 'Microsoft YaHei', 'KaiTi'],
+    'axes.unicode_minus': False,
+}
+
+metrics = RunMetrics("1_category_rules")
+dead_letters = DeadLetterSink("1_category_rules")
+
+
+def count_file_combos(file_path):
+    """统计单个文件的组合频率（可缓存、可合并的部分结果）"""
+    file = os.path.basename(file_path)
+    combo_counter = defaultdict(int)
+    if heavy_hitters:
+        combo_counter = HeavyHitters(sketch_capacity, sketch_epsilon, sketch_delta)
+
+    catalog = load_catalog(catalog_file)
+    columns = item_columns(file_path, catalog)
+    with metrics.phase('read', file=file) as m:
+        indexed = None
+        if target_only and use_bitmap_index:
+            indexed = read_indexed_rows(
+                file_path, columns, 'parent_category', [target_category], catalog
+            )
+        if indexed is None:
+            df = read_columns(file_path, columns=columns)
+            m.bytes = data_bytes(file_path, columns)
+        else:
+            df, row_groups = indexed
+            if file_path.endswith(".parquet"):
+                m.bytes = parquet_bytes(file_path, columns, row_groups)
+            else:
+                m.bytes = data_bytes(file_path, columns)
+            metrics.count('indexed_row_groups', len(row_groups))
+        m.rows = len(df)
+
+    with metrics.phase('decode', file=file) as m:
+        items = attach_items(df, catalog)
+        for position, error, value in items.errors:
+            dead_letters.add(file, df.index[position], error, value)
+        keep = items.valid
+        if target_only and indexed is None:
+            # 没有索引时按是否含目标类别筛选订单
+            keep &= items.contains('parent_category', target_category)
+        category_sets = [
+            categories
+            for categories, kept in zip(items.category_sets(combo_field), keep.tolist())
+            if kept
+        ]
+        m.rows = len(df)
+
+    with metrics.phase('aggregate', file=file) as m:
+        for categories in category_sets:
+            # 生成所有可能组合（长度2到max_combo_length）；类别已排序，组合即为标准顺序
+            for r in range(2, max_combo_length + 1):
+                for combo in combinations(categories, r):
+                    if heavy_hitters:
+                        combo_counter.add(combo)
+                    else:
+                        combo_counter[combo] += 1
+        m.rows = len(category_sets)
+
+    if heavy_hitters:
+        return combo_counter.to_dict()
+    return encode_counter(combo_counter)
+
+
+def load_and_count_combos():
+    """
+    加载数据并统计组合频率
+
+    返回 (组合 -> 出现次数, 组合 -> 出现次数下界)；精确模式下界为None，
+    高频组合模式只含候选组合，出现次数为估计上界。
+    """
+    combo_counter = defaultdict(int)
+    hitters = None
+    dead_letters.open(output_dir)
+    params = {
+        'max_combo_length': max_combo_length,
+        'combo_field': combo_field,
+        'catalog': catalog_fingerprint(load_catalog(catalog_file)),
+    }
+    if target_only:
+        params['target_category'] = target_category
+    if heavy_hitters:
+        params.update(
+            capacity=sketch_capacity, epsilon=sketch_epsilon, delta=sketch_delta
+        )
+    cache = PartialCache(
+        cache_dir or os.path.join(input_dir, ".partial_cache"),
+        "1_category_rules",
+        params,
+        enabled=use_cache,
+        code=code_fingerprint(__file__),
+    )
+
+    for file in list_data_files(input_dir):
+        file_path = os.path.join(input_dir, file)
+        partial = cache.get_or_compute(file_path, count_file_combos, dead_letters)
+        if not heavy_hitters:
+            merge_counts(combo_counter, decode_counter(partial))
+        elif hitters is None:
+            hitters = HeavyHitters.from_dict(partial)
+        else:
+            hitters.merge(HeavyHitters.from_dict(partial))
+
+    lower_bounds = None
+    if hitters is not None:
+        top = hitters.top()
+        combo_counter = {combo: estimate for combo, estimate, _ in top}
+        lower_bounds = {combo: lower for combo, _, lower in top}
+        print(
+            f"高频组合模式：共 {hitters.total:,} 次组合出现，"
+            f"估计值最大高估 {hitters.error_bound():,.0f}"
+        )
+        metrics.count('combo_occurrences', hitters.total)
+
+    dead_letters.close(metrics)
+    metrics.count('cache_hits', cache.hits)
+    metrics.count('cache_misses', cache.misses)
+    print(f"缓存命中 {cache.hits} 个文件，新扫描 {cache.misses} 个文件")
+    return combo_counter, lower_bounds
+
+
+def format_combo_name(combo):
+    """格式化组合名称，确保电子产品在首位"""
+    categories = list(combo)
+    # 如果包含电子产品则调整顺序
+    if '电子产品' in categories:
+        # 将电子产品移到首位
+        categories.remove('电子产品')
+        sorted_rest = sorted(categories)  # 其他类别按字母排序
+        return '电子产品 & ' + ' & '.join(sorted_rest)
+    else:
+        # 普通组合按字母排序
+        return ' & '.join(sorted(categories))
+
+
+def filter_electronics_combos(combo_counter):
+    """筛选并格式化含电子产品的组合"""
+    electronics_combos = {}
+    for combo, count in combo_counter.items():
+        if '电子产品' in combo:
+            # 使用标准化格式命名
+            combo_str = format_combo_name(combo)
+            electronics_combos[combo_str] = count
+    return electronics_combos
+
+
+def visualize_combos(combos_dict, title, filename):
+    """可视化组合频率"""
+    plt = load_pyplot(PLOT_STYLE)
+    os.makedirs(output_dir, exist_ok=True)
+
+    # 转换为DataFrame并排序
+    df = (
+        pd.DataFrame(
+            {'组合': list(combos_dict.keys()), '出现次数': list(combos_dict.values())}
+        )
+        .sort_values('出现次数', ascending=False)
+        .head(top_n)
+    )
+
+    # 可视化
+    plt.figure(figsize=(14, 10))
+    bars = plt.barh(df['组合'], df['出现次数'], color='#2ca02c')
+    plt.title(f"{title}\n(TOP {top_n} 高频组合)")
+    plt.xlabel("出现次数")
+    plt.gca().invert_yaxis()  # 降序排列
+
+    # 添加数据标签
+    for bar in bars:
+        width = bar.get_width()
+        plt.text(
+            width + max(df['出现次数']) * 0.01,
+            bar.get_y() + bar.get_height() / 2,
+            f'{width:,}',
+            va='center',
+        )
+
+    plt.savefig(os.path.join(output_dir, filename), bbox_inches='tight', dpi=300)
+    plt.close()
+
+
+def main():
+    print("开始统计组合频率...")
+    combo_counter, lower_bounds = load_and_count_combos()
+    if lower_bounds is None:
+        print(f"发现 {len(combo_counter)} 种不同组合")
+    else:
+        print(f"跟踪 {len(combo_counter)} 个候选高频组合")
+
+    if not combo_counter:
+        print("无有效组合数据，分析终止")
+        return
+
+    print("\n可视化全部高频组合...")
+    all_combos = {f"{' & '.join(k)}": v for k, v in combo_counter.items()}
+    chart_config = {'output_dir': output_dir, 'top_n': top_n}
+    jobs = [
+        ChartJob(
+            "1_all_combos",
+            visualize_combos,
+            args=(
+                all_combos,
+                (
+                    f"含{target_category}订单中的商品组合"
+                    if target_only
+                    else "全部商品组合"
+                ),
+                "1_all_combos.png",
+            ),
+            config=chart_config,
+            outputs=["1_all_combos.png"],
+        )
+    ]
+
+    print("\n筛选电子产品相关组合...")
+    electronics_combos = filter_electronics_combos(combo_counter)
+    print(f"找到 {len(electronics_combos)} 个相关组合")
+
+    if electronics_combos:
+        jobs.append(
+            ChartJob(
+                "2_electronics_combos",
+                visualize_combos,
+                args=(
+                    electronics_combos,
+                    "含电子产品的组合",
+                    "2_electronics_combos.png",
+                ),
+                config=chart_config,
+                outputs=["2_electronics_combos.png"],
+            )
+        )
+    else:
+        print("无电子产品相关组合")
+    render_charts(jobs, output_dir, metrics=metrics)
+
+    # 保存CSV
+    with metrics.phase('write', file="all_combos.csv") as m:
+        table = pd.DataFrame(
+            {'组合': list(all_combos.keys()), '出现次数': list(all_combos.values())}
+        )
+        if lower_bounds is not None:
+            # 真实出现次数介于 下界 与 出现次数（估计上界）之间
+            table['出现次数下界'] = list(lower_bounds.values())
+        table.to_csv(
+            os.path.join(output_dir, "all_combos.csv"),
+            index=False,
+            encoding='utf-8-sig',
+        )
+        m.rows = len(all_combos)
+
+    metrics.write(output_dir)
+    print(f"分析完成！结果保存至: {output_dir}")
+
+
+if __name__ == "__main__":
+    run_profiled(main, output_dir, "1_category_rules")
@@ -1,134 +1,411 @@
-import os
-import json
-import pandas as pd
-import matplotlib.pyplot as plt
-from collections import defaultdict
-from itertools import combinations
-from mlxtend.preprocessing import TransactionEncoder
-from mlxtend.frequent_patterns import apriori, association_rules
-
-# 配置参数
-input_dir = "C:/Users/East/Desktop/test2"
-output_dir = "C:/Users/East/Desktop/test2/output"
-target_category = "电子产品"
-max_combo_length = 3
-top_n = 50
-sample_ratio = 0.1  # 抽样比例
-min_support = 0.002  # 最小支持度阈值
-min_confidence = 0.05  # 最小置信度阈值
-
-# 设置中文显示
-plt.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei', 'KaiTi']
-plt.rcParams['axes.unicode_minus'] = False
-
-
-def load_and_sample_data():
-    """抽样加载数据"""
-    all_transactions = []
-
-    for file in os.listdir(input_dir):
-        if file.endswith(".parquet"):
-            file_path = os.path.join(input_dir, file)
-            # 抽样读取数据
-            df = pd.read_parquet(file_path, columns=['items_json']).sample(
-                frac=sample_ratio
-            )
-
-            for items_json in df['items_json']:
-                try:
-                    items = json.loads(items_json)
-                    categories = list(set([item['parent_category'] for item in items]))
-                    if len(categories) >= 2:  # 只保留有组合的订单
-                        all_transactions.append(categories)
-                except:
-                    continue
-    return all_transactions
-
-
-def analyze_association_rules(transactions):
-    """使用Apriori算法分析关联规则"""
-    # 转换事务数据格式
-    te = TransactionEncoder()
-    te_ary = te.fit(transactions).transform(transactions)
-    df = pd.DataFrame(te_ary, columns=te.columns_)
-
-    # 挖掘频繁项集
-    frequent_itemsets = apriori(df, min_support=min_support, use_colnames=True)
-
-    # 生成关联规则
-    rules = association_rules(
-        frequent_itemsets, metric="confidence", min_threshold=min_confidence
-    )
-
-    # 格式化规则输出
-    rules['antecedents'] = rules['antecedents'].apply(lambda x: ', '.join(list(x)))
-    rules['consequents'] = rules['consequents'].apply(lambda x: ', '.join(list(x)))
-
-    return rules
-
-
-def filter_electronics_rules(rules):
-    """筛选含电子产品的有效规则"""
-    electronics_rules = rules[
-        (rules['antecedents'].str.contains(target_category))
-        | (rules['consequents'].str.contains(target_category))
-    ]
-
-    # 计算规则重要度指标
-    electronics_rules = electronics_rules[
-        ['antecedents', 'consequents', 'support', 'confidence', 'lift']
-    ].sort_values('support', ascending=False)
-
-    return electronics_rules
-
-
-def visualize_rules(rules, filename):
-    """可视化关联规则"""
-    plt.figure(figsize=(14, 10))
-    rules['rule'] = rules.apply(
-        lambda x: f"{x['antecedents']} → {x['consequents']}", axis=1
-    )
-
-    # 取TOP20规则可视化
-    top_rules = rules.head(20)
-    plt.barh(top_rules['rule'], top_rules['support'], color='#1f77b4')
-    plt.title(f"Top 20 关联规则 (支持度≥{min_support}, 置信度≥{min_confidence})")
-    plt.xlabel("支持度")
-    plt.gca().invert_yaxis()
-
-    # 添加数据标签
-    for i, v in enumerate(top_rules['support']):
-        plt.text(v + 0.005, i, f"{v:.2%}", color='black', va='center')
-
-    plt.savefig(os.path.join(output_dir, filename), bbox_inches='tight', dpi=300)
-    plt.close()
-
-
-def main():
-    # 数据加载与抽样
-    print("开始抽样加载数据...")
-    transactions = load_and_sample_data()
-    print(f"抽样后有效订单数：{len(transactions):,}")
-
-    # 关联规则分析
-    print("\n分析关联规则...")
-    rules = analyze_association_rules(transactions)
-    electronics_rules = filter_electronics_rules(rules)
-
-    # 保存结果
-    os.makedirs(output_dir, exist_ok=True)
-    electronics_rules.to_csv(
-        os.path.join(output_dir, "electronics_rules.csv"),
-        index=False,
-        encoding='utf-8-sig',
-    )
-
-    # 可视化
-    print("\n可视化关联规则...")
-    visualize_rules(electronics_rules, "electronics_association_rules.png")
-
-    print(f"分析完成！结果保存至：{output_dir}")
-
-
-if __name__ == "__main__":
-    main()
+import os
+import json
+import numpy as np
+import pandas as pd
+from itertools import combinations
+from run_metrics import RunMetrics
+from dataset_io import (
+    list_data_files,
+    list_row_groups,
+    read_columns,
+    read_row_group,
+    data_bytes,
+)
+from profiling import run_profiled
+from chart_render import ChartJob, render_charts, load_pyplot
+from dead_letter import DeadLetterSink
+from spill import SpillingCounter
+from order_items import (
+    DEFAULT_CATALOG_FILE,
+    load_catalog,
+    catalog_fingerprint,
+    item_columns,
+    attach_items,
+)
+
+# 配置参数
+input_dir = "C:/Users/East/Desktop/test2"
+output_dir = "C:/Users/East/Desktop/test2/output"
+target_category = "电子产品"
+max_combo_length = 3
+top_n = 50
+sample_ratio = 0.1  # 抽样比例
+min_support = 0.002  # 最小支持度阈值
+min_confidence = 0.05  # 最小置信度阈值
+sweep_mode = False  # 阈值扫描：只挖掘一次频繁项集，批量生成各阈值组合的规则
+sweep_supports = [0.002, 0.005, 0.01, 0.02]  # 扫描的支持度网格
+sweep_confidences = [0.05, 0.1, 0.2, 0.3]  # 扫描的置信度网格
+lattice_file = "itemset_lattice.json"  # 频繁项集缓存文件（位于output_dir）
+
+# 内存预算模式：按行组读取抽样，订单按类别组合去重计数（超出预算时分区溢写到
+# 磁盘），再在 (组合, 次数) 上做加权Apriori，不在内存中保留逐单的事务列表
+memory_budget_mb = None  # 内存预算（MB），None表示全部在内存中处理
+spill_dir = None  # 溢写目录，默认系统临时目录
+# 商品目录：扫描时按商品ID关联当前目录的类别，None表示使用预处理写入的类别
+catalog_file = DEFAULT_CATALOG_FILE
+
+# 设置中文显示
+PLOT_STYLE = {
+    'font.sans-serif': ['SimHei', 'Microsoft YaHei', 'KaiTi'],
+    'axes.unicode_minus': False,
+}
+
+metrics = RunMetrics("1_new_rule")
+dead_letters = DeadLetterSink("1_new_rule")
+
+
+def load_and_sample_data():
+    """抽样加载数据"""
+    all_transactions = []
+    dead_letters.open(output_dir)
+    catalog = load_catalog(catalog_file)
+
+    for file in list_data_files(input_dir):
+        file_path = os.path.join(input_dir, file)
+        columns = item_columns(file_path, catalog)
+        # 抽样读取数据
+        with metrics.phase('read', file=file) as m:
+            df = read_columns(file_path, columns=columns).sample(frac=sample_ratio)
+            m.rows = len(df)
+            m.bytes = data_bytes(file_path, columns)
+
+        with metrics.phase('decode', file=file) as m:
+            items = attach_items(df, catalog)
+            for position, error, value in items.errors:
+                dead_letters.add(file, df.index[position], error, value)
+            for categories in items.category_sets():
+                if len(categories) >= 2:  # 只保留有组合的订单
+                    all_transactions.append(list(categories))
+            m.rows = len(df)
+    return all_transactions
+
+
+def load_and_count_transactions():
+    """内存预算模式的抽样加载：返回 (类别组合列表, 各组合的订单数)"""
+    counter = SpillingCounter(memory_budget_mb * 2**20, spill_dir=spill_dir)
+    dead_letters.open(output_dir)
+    catalog = load_catalog(catalog_file)
+
+    with counter:
+        for file in list_data_files(input_dir):
+            file_path = os.path.join(input_dir, file)
+            columns = item_columns(file_path, catalog)
+            for index, _, _ in list_row_groups(file_path):
+                # 逐行组抽样，每次只读入一个行组
+                with metrics.phase('read', file=file) as m:
+                    df = read_row_group(file_path, index, columns).sample(
+                        frac=sample_ratio
+                    )
+                    m.rows = len(df)
+
+                with metrics.phase('decode', file=file) as m:
+                    items = attach_items(df, catalog)
+                    for position, error, value in items.errors:
+                        dead_letters.add(file, df.index[position], error, value)
+                    for categories in items.category_sets():
+                        if len(categories) >= 2:  # 只保留有组合的订单
+                            counter.add(categories)
+                    m.rows = len(df)
+
+        print(f"类别组合计数溢写 {counter.runs} 次")
+        metrics.count('spilled_runs', counter.runs)
+        transactions, weights = [], []
+        for categories, count in counter.items():
+            transactions.append(list(categories))
+            weights.append(count)
+    return transactions, weights
+
+
+def load_transactions():
+    """抽样加载事务：返回 (事务列表, 权重)；逐单加载时权重为None"""
+    if memory_budget_mb:
+        return load_and_count_transactions()
+    return load_and_sample_data(), None
+
+
+def mine_weighted_itemsets(transactions, weights, support):
+    """
+    加权Apriori：每个事务代表weights中对应数量的订单
+
+    返回格式与 mlxtend.apriori(use_colnames=True) 相同（support / itemsets），
+    支持度按订单数计算，与把事务逐单展开后挖掘的结果一致。
+    """
+    items = sorted({item for t in transactions for item in t})
+    matrix = np.array([[item in t for item in items] for t in transactions], dtype=bool)
+    weights = np.asarray(weights, dtype=float)
+    total = weights.sum()
+
+    supports, itemsets = [], []
+    candidates = [(j,) for j in range(len(items))]
+    while candidates:
+        frequent = []
+        for combo in candidates:
+            value = weights[matrix[:, list(combo)].all(axis=1)].sum() / total
+            if value >= support:
+                frequent.append(combo)
+                supports.append(value)
+                itemsets.append(frozenset(items[j] for j in combo))
+        # 前缀相同的两个k项集合并为k+1项候选，且其全部k项子集都须频繁
+        known = set(frequent)
+        candidates = [
+            a + (b[-1],)
+            for a, b in combinations(frequent, 2)
+            if a[:-1] == b[:-1]
+            and all(sub in known for sub in combinations(a + (b[-1],), len(a)))
+        ]
+    return pd.DataFrame({'support': supports, 'itemsets': itemsets})
+
+
+def mine_itemsets(transactions, weights, support):
+    """按是否带权重选择挖掘方式"""
+    if weights is None:
+        return mine_frequent_itemsets(transactions, support)
+    return mine_weighted_itemsets(transactions, weights, support)
+
+
+def mine_frequent_itemsets(transactions, support):
+    """使用Apriori算法挖掘频繁项集"""
+    from mlxtend.preprocessing import TransactionEncoder
+    from mlxtend.frequent_patterns import apriori
+
+    # 转换事务数据格式
+    te = TransactionEncoder()
+    te_ary = te.fit(transactions).transform(transactions)
+    df = pd.DataFrame(te_ary, columns=te.columns_)
+
+    # 挖掘频繁项集
+    return apriori(df, min_support=support, use_colnames=True)
+
+
+def derive_rules(frequent_itemsets, support, confidence):
+    """从频繁项集生成关联规则（支持度阈值不低于挖掘时的阈值即可复用）"""
+    from mlxtend.frequent_patterns import association_rules
+
+    # 频繁项集的子集仍频繁，按更高支持度过滤后依然完整
+    itemsets = frequent_itemsets[frequent_itemsets['support'] >= support]
+    if not (itemsets['itemsets'].apply(len) >= 2).any():
+        return pd.DataFrame(
+            columns=['antecedents', 'consequents', 'support', 'confidence', 'lift']
+        )
+
+    # 生成关联规则
+    rules = association_rules(itemsets, metric="confidence", min_threshold=confidence)
+
+    # 格式化规则输出
+    rules['antecedents'] = rules['antecedents'].apply(lambda x: ', '.join(list(x)))
+    rules['consequents'] = rules['consequents'].apply(lambda x: ', '.join(list(x)))
+
+    return rules
+
+
+def analyze_association_rules(transactions, weights=None):
+    """使用Apriori算法分析关联规则"""
+    frequent_itemsets = mine_itemsets(transactions, weights, min_support)
+    return derive_rules(frequent_itemsets, min_support, min_confidence)
+
+
+def input_signature():
+    """输入文件清单（文件名/大小/修改时间）、抽样比例与商品目录，用于判断项集缓存是否过期"""
+    files = []
+    for file in list_data_files(input_dir):
+        stat = os.stat(os.path.join(input_dir, file))
+        files.append([file, stat.st_size, stat.st_mtime_ns])
+    return {
+        'files': files,
+        'sample_ratio': sample_ratio,
+        'catalog': catalog_fingerprint(load_catalog(catalog_file)),
+    }
+
+
+def save_lattice(frequent_itemsets, support, n_transactions):
+    """保存频繁项集及其支持度计数"""
+    os.makedirs(output_dir, exist_ok=True)
+    lattice = {
+        'signature': input_signature(),
+        'min_support': support,
+        'n_transactions': n_transactions,
+        'itemsets': [
+            [sorted(items), round(sup * n_transactions)]
+            for items, sup in zip(
+                frequent_itemsets['itemsets'], frequent_itemsets['support']
+            )
+        ],
+    }
+    with open(os.path.join(output_dir, lattice_file), 'w', encoding='utf-8') as f:
+        json.dump(lattice, f, ensure_ascii=False)
+
+
+def load_lattice(support):
+    """读取缓存的频繁项集；缓存缺失、输入变化或挖掘阈值高于所需时返回None"""
+    path = os.path.join(output_dir, lattice_file)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            lattice = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if lattice['signature'] != input_signature() or lattice['min_support'] > support:
+        return None
+
+    n = lattice['n_transactions']
+    return pd.DataFrame(
+        {
+            'support': [count / n for _, count in lattice['itemsets']],
+            'itemsets': [frozenset(items) for items, _ in lattice['itemsets']],
+        }
+    )
+
+
+def filter_electronics_rules(rules):
+    """筛选含电子产品的有效规则"""
+    electronics_rules = rules[
+        (rules['antecedents'].str.contains(target_category))
+        | (rules['consequents'].str.contains(target_category))
+    ]
+
+    # 计算规则重要度指标
+    electronics_rules = electronics_rules[
+        ['antecedents', 'consequents', 'support', 'confidence', 'lift']
+    ].sort_values('support', ascending=False)
+
+    return electronics_rules
+
+
+def visualize_rules(rules, filename, support=None, confidence=None):
+    """可视化关联规则"""
+    plt = load_pyplot(PLOT_STYLE)
+    support = min_support if support is None else support
+    confidence = min_confidence if confidence is None else confidence
+    plt.figure(figsize=(14, 10))
+    rules['rule'] = rules.apply(
+        lambda x: f"{x['antecedents']} → {x['consequents']}", axis=1
+    )
+
+    # 取TOP20规则可视化
+    top_rules = rules.head(20)
+    plt.barh(top_rules['rule'], top_rules['support'], color='#1f77b4')
+    plt.title(f"Top 20 关联规则 (支持度≥{support}, 置信度≥{confidence})")
+    plt.xlabel("支持度")
+    plt.gca().invert_yaxis()
+
+    # 添加数据标签
+    for i, v in enumerate(top_rules['support']):
+        plt.text(v + 0.005, i, f"{v:.2%}", color='black', va='center')
+
+    plt.savefig(os.path.join(output_dir, filename), bbox_inches='tight', dpi=300)
+    plt.close()
+
+
+def run_sweep():
+    """阈值扫描：以最低支持度挖掘一次，其余阈值组合均由缓存的项集推导"""
+    lowest = min(sweep_supports)
+    frequent_itemsets = load_lattice(lowest)
+    if frequent_itemsets is None:
+        print("开始抽样加载数据...")
+        transactions, weights = load_transactions()
+        n = len(transactions) if weights is None else sum(weights)
+        print(f"抽样后有效订单数：{n:,}")
+        with metrics.phase('aggregate', file="itemsets") as m:
+            frequent_itemsets = mine_itemsets(transactions, weights, lowest)
+            m.rows = n
+        save_lattice(frequent_itemsets, lowest, n)
+        print(f"已挖掘 {len(frequent_itemsets)} 个频繁项集（支持度≥{lowest}）")
+    else:
+        print(f"复用缓存的 {len(frequent_itemsets)} 个频繁项集，跳过数据加载与挖掘")
+
+    summary = []
+    jobs = []
+    for support in sweep_supports:
+        for confidence in sweep_confidences:
+            tag = f"s{support}_c{confidence}"
+            with metrics.phase('aggregate', file=tag):
+                rules = derive_rules(frequent_itemsets, support, confidence)
+                electronics_rules = filter_electronics_rules(rules)
+            electronics_rules.to_csv(
+                os.path.join(output_dir, f"electronics_rules_{tag}.csv"),
+                index=False,
+                encoding='utf-8-sig',
+            )
+            if not electronics_rules.empty:
+                jobs.append(
+                    ChartJob(
+                        f"electronics_rules_{tag}",
+                        visualize_rules,
+                        args=(
+                            electronics_rules,
+                            f"electronics_rules_{tag}.png",
+                            support,
+                            confidence,
+                        ),
+                        config={'output_dir': output_dir},
+                        outputs=[f"electronics_rules_{tag}.png"],
+                    )
+                )
+            summary.append(
+                {
+                    'min_support': support,
+                    'min_confidence': confidence,
+                    'rules': len(rules),
+                    'electronics_rules': len(electronics_rules),
+                }
+            )
+
+    render_charts(jobs, output_dir, metrics=metrics)
+    pd.DataFrame(summary).to_csv(
+        os.path.join(output_dir, "sweep_summary.csv"),
+        index=False,
+        encoding='utf-8-sig',
+    )
+    print(f"已生成 {len(summary)} 组阈值的规则")
+
+
+def main():
+    if sweep_mode:
+        run_sweep()
+        dead_letters.close(metrics)
+        metrics.write(output_dir)
+        print(f"分析完成！结果保存至：{output_dir}")
+        return
+
+    # 数据加载与抽样
+    print("开始抽样加载数据...")
+    transactions, weights = load_transactions()
+    n = len(transactions) if weights is None else sum(weights)
+    print(f"抽样后有效订单数：{n:,}")
+
+    # 关联规则分析
+    print("\n分析关联规则...")
+    with metrics.phase('aggregate') as m:
+        rules = analyze_association_rules(transactions, weights)
+        electronics_rules = filter_electronics_rules(rules)
+        m.rows = n
+
+    # 保存结果
+    os.makedirs(output_dir, exist_ok=True)
+    electronics_rules.to_csv(
+        os.path.join(output_dir, "electronics_rules.csv"),
+        index=False,
+        encoding='utf-8-sig',
+    )
+
+    # 可视化
+    print("\n可视化关联规则...")
+    job = ChartJob(
+        "electronics_association_rules",
+        visualize_rules,
+        args=(electronics_rules, "electronics_association_rules.png"),
+        config={
+            'output_dir': output_dir,
+            'min_support': min_support,
+            'min_confidence': min_confidence,
+        },
+        outputs=["electronics_association_rules.png"],
+    )
+    render_charts([job], output_dir, metrics=metrics)
+
+    dead_letters.close(metrics)
+    metrics.write(output_dir)
+    print(f"分析完成！结果保存至：{output_dir}")
+
+
+if __name__ == "__main__":
+    run_profiled(main, output_dir, "1_new_rule")
@@ -1,154 +1,418 @@
-import os
-import json
-import pandas as pd
-import matplotlib.pyplot as plt
-from collections import defaultdict
-
-# 配置参数
-input_dir = "C:/Users/East/Desktop/预处理数据/30G"
-output_dir = "C:/Users/East/Desktop/output2/30g/2"
-high_value_price = 5000
-max_categories = 10  # 最大显示商品类别数
-max_payments = 10  # 最大显示支付方式数
-
-# 中文显示设置
-plt.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei', 'KaiTi']
-plt.rcParams['axes.unicode_minus'] = False
-
-
-def process_transactions():
-    """处理交易数据（优化内存）"""
-    category_payments = defaultdict(lambda: defaultdict(int))
-    high_value_payments = defaultdict(int)
-    payment_types = defaultdict(int)
-    category_counts = defaultdict(int)
-
-    for file in os.listdir(input_dir):
-        if file.endswith(".parquet"):
-            file_path = os.path.join(input_dir, file)
-            df = pd.read_parquet(file_path, columns=['payment_method', 'items_json'])
-
-            for _, row in df.iterrows():
-                try:
-                    payment = row['payment_method']
-                    items = json.loads(row['items_json'])
-
-                    # 统计支付方式基础频次
-                    payment_types[payment] += len(items)
-
-                    for item in items:
-                        cat = item['parent_category']
-                        # 统计类别支付分布
-                        category_payments[cat][payment] += 1
-                        category_counts[cat] += 1
-
-                        # 统计高价值支付
-                        if item['price'] > high_value_price:
-                            high_value_payments[payment] += 1
-
-                except Exception as e:
-                    print(f"数据处理错误：{str(e)}")
-
-    return category_payments, high_value_payments, payment_types, category_counts
-
-
-def visualize_all_distributions(
-    category_data, high_value_data, payment_types, category_counts
-):
-    """整合可视化支付分布"""
-    os.makedirs(output_dir, exist_ok=True)
-
-    # 筛选TOP商品类别和支付方式
-    top_categories = sorted(category_counts.items(), key=lambda x: -x[1])[
-        :max_categories
-    ]
-    top_payments = sorted(payment_types.items(), key=lambda x: -x[1])[:max_payments]
-
-    # 创建数据矩阵
-    payment_names = [p[0] for p in top_payments]
-    category_names = [c[0] for c in top_categories]
-
-    # 构建二维数据数组
-    data_matrix = []
-    for cat in category_names:
-        row = [category_data[cat].get(pay[0], 0) for pay in top_payments]
-        data_matrix.append(row)
-
-    # 转换为DataFrame
-    df = pd.DataFrame(data_matrix, index=category_names, columns=payment_names)
-
-    # 创建堆叠柱状图
-    plt.figure(figsize=(18, 10))
-    ax = df.plot(kind='bar', stacked=True, colormap='tab20', width=0.8)
-
-    # 图表装饰
-    plt.title("各商品大类支付方式分布", fontsize=16)
-    plt.xlabel("商品类别", fontsize=12)
-    plt.ylabel("交易数量", fontsize=12)
-    plt.xticks(rotation=45, ha='right')
-    plt.legend(title='支付方式', bbox_to_anchor=(1.05, 1), loc='upper left')
-
-    # 添加数据标签
-    for bars in ax.containers:
-        ax.bar_label(
-            bars, label_type='center', fmt='%d', padding=2, color='white', fontsize=8
-        )
-
-    plt.tight_layout()
-    plt.savefig(
-        os.path.join(output_dir, "1_全品类支付分布.png"), dpi=300, bbox_inches='tight'
-    )
-    plt.close()
-
-    # 高价值支付分布
-    plt.figure(figsize=(12, 8))
-    high_value_df = pd.Series(high_value_data)
-    high_value_sorted = high_value_df[payment_names].sort_values(ascending=False)
-
-    bars = high_value_sorted.plot(kind='bar', color='#2ca02c')
-    plt.title(f"高价值商品支付方式分布（单价>{high_value_price}）", fontsize=14)
-    plt.xlabel("支付方式", fontsize=12)
-    plt.ylabel("交易数量", fontsize=12)
-
-    # 添加数据标签
-    for p in bars.patches:
-        height = p.get_height()
-        plt.annotate(
-            f"{int(height)}",
-            xy=(p.get_x() + p.get_width() / 2, height),
-            xytext=(0, 3),  # 3 points vertical offset
-            textcoords="offset points",
-            ha='center',
-            va='bottom',
-        )
-
-    plt.savefig(
-        os.path.join(output_dir, "2_高价值支付分布.png"), bbox_inches='tight', dpi=300
-    )
-    plt.close()
-
-
-def main():
-    print("开始处理数据...")
-    category_payments, high_value_payments, payment_types, category_counts = (
-        process_transactions()
-    )
-
-    print("\n生成可视化图表...")
-    visualize_all_distributions(
-        category_payments, high_value_payments, payment_types, category_counts
-    )
-
-    # 保存原始数据
-    pd.DataFrame(category_payments).T.to_csv(
-        os.path.join(output_dir, "全品类支付分布.csv"), encoding='utf-8-sig'
-    )
-    pd.Series(high_value_payments).to_csv(
-        os.path.join(output_dir, "高价值支付分布.csv"), encoding='utf-8-sig'
-    )
-
-    print(f"分析完成！结果保存至：{output_dir}")
-
-
-if __name__ == "__main__":
-    main()
+import os
+import pandas as pd
+from collections import defaultdict
+from run_metrics import RunMetrics
+from dataset_io import (
+    list_data_files,
+    read_columns,
+    read_row_group,
+    data_bytes,
+    data_columns,
+)
+from profiling import run_profiled
+from chart_render import ChartJob, render_charts, load_pyplot
+from pipeline import code_fingerprint
+from partial_cache import PartialCache, merge_counts
+from dead_letter import DeadLetterSink
+from sketches import HyperLogLog, merge_sketches, write_hll_table
+from online_agg import list_units, run_progressive
+from order_items import (
+    DEFAULT_CATALOG_FILE,
+    load_catalog,
+    catalog_fingerprint,
+    item_columns,
+    attach_items,
+)
+
+# 配置参数
+input_dir = "C:/Users/East/Desktop/预处理数据/30G"
+output_dir = "C:/Users/East/Desktop/output2/30g/2"
+high_value_price = 5000
+max_categories = 10  # 最大显示商品类别数
+max_payments = 10  # 最大显示支付方式数
+use_cache = True  # 缓存每个文件的部分统计，重跑时只扫描新增/变化的文件
+cache_dir = None  # 缓存目录，默认 input_dir/.partial_cache
+hll_precision = 12  # 去重买家数草图精度：2^12个寄存器，相对误差约1.6%
+# 商品目录：扫描时按商品ID关联当前目录的类别与价格，None表示使用预处理写入的值
+catalog_file = DEFAULT_CATALOG_FILE
+
+# 渐进模式：随机顺序读取行组，各占比的置信区间都小于progressive_error时提前结束，
+# 结果为按抽样比例放大的估计值（不统计去重买家数）
+progressive = False
+progressive_error = 0.01  # 占比的最大允许误差（绝对值，0.01即±1个百分点）
+progressive_confidence = 0.95
+progressive_min_units = 10  # 至少读取的行组数
+progressive_seed = None  # 行组读取顺序的随机种子，None表示每次不同
+
+DISTINCT_BUYERS_FILE = "distinct_buyers_payment.parquet"  # 各支付方式的买家草图
+
+# 中文显示设置
+PLOT_STYLE = {
+    'font.sans-serif': ['SimHei', 'Microsoft YaHei', 'KaiTi'],
+    'axes.unicode_minus': False,
+}
+
+metrics = RunMetrics("2_payment_analysis")
+dead_letters = DeadLetterSink("2_payment_analysis")
+
+
+def payment_columns(file_path):
+    """需要读取的列；旧版预处理输出没有user_id，此时不统计去重买家数"""
+    columns = ['payment_method'] + item_columns(file_path, load_catalog(catalog_file))
+    if 'user_id' in data_columns(file_path):
+        columns.append('user_id')
+    return columns
+
+
+def count_file_payments(file_path):
+    """统计单个文件的支付分布（可缓存、可合并的部分结果）"""
+    file = os.path.basename(file_path)
+    columns = payment_columns(file_path)
+    with metrics.phase('read', file=file) as m:
+        df = read_columns(file_path, columns=columns)
+        m.rows = len(df)
+        m.bytes = data_bytes(file_path, columns)
+    return count_payments(df, file)
+
+
+def value_counts(values):
+    """取值 -> 出现次数（int）"""
+    return {k: int(n) for k, n in values.value_counts(dropna=False).items()}
+
+
+def count_payments(df, file, first_row=0):
+    """统计一批订单的支付分布；first_row 为该批在文件中的起始行号"""
+    distinct_buyers = {}
+
+    with metrics.phase('decode', file=file) as m:
+        items = attach_items(df, load_catalog(catalog_file))
+        for position, error, value in items.errors:
+            dead_letters.add(file, first_row + position, error, value)
+        valid = items.valid
+        m.rows = len(df)
+
+    with metrics.phase('aggregate', file=file) as m:
+        payments = df['payment_method'].to_numpy(dtype=object)
+        # 逐商品的 支付方式/类别/价格，按数组整体分组计数
+        item_frame = pd.DataFrame(
+            {
+                'payment': payments[items.order],
+                'category': items.parent,
+                'price': items.price,
+            }
+        )
+        category_payments = {}
+        for (cat, payment), n in (
+            item_frame.groupby(['category', 'payment'], dropna=False).size().items()
+        ):
+            category_payments.setdefault(cat, {})[payment] = int(n)
+        high_value = item_frame['price'] > high_value_price
+        high_value_payments = value_counts(item_frame.loc[high_value, 'payment'])
+        category_counts = value_counts(item_frame['category'])
+        # 支付方式基础频次按商品数计
+        payment_types = {
+            payment: int(n)
+            for payment, n in pd.Series(items.lengths[valid])
+            .groupby(payments[valid], dropna=False)
+            .sum()
+            .items()
+        }
+        m.rows = int(valid.sum())
+
+        if 'user_id' in df.columns:
+            valid_orders = df[valid]
+            for payment, user_ids in valid_orders.groupby(
+                'payment_method', observed=True
+            )['user_id']:
+                sketch = HyperLogLog(hll_precision)
+                sketch.add_ints(user_ids.to_numpy())
+                distinct_buyers[payment] = sketch.to_text()
+
+    return {
+        'category_payments': category_payments,
+        'high_value_payments': high_value_payments,
+        'payment_types': payment_types,
+        'category_counts': category_counts,
+        'distinct_buyers': distinct_buyers,
+    }
+
+
+def process_transactions():
+    """处理交易数据（优化内存）"""
+    category_payments = defaultdict(lambda: defaultdict(int))
+    high_value_payments = defaultdict(int)
+    payment_types = defaultdict(int)
+    category_counts = defaultdict(int)
+    distinct_buyers = {}
+    dead_letters.open(output_dir)
+    cache = PartialCache(
+        cache_dir or os.path.join(input_dir, ".partial_cache"),
+        "2_payment_analysis",
+        {
+            'high_value_price': high_value_price,
+            'hll_precision': hll_precision,
+            'catalog': catalog_fingerprint(load_catalog(catalog_file)),
+        },
+        enabled=use_cache,
+        code=code_fingerprint(__file__),
+    )
+
+    for file in list_data_files(input_dir):
+        file_path = os.path.join(input_dir, file)
+        partial = cache.get_or_compute(file_path, count_file_payments, dead_letters)
+
+        # 各文件的计数直接相加即为全量结果
+        for cat, payments in partial['category_payments'].items():
+            merge_counts(category_payments[cat], payments)
+        merge_counts(high_value_payments, partial['high_value_payments'])
+        merge_counts(payment_types, partial['payment_types'])
+        merge_counts(category_counts, partial['category_counts'])
+        # 草图逐寄存器取最大值即为并集，跨文件的同一买家不会重复计数
+        merge_sketches(
+            distinct_buyers,
+            {
+                (payment,): HyperLogLog.from_text(text)
+                for payment, text in partial['distinct_buyers'].items()
+            },
+        )
+
+    dead_letters.close(metrics)
+    metrics.count('cache_hits', cache.hits)
+    metrics.count('cache_misses', cache.misses)
+    print(f"缓存命中 {cache.hits} 个文件，新扫描 {cache.misses} 个文件")
+    return (
+        category_payments,
+        high_value_payments,
+        payment_types,
+        category_counts,
+        distinct_buyers,
+    )
+
+
+def estimate_transactions():
+    """
+    渐进模式：随机顺序逐行组统计，达到误差要求后停止，返回放大后的估计值
+
+    占比口径与图表一致：各类别内的支付方式构成、支付方式构成、类别构成、
+    高价值商品的支付方式构成。
+    """
+    dead_letters.open(output_dir)
+    units = list_units(input_dir)
+
+    def process_unit(unit):
+        file, index, first_row, _ = unit
+        file_path = os.path.join(input_dir, file)
+        columns = ['payment_method'] + item_columns(
+            file_path, load_catalog(catalog_file)
+        )
+        with metrics.phase('read', file=file) as m:
+            df = read_row_group(file_path, index, columns)
+            m.rows = len(df)
+        partial = count_payments(df, file, first_row)
+        return {
+            'category_payments': {
+                (cat, payment): n
+                for cat, payments in partial['category_payments'].items()
+                for payment, n in payments.items()
+            },
+            'payment_types': {
+                (None, k): n for k, n in partial['payment_types'].items()
+            },
+            'category_counts': {
+                (None, k): n for k, n in partial['category_counts'].items()
+            },
+            'high_value_payments': {
+                (None, k): n for k, n in partial['high_value_payments'].items()
+            },
+        }
+
+    estimator = run_progressive(
+        units,
+        process_unit,
+        progressive_error,
+        progressive_confidence,
+        progressive_min_units,
+        progressive_seed,
+    )
+    dead_letters.close(metrics)
+    metrics.count('units_read', estimator.units)
+    metrics.count('units_total', len(units))
+
+    estimates = estimator.estimates()
+    estimates['estimate'] = estimates['estimate'].round().astype(int)
+    write_estimates(estimates)
+    category_payments = defaultdict(dict)
+    tables = defaultdict(dict)
+    for row in estimates.itertuples():
+        if row.table == 'category_payments':
+            category_payments[row.group][row.key] = row.estimate
+        else:
+            tables[row.table][row.key] = row.estimate
+    return (
+        category_payments,
+        tables['high_value_payments'],
+        tables['payment_types'],
+        tables['category_counts'],
+        {},
+    )
+
+
+def write_estimates(estimates):
+    """保存渐进模式各键的估计次数、组内占比及其置信区间半宽"""
+    os.makedirs(output_dir, exist_ok=True)
+    with metrics.phase('write', file="估计置信区间.csv") as m:
+        estimates.rename(
+            columns={
+                'table': '统计表',
+                'group': '分组',
+                'key': '键',
+                'estimate': '估计次数',
+                'share': '组内占比',
+                'half_width': '占比误差',
+            }
+        ).to_csv(
+            os.path.join(output_dir, "估计置信区间.csv"),
+            index=False,
+            encoding='utf-8-sig',
+        )
+        m.rows = len(estimates)
+
+
+def visualize_all_distributions(
+    category_data, high_value_data, payment_types, category_counts
+):
+    """整合可视化支付分布"""
+    plt = load_pyplot(PLOT_STYLE)
+    os.makedirs(output_dir, exist_ok=True)
+
+    # 筛选TOP商品类别和支付方式
+    top_categories = sorted(category_counts.items(), key=lambda x: -x[1])[
+        :max_categories
+    ]
+    top_payments = sorted(payment_types.items(), key=lambda x: -x[1])[:max_payments]
+
+    # 创建数据矩阵
+    payment_names = [p[0] for p in top_payments]
+    category_names = [c[0] for c in top_categories]
+
+    # 构建二维数据数组
+    data_matrix = []
+    for cat in category_names:
+        row = [category_data[cat].get(pay[0], 0) for pay in top_payments]
+        data_matrix.append(row)
+
+    # 转换为DataFrame
+    df = pd.DataFrame(data_matrix, index=category_names, columns=payment_names)
+
+    # 创建堆叠柱状图
+    plt.figure(figsize=(18, 10))
+    ax = df.plot(kind='bar', stacked=True, colormap='tab20', width=0.8)
+
+    # 图表装饰
+    plt.title("各商品大类支付方式分布", fontsize=16)
+    plt.xlabel("商品类别", fontsize=12)
+    plt.ylabel("交易数量", fontsize=12)
+    plt.xticks(rotation=45, ha='right')
+    plt.legend(title='支付方式', bbox_to_anchor=(1.05, 1), loc='upper left')
+
+    # 添加数据标签
+    for bars in ax.containers:
+        ax.bar_label(
+            bars, label_type='center', fmt='%d', padding=2, color='white', fontsize=8
+        )
+
+    plt.tight_layout()
+    plt.savefig(
+        os.path.join(output_dir, "1_全品类支付分布.png"), dpi=300, bbox_inches='tight'
+    )
+    plt.close()
+
+    # 高价值支付分布
+    plt.figure(figsize=(12, 8))
+    high_value_df = pd.Series(high_value_data)
+    high_value_sorted = high_value_df[payment_names].sort_values(ascending=False)
+
+    bars = high_value_sorted.plot(kind='bar', color='#2ca02c')
+    plt.title(f"高价值商品支付方式分布（单价>{high_value_price}）", fontsize=14)
+    plt.xlabel("支付方式", fontsize=12)
+    plt.ylabel("交易数量", fontsize=12)
+
+    # 添加数据标签
+    for p in bars.patches:
+        height = p.get_height()
+        plt.annotate(
+            f"{int(height)}",
+            xy=(p.get_x() + p.get_width() / 2, height),
+            xytext=(0, 3),  # 3 points vertical offset
+            textcoords="offset points",
+            ha='center',
+            va='bottom',
+        )
+
+    plt.savefig(
+        os.path.join(output_dir, "2_高价值支付分布.png"), bbox_inches='tight', dpi=300
+    )
+    plt.close()
+
+
+def main():
+    print("开始处理数据...")
+    (
+        category_payments,
+        high_value_payments,
+        payment_types,
+        category_counts,
+        distinct_buyers,
+    ) = (estimate_transactions if progressive else process_transactions)()
+
+    print("\n生成可视化图表...")
+    # 嵌套defaultdict含lambda无法传入子进程，转为普通字典
+    job = ChartJob(
+        "payment_distributions",
+        visualize_all_distributions,
+        args=(
+            {cat: dict(p) for cat, p in category_payments.items()},
+            dict(high_value_payments),
+            dict(payment_types),
+            dict(category_counts),
+        ),
+        config={
+            'output_dir': output_dir,
+            'high_value_price': high_value_price,
+            'max_categories': max_categories,
+            'max_payments': max_payments,
+        },
+        outputs=["1_全品类支付分布.png", "2_高价值支付分布.png"],
+    )
+    render_charts([job], output_dir, metrics=metrics)
+
+    # 保存原始数据
+    with metrics.phase('write'):
+        pd.DataFrame(category_payments).T.to_csv(
+            os.path.join(output_dir, "全品类支付分布.csv"), encoding='utf-8-sig'
+        )
+        pd.Series(high_value_payments).to_csv(
+            os.path.join(output_dir, "高价值支付分布.csv"), encoding='utf-8-sig'
+        )
+        if distinct_buyers:
+            write_hll_table(
+                os.path.join(output_dir, DISTINCT_BUYERS_FILE),
+                ['payment_method'],
+                distinct_buyers,
+            )
+            pd.Series(
+                {k[0]: s.count() for k, s in distinct_buyers.items()},
+                name='去重买家数（估计）',
+            ).to_csv(
+                os.path.join(output_dir, "支付方式去重买家数.csv"),
+                encoding='utf-8-sig',
+            )
+        elif not progressive:
+            print("预处理数据缺少user_id列，未统计去重买家数（请重新运行预处理）")
+
+    metrics.write(output_dir)
+    print(f"分析完成！结果保存至：{output_dir}")
+
+
+if __name__ == "__main__":
+    run_profiled(main, output_dir, "2_payment_analysis")
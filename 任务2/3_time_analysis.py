@@ -1,151 +1,465 @@
-import os
-import json
-import pandas as pd
-import matplotlib.pyplot as plt
-from collections import defaultdict
-
-# 配置参数
-input_dir = "C:/Users/East/Desktop/预处理数据/30G"
-output_dir = "C:/Users/East/Desktop/output2/30g/3"
-top_categories = 10
-time_seq_gap = 7
-
-# 中文显示设置
-plt.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei', 'KaiTi']
-plt.rcParams['axes.unicode_minus'] = False
-
-
-def load_time_series_data():
-    """加载时间序列数据（优化内存）"""
-    date_records = []
-    for file in os.listdir(input_dir):
-        if file.endswith(".parquet"):
-            file_path = os.path.join(input_dir, file)
-            df = pd.read_parquet(file_path, columns=['purchase_date', 'items_json'])
-            for _, row in df.iterrows():
-                try:
-                    date = pd.to_datetime(row['purchase_date'])
-                    items = json.loads(row['items_json'])
-                    categories = list(set([item['parent_category'] for item in items]))
-                    date_records.append({'date': date, 'categories': categories})
-                except Exception as e:
-                    print(f"数据处理错误：{str(e)}")
-    return pd.DataFrame(date_records)
-
-
-def analyze_seasonal_patterns(df):
-    """分析季节性模式"""
-    df['quarter'] = df['date'].dt.quarter
-    df['month'] = df['date'].dt.month
-    df['weekday'] = df['date'].dt.weekday + 1
-    expanded_df = df.explode('categories')
-
-    quarterly = (
-        expanded_df.groupby(['quarter', 'categories']).size().unstack().fillna(0)
-    )
-    quarterly_top = quarterly[quarterly.sum().nlargest(top_categories).index]
-
-    monthly = expanded_df.groupby(['month', 'categories']).size().unstack().fillna(0)
-    monthly_top = monthly[monthly.sum().nlargest(top_categories).index]
-
-    weekday = expanded_df.groupby(['weekday', 'categories']).size().unstack().fillna(0)
-    weekday_top = weekday[weekday.sum().nlargest(top_categories).index]
-
-    return quarterly_top, monthly_top, weekday_top
-
-
-def visualize_seasonal(data_dict):
-    """可视化季节性模式"""
-    os.makedirs(output_dir, exist_ok=True)
-
-    # 季度趋势
-    plt.figure(figsize=(14, 8))
-    data_dict['quarterly'].plot(kind='area', alpha=0.8)
-    plt.title("季度商品销售趋势TOP{}".format(top_categories))
-    plt.xlabel("季度")
-    plt.ylabel("销售量")
-    plt.legend(loc='upper left', bbox_to_anchor=(1, 1))
-    plt.savefig(
-        os.path.join(output_dir, "1_季度趋势.png"), bbox_inches='tight', dpi=300
-    )
-    plt.close()
-
-    # 月度趋势（修复横坐标）
-    plt.figure(figsize=(14, 8))
-    ax = data_dict['monthly'].plot(kind='line', marker='o')
-    plt.title("月度商品销售趋势TOP{}".format(top_categories))
-    plt.xlabel("月份")
-    plt.ylabel("销售量")
-    plt.xticks(range(1, 13))
-    plt.grid(True)
-    plt.legend(loc='upper left', bbox_to_anchor=(1, 1))
-    plt.savefig(
-        os.path.join(output_dir, "2_月度趋势.png"), bbox_inches='tight', dpi=300
-    )
-    plt.close()
-
-    # 周分布
-    plt.figure(figsize=(14, 8))
-    data_dict['weekday'].plot(kind='bar', stacked=True)
-    plt.title("周销售分布TOP{}".format(top_categories))
-    plt.xlabel("星期（1-7对应周一到周日）")
-    plt.ylabel("销售量")
-    plt.legend(loc='upper left', bbox_to_anchor=(1, 1))
-    plt.savefig(os.path.join(output_dir, "3_周分布.png"), bbox_inches='tight', dpi=300)
-    plt.close()
-
-
-def analyze_sequence_patterns(df):
-    """统计先A后B的时序模式"""
-    df_sorted = df.sort_values('date')
-    transactions = df_sorted['categories'].tolist()
-    sequence_counts = defaultdict(int)
-
-    for i in range(len(transactions) - 1):
-        for a in transactions[i]:
-            for b in transactions[i + 1]:
-                sequence_counts[(a, b)] += 1
-
-    seq_list = [
-        {'A': a, 'B': b, 'count': cnt} for (a, b), cnt in sequence_counts.items()
-    ]
-    seq_df = pd.DataFrame(seq_list).sort_values('count', ascending=False).head(30)
-    return seq_df
-
-
-def visualize_sequence_patterns(seq_df, output_dir):
-    """可视化时序模式"""
-    plt.figure(figsize=(14, 10))
-    seq_df['sequence'] = seq_df.apply(lambda x: f"{x['A']} → {x['B']}", axis=1)
-    plt.barh(seq_df['sequence'], seq_df['count'], color='skyblue')
-    plt.xlabel("出现次数")
-    plt.ylabel("时序模式")
-    plt.title("Top 30 时序购买模式（A → B）")
-    plt.gca().invert_yaxis()
-    plt.tight_layout()
-    plt.savefig(
-        os.path.join(output_dir, "4_时序模式.png"), bbox_inches='tight', dpi=300
-    )
-    plt.close()
-
-
-def main():
-    print("开始加载数据...")
-    time_df = load_time_series_data()
-    print(f"已加载 {len(time_df)} 条时间序列记录")
-
-    print("\n分析季节性模式...")
-    quarterly, monthly, weekday = analyze_seasonal_patterns(time_df)
-    visualize_seasonal({'quarterly': quarterly, 'monthly': monthly, 'weekday': weekday})
-
-    print("\n分析时序购买模式...")
-    seq_df = analyze_sequence_patterns(time_df)
-    visualize_sequence_patterns(seq_df, output_dir)
-    seq_df.to_csv(
-        os.path.join(output_dir, "时序模式结果.csv"), index=False, encoding='utf-8-sig'
-    )
-    print(f"分析结果已保存至：{output_dir}")
-
-
-if __name__ == "__main__":
-    main()
+import os
+import numpy as np
+import pandas as pd
+from collections import defaultdict
+from run_metrics import RunMetrics
+from dataset_io import (
+    list_data_files,
+    list_row_groups,
+    read_columns,
+    read_row_group,
+    data_bytes,
+    data_columns,
+)
+from profiling import run_profiled
+from chart_render import ChartJob, render_charts, load_pyplot
+from dead_letter import DeadLetterSink
+from sketches import HyperLogLog, merge_sketches, write_hll_table
+from online_agg import list_units, run_progressive
+from spill import ExternalSorter
+from order_items import (
+    DEFAULT_CATALOG_FILE,
+    load_catalog,
+    item_columns,
+    attach_items,
+)
+
+# 配置参数
+input_dir = "C:/Users/East/Desktop/预处理数据/30G"
+output_dir = "C:/Users/East/Desktop/output2/30g/3"
+top_categories = 10
+time_seq_gap = 7
+hll_precision = 12  # 去重买家数草图精度：2^12个寄存器，相对误差约1.6%
+
+# 渐进模式：随机顺序读取行组，各周期内类别占比的置信区间都小于progressive_error时
+# 提前结束，季节性图表使用按抽样比例放大的估计值；时序模式依赖相邻订单，
+# 抽样后不再成立，渐进模式下不分析，也不统计去重买家数
+progressive = False
+progressive_error = 0.01  # 占比的最大允许误差（绝对值，0.01即±1个百分点）
+progressive_confidence = 0.95
+progressive_min_units = 10  # 至少读取的行组数
+progressive_seed = None  # 行组读取顺序的随机种子，None表示每次不同
+
+# 内存预算模式：按行组流式读取，季节性计数逐批累加，时序模式所需的按日期排序
+# 超出预算时排序后溢写到磁盘、最后多路归并，内存占用与数据量无关
+memory_budget_mb = None  # 内存预算（MB），None表示全部在内存中处理
+spill_dir = None  # 溢写目录，默认系统临时目录
+# 商品目录：扫描时按商品ID关联当前目录的类别，None表示使用预处理写入的类别
+catalog_file = DEFAULT_CATALOG_FILE
+
+# (类别, 年月) 的买家草图
+DISTINCT_BUYERS_FILE = "distinct_buyers_category_month.parquet"
+# 季节性统计的表名 -> 周期列
+SEASONAL_PERIODS = {'quarterly': 'quarter', 'monthly': 'month', 'weekday': 'weekday'}
+
+# 中文显示设置
+PLOT_STYLE = {
+    'font.sans-serif': ['SimHei', 'Microsoft YaHei', 'KaiTi'],
+    'axes.unicode_minus': False,
+}
+
+metrics = RunMetrics("3_time_analysis")
+dead_letters = DeadLetterSink("3_time_analysis")
+
+
+def sketch_buyers(buyers):
+    """{(类别, 年月): [用户ID, ...]} -> {(类别, 年月): HyperLogLog}"""
+    sketches = {}
+    for key, user_ids in buyers.items():
+        sketch = HyperLogLog(hll_precision)
+        sketch.add_ints(user_ids)
+        sketches[key] = sketch
+    return sketches
+
+
+def time_columns(file_path, users=True):
+    """需要读取的列；users为True且文件有user_id时一并读取，用于去重买家数"""
+    columns = ['purchase_date'] + item_columns(file_path, load_catalog(catalog_file))
+    if users and 'user_id' in data_columns(file_path):
+        columns.append('user_id')
+    return columns
+
+
+def decode_time_frame(df, file, first_row=0, buyers=None):
+    """
+    解析一批订单的日期与类别，返回 DataFrame[date, categories]
+
+    buyers 不为None时同时按 (类别, 年月) 收集用户ID；first_row 为该批在文件中的起始行号
+    """
+    items = attach_items(df, load_catalog(catalog_file))
+    for position, error, value in items.errors:
+        dead_letters.add(file, first_row + position, error, value)
+    raw_dates = df['purchase_date'].reset_index(drop=True)
+    dates = pd.to_datetime(raw_dates, errors='coerce')
+    # 缺失或无法解析的日期无法归入任何周期，与其他异常记录一样隔离
+    missing = dates.isna().to_numpy() & items.valid
+    for position in np.flatnonzero(missing).tolist():
+        error = ValueError(f"购买日期缺失或无法解析：{raw_dates[position]!r}")
+        dead_letters.add(file, first_row + position, error, raw_dates[position])
+    keep = items.valid & ~missing
+
+    categories = pd.Series(items.category_sets(), dtype=object).map(list)
+    records = pd.DataFrame({'date': dates, 'categories': categories})[keep]
+    if buyers is not None and len(records):
+        users = records.assign(
+            month=records['date'].dt.to_period('M'),
+            user_id=df['user_id'].to_numpy()[keep],
+        ).explode('categories')
+        users = users.dropna(subset=['categories'])
+        groups = users.groupby(['categories', 'month'])['user_id']
+        for (category, month), user_ids in groups:
+            buyers[(category, str(month))].extend(user_ids.tolist())
+    return records.reset_index(drop=True)
+
+
+def load_time_series_data():
+    """
+    加载时间序列数据（优化内存）
+
+    同时返回各 (父类别, 年月) 的去重买家草图；预处理数据没有user_id列时为空。
+    """
+    frames = []
+    distinct_buyers = {}
+    dead_letters.open(output_dir)
+    for file in list_data_files(input_dir):
+        file_path = os.path.join(input_dir, file)
+        columns = time_columns(file_path)
+        has_users = 'user_id' in columns
+        with metrics.phase('read', file=file) as m:
+            df = read_columns(file_path, columns=columns)
+            m.rows = len(df)
+            m.bytes = data_bytes(file_path, columns)
+
+        with metrics.phase('decode', file=file) as m:
+            buyers = defaultdict(list) if has_users else None
+            frames.append(decode_time_frame(df, file, buyers=buyers))
+            m.rows = len(df)
+
+        if buyers is not None:
+            with metrics.phase('aggregate', file=file) as m:
+                merge_sketches(distinct_buyers, sketch_buyers(buyers))
+                m.rows = sum(len(ids) for ids in buyers.values())
+    dead_letters.close(metrics)
+    if not frames:
+        return pd.DataFrame(columns=['date', 'categories']), distinct_buyers
+    return pd.concat(frames, ignore_index=True), distinct_buyers
+
+
+def save_distinct_buyers(distinct_buyers):
+    """保存草图表，并输出 类别 × 年月 的去重买家数估计"""
+    if not distinct_buyers:
+        print("预处理数据缺少user_id列，未统计去重买家数（请重新运行预处理）")
+        return
+    os.makedirs(output_dir, exist_ok=True)
+    write_hll_table(
+        os.path.join(output_dir, DISTINCT_BUYERS_FILE),
+        ['parent_category', 'month'],
+        distinct_buyers,
+    )
+    counts = pd.Series(
+        {key: sketch.count() for key, sketch in distinct_buyers.items()}
+    ).unstack(fill_value=0)
+    counts.to_csv(
+        os.path.join(output_dir, "类别月度去重买家数.csv"), encoding='utf-8-sig'
+    )
+
+
+def seasonal_counts(df):
+    """各周期 × 类别的销售量：{表名: Series，索引为 (周期, 类别)}"""
+    df['quarter'] = df['date'].dt.quarter
+    df['month'] = df['date'].dt.month
+    df['weekday'] = df['date'].dt.weekday + 1
+    expanded_df = df.explode('categories')
+    return {
+        name: expanded_df.groupby([period, 'categories']).size()
+        for name, period in SEASONAL_PERIODS.items()
+    }
+
+
+def top_table(counts):
+    """(周期, 类别) 计数 -> 周期 × 销量最高的top_categories个类别"""
+    table = counts.unstack().fillna(0)
+    return table[table.sum().nlargest(top_categories).index]
+
+
+def analyze_seasonal_patterns(df):
+    """分析季节性模式"""
+    counts = seasonal_counts(df)
+    return tuple(top_table(counts[name]) for name in SEASONAL_PERIODS)
+
+
+def estimate_seasonal_patterns():
+    """渐进模式：随机顺序逐行组统计，达到误差要求后停止，返回放大后的季节性估计"""
+    dead_letters.open(output_dir)
+    units = list_units(input_dir)
+
+    def process_unit(unit):
+        file, index, first_row, _ = unit
+        file_path = os.path.join(input_dir, file)
+        with metrics.phase('read', file=file) as m:
+            df = read_row_group(file_path, index, time_columns(file_path, users=False))
+            m.rows = len(df)
+        with metrics.phase('decode', file=file) as m:
+            records = decode_time_frame(df, file, first_row)
+            m.rows = len(df)
+        if records.empty:
+            return {}
+        counts = seasonal_counts(records)
+        # 占比按周期计算：同一季度/月份/星期内各类别的构成
+        return {
+            name: {(int(period), cat): int(n) for (period, cat), n in series.items()}
+            for name, series in counts.items()
+        }
+
+    estimator = run_progressive(
+        units,
+        process_unit,
+        progressive_error,
+        progressive_confidence,
+        progressive_min_units,
+        progressive_seed,
+    )
+    dead_letters.close(metrics)
+    metrics.count('units_read', estimator.units)
+    metrics.count('units_total', len(units))
+
+    estimates = estimator.estimates()
+    os.makedirs(output_dir, exist_ok=True)
+    estimates.rename(
+        columns={
+            'table': '统计表',
+            'group': '周期',
+            'key': '类别',
+            'estimate': '估计销量',
+            'share': '周期内占比',
+            'half_width': '占比误差',
+        }
+    ).to_csv(
+        os.path.join(output_dir, "估计置信区间.csv"), index=False, encoding='utf-8-sig'
+    )
+    tables = []
+    for name in SEASONAL_PERIODS:
+        part = estimates[estimates['table'] == name]
+        counts = pd.Series(
+            part['estimate'].round().to_numpy(),
+            index=pd.MultiIndex.from_arrays([part['group'], part['key']]),
+        )
+        tables.append(top_table(counts.sort_index()))
+    return tuple(tables)
+
+
+def visualize_seasonal(data_dict):
+    """可视化季节性模式"""
+    plt = load_pyplot(PLOT_STYLE)
+    os.makedirs(output_dir, exist_ok=True)
+
+    # 季度趋势
+    plt.figure(figsize=(14, 8))
+    data_dict['quarterly'].plot(kind='area', alpha=0.8)
+    plt.title("季度商品销售趋势TOP{}".format(top_categories))
+    plt.xlabel("季度")
+    plt.ylabel("销售量")
+    plt.legend(loc='upper left', bbox_to_anchor=(1, 1))
+    plt.savefig(
+        os.path.join(output_dir, "1_季度趋势.png"), bbox_inches='tight', dpi=300
+    )
+    plt.close()
+
+    # 月度趋势（修复横坐标）
+    plt.figure(figsize=(14, 8))
+    data_dict['monthly'].plot(kind='line', marker='o')
+    plt.title("月度商品销售趋势TOP{}".format(top_categories))
+    plt.xlabel("月份")
+    plt.ylabel("销售量")
+    plt.xticks(range(1, 13))
+    plt.grid(True)
+    plt.legend(loc='upper left', bbox_to_anchor=(1, 1))
+    plt.savefig(
+        os.path.join(output_dir, "2_月度趋势.png"), bbox_inches='tight', dpi=300
+    )
+    plt.close()
+
+    # 周分布
+    plt.figure(figsize=(14, 8))
+    data_dict['weekday'].plot(kind='bar', stacked=True)
+    plt.title("周销售分布TOP{}".format(top_categories))
+    plt.xlabel("星期（1-7对应周一到周日）")
+    plt.ylabel("销售量")
+    plt.legend(loc='upper left', bbox_to_anchor=(1, 1))
+    plt.savefig(os.path.join(output_dir, "3_周分布.png"), bbox_inches='tight', dpi=300)
+    plt.close()
+
+
+def count_sequences(transactions):
+    """按时间顺序逐个读入各订单的类别列表，统计相邻订单的 (A, B) 次数"""
+    sequence_counts = defaultdict(int)
+    previous = None
+    for categories in transactions:
+        if previous is not None:
+            for a in previous:
+                for b in categories:
+                    sequence_counts[(a, b)] += 1
+        previous = categories
+    return sequence_counts
+
+
+def top_sequences(sequence_counts):
+    """出现次数最多的30个时序模式"""
+    seq_list = [
+        {'A': a, 'B': b, 'count': cnt} for (a, b), cnt in sequence_counts.items()
+    ]
+    seq_df = pd.DataFrame(seq_list).sort_values('count', ascending=False).head(30)
+    return seq_df
+
+
+def analyze_sequence_patterns(df):
+    """统计先A后B的时序模式"""
+    df_sorted = df.sort_values('date')
+    return top_sequences(count_sequences(df_sorted['categories'].tolist()))
+
+
+def analyze_within_budget():
+    """
+    内存预算模式：逐行组读取，不在内存中保留全部订单
+
+    季节性计数按批累加；订单以 (日期, 类别) 交给外部排序，归并后按时间顺序流式
+    统计时序模式。同一天的订单保持读取顺序（内存模式下同日订单的先后不确定）。
+    返回 ((季度表, 月度表, 星期表), 时序模式表)。
+    """
+    batches = {name: [] for name in SEASONAL_PERIODS}
+    distinct_buyers = {}
+    n_records = 0
+    dead_letters.open(output_dir)
+    # 按日期（纳秒时间戳）排序；缺失日期的订单已在解析时隔离
+    sorter = ExternalSorter(
+        memory_budget_mb * 2**20, key=lambda r: r[0], spill_dir=spill_dir
+    )
+    with sorter:
+        for file in list_data_files(input_dir):
+            file_path = os.path.join(input_dir, file)
+            columns = time_columns(file_path)
+            has_users = 'user_id' in columns
+            for index, first_row, _ in list_row_groups(file_path):
+                with metrics.phase('read', file=file) as m:
+                    df = read_row_group(file_path, index, columns)
+                    m.rows = len(df)
+
+                with metrics.phase('decode', file=file) as m:
+                    buyers = defaultdict(list) if has_users else None
+                    records = decode_time_frame(df, file, first_row, buyers)
+                    m.rows = len(df)
+
+                with metrics.phase('aggregate', file=file) as m:
+                    if len(records):
+                        counts = seasonal_counts(records.copy())
+                        for name in SEASONAL_PERIODS:
+                            batches[name].append(counts[name])
+                    for date, categories in zip(
+                        records['date'].to_numpy(dtype='datetime64[ns]').view('int64'),
+                        records['categories'],
+                    ):
+                        sorter.add((int(date), categories))
+                    if buyers:
+                        merge_sketches(distinct_buyers, sketch_buyers(buyers))
+                    m.rows = len(records)
+                n_records += len(records)
+        dead_letters.close(metrics)
+        print(f"已处理 {n_records} 条时间序列记录，溢写 {sorter.runs} 个有序段")
+        metrics.count('spilled_runs', sorter.runs)
+
+        with metrics.phase('write', file=DISTINCT_BUYERS_FILE) as m:
+            save_distinct_buyers(distinct_buyers)
+            m.rows = len(distinct_buyers)
+
+        with metrics.phase('aggregate', file="sequence") as m:
+            seq_df = top_sequences(
+                count_sequences(record[1] for record in sorter.sorted())
+            )
+            m.rows = n_records
+
+    seasonal = []
+    for name in SEASONAL_PERIODS:
+        counts = pd.concat(batches[name]) if batches[name] else pd.Series(dtype='int64')
+        seasonal.append(top_table(counts.groupby(level=[0, 1]).sum()))
+    return tuple(seasonal), seq_df
+
+
+def visualize_sequence_patterns(seq_df, output_dir):
+    """可视化时序模式"""
+    plt = load_pyplot(PLOT_STYLE)
+    plt.figure(figsize=(14, 10))
+    seq_df['sequence'] = seq_df.apply(lambda x: f"{x['A']} → {x['B']}", axis=1)
+    plt.barh(seq_df['sequence'], seq_df['count'], color='skyblue')
+    plt.xlabel("出现次数")
+    plt.ylabel("时序模式")
+    plt.title("Top 30 时序购买模式（A → B）")
+    plt.gca().invert_yaxis()
+    plt.tight_layout()
+    plt.savefig(
+        os.path.join(output_dir, "4_时序模式.png"), bbox_inches='tight', dpi=300
+    )
+    plt.close()
+
+
+def main():
+    seq_df = None
+    if progressive:
+        print("渐进模式：随机抽取行组估计季节性模式...")
+        quarterly, monthly, weekday = estimate_seasonal_patterns()
+    elif memory_budget_mb:
+        print(
+            f"内存预算模式（{memory_budget_mb} MB）：逐行组读取，超出预算时溢写到磁盘..."
+        )
+        (quarterly, monthly, weekday), seq_df = analyze_within_budget()
+    else:
+        print("开始加载数据...")
+        time_df, distinct_buyers = load_time_series_data()
+        print(f"已加载 {len(time_df)} 条时间序列记录")
+        with metrics.phase('write', file=DISTINCT_BUYERS_FILE) as m:
+            save_distinct_buyers(distinct_buyers)
+            m.rows = len(distinct_buyers)
+
+        print("\n分析季节性模式...")
+        with metrics.phase('aggregate', file="seasonal") as m:
+            quarterly, monthly, weekday = analyze_seasonal_patterns(time_df)
+            m.rows = len(time_df)
+
+        print("\n分析时序购买模式...")
+        with metrics.phase('aggregate', file="sequence") as m:
+            seq_df = analyze_sequence_patterns(time_df)
+            m.rows = len(time_df)
+    jobs = [
+        ChartJob(
+            "seasonal",
+            visualize_seasonal,
+            args=({'quarterly': quarterly, 'monthly': monthly, 'weekday': weekday},),
+            config={'output_dir': output_dir, 'top_categories': top_categories},
+            outputs=["1_季度趋势.png", "2_月度趋势.png", "3_周分布.png"],
+        )
+    ]
+
+    if seq_df is None:
+        render_charts(jobs, output_dir, metrics=metrics)
+        metrics.write(output_dir)
+        print(f"分析结果已保存至：{output_dir}")
+        return
+
+    seq_df['sequence'] = seq_df.apply(lambda x: f"{x['A']} → {x['B']}", axis=1)
+    jobs.append(
+        ChartJob(
+            "sequence",
+            visualize_sequence_patterns,
+            args=(seq_df, output_dir),
+            outputs=["4_时序模式.png"],
+        )
+    )
+    render_charts(jobs, output_dir, metrics=metrics)
+    seq_df.to_csv(
+        os.path.join(output_dir, "时序模式结果.csv"), index=False, encoding='utf-8-sig'
+    )
+    metrics.write(output_dir)
+    print(f"分析结果已保存至：{output_dir}")
+
+
+if __name__ == "__main__":
+    run_profiled(main, output_dir, "3_time_analysis")
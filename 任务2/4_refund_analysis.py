@@ -1,92 +1,172 @@
-import os
-import json
-import pandas as pd
-import matplotlib.pyplot as plt
-from collections import defaultdict
-
-# 配置参数
-input_dir = "C:/Users/East/Desktop/预处理数据/30G"
-output_dir = "C:/Users/East/Desktop/output2/30g/4"
-target_status = ["已退款", "部分退款"]
-
-# 中文显示设置
-plt.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei', 'KaiTi']
-plt.rcParams['axes.unicode_minus'] = False
-
-
-def load_refund_transactions():
-    """加载退款交易数据并提取商品组合"""
-    refund_combinations = defaultdict(int)
-
-    for file in os.listdir(input_dir):
-        if file.endswith(".parquet"):
-            file_path = os.path.join(input_dir, file)
-            df = pd.read_parquet(file_path, columns=['payment_status', 'items_json'])
-
-            for _, row in df[df['payment_status'].isin(target_status)].iterrows():
-                try:
-                    items = json.loads(row['items_json'])
-                    categories = list(set([item['parent_category'] for item in items]))
-                    if len(categories) > 1:  # 只考虑组合情况
-                        key = tuple(sorted(categories))
-                        refund_combinations[key] += 1
-                except Exception as e:
-                    print(f"数据处理错误：{str(e)}")
-
-    return refund_combinations
-
-
-def analyze_refund_combinations(combinations_dict):
-    """分析退款组合模式"""
-    combinations_list = [
-        {'categories': ' & '.join(k), 'count': v} for k, v in combinations_dict.items()
-    ]
-    df = pd.DataFrame(combinations_list)
-    return df.sort_values('count', ascending=False).head(30)
-
-
-def visualize_refund_patterns(df):
-    """可视化退款组合模式"""
-    os.makedirs(output_dir, exist_ok=True)
-
-    plt.figure(figsize=(16, 12))
-    ax = df.plot.barh(x='categories', y='count', color='#1f77b4', legend=False)
-
-    # 添加数据标签
-    for i, (value, name) in enumerate(zip(df['count'], df['categories'])):
-        ax.text(value + 0.5, i, str(value), ha='left', va='center', fontsize=10)
-
-    # 图表装饰
-    plt.title("高频退款商品组合TOP30", fontsize=14)
-    plt.xlabel("出现次数", fontsize=12)
-    plt.ylabel("商品组合", fontsize=12)
-    plt.gca().invert_yaxis()
-    plt.grid(axis='x', alpha=0.3)
-
-    # 调整布局
-    plt.tight_layout()
-
-    # 保存结果
-    img_path = os.path.join(output_dir, "refund_combinations.png")
-    csv_path = os.path.join(output_dir, "refund_combinations.csv")
-    plt.savefig(img_path, bbox_inches='tight', dpi=300)
-    df.to_csv(csv_path, index=False, encoding='utf-8-sig')
-    print(f"结果已保存至：\n{img_path}\n{csv_path}")
-
-
-def main():
-    print("开始加载退款数据...")
-    combinations = load_refund_transactions()
-    print(f"发现有效退款组合：{len(combinations)}种")
-
-    if not combinations:
-        print("没有找到退款组合记录")
-        return
-
-    print("\n分析高频退款组合...")
-    top_combinations = analyze_refund_combinations(combinations)
-    visualize_refund_patterns(top_combinations)
-
-
-if __name__ == "__main__":
-    main()
+import os
+import pandas as pd
+from collections import defaultdict
+from run_metrics import RunMetrics, parquet_bytes
+from dataset_io import list_data_files, read_columns, data_bytes
+from profiling import run_profiled
+from chart_render import ChartJob, render_charts, load_pyplot
+from pipeline import code_fingerprint
+from partial_cache import PartialCache, encode_counter, decode_counter, merge_counts
+from dead_letter import DeadLetterSink
+from bitmap_index import read_indexed_rows
+from order_items import (
+    DEFAULT_CATALOG_FILE,
+    load_catalog,
+    catalog_fingerprint,
+    item_columns,
+    attach_items,
+)
+
+# 配置参数
+input_dir = "C:/Users/East/Desktop/预处理数据/30G"
+output_dir = "C:/Users/East/Desktop/output2/30g/4"
+target_status = ["已退款", "部分退款"]
+use_cache = True  # 缓存每个文件的部分统计，重跑时只扫描新增/变化的文件
+cache_dir = None  # 缓存目录，默认 input_dir/.partial_cache
+use_bitmap_index = True  # 有预处理写出的位图索引时只读取退款订单所在的行组与行
+# 商品目录：扫描时按商品ID关联当前目录的类别，None表示使用预处理写入的类别
+catalog_file = DEFAULT_CATALOG_FILE
+
+# 中文显示设置
+PLOT_STYLE = {
+    'font.sans-serif': ['SimHei', 'Microsoft YaHei', 'KaiTi'],
+    'axes.unicode_minus': False,
+}
+
+metrics = RunMetrics("4_refund_analysis")
+dead_letters = DeadLetterSink("4_refund_analysis")
+
+
+def count_file_refunds(file_path):
+    """统计单个文件的退款组合（可缓存、可合并的部分结果）"""
+    file = os.path.basename(file_path)
+    refund_combinations = defaultdict(int)
+
+    catalog = load_catalog(catalog_file)
+    items_columns = item_columns(file_path, catalog)
+    columns = ['payment_status'] + items_columns
+    with metrics.phase('read', file=file) as m:
+        indexed = None
+        if use_bitmap_index:
+            indexed = read_indexed_rows(
+                file_path, items_columns, 'payment_status', target_status
+            )
+        if indexed is None:
+            df = read_columns(file_path, columns=columns)
+            m.bytes = data_bytes(file_path, columns)
+        else:
+            # 索引命中的行即为退款订单，只读取其所在行组的商品明细
+            df, row_groups = indexed
+            if file_path.endswith(".parquet"):
+                m.bytes = parquet_bytes(file_path, items_columns, row_groups)
+            else:
+                m.bytes = data_bytes(file_path, items_columns)
+            metrics.count('indexed_row_groups', len(row_groups))
+        m.rows = len(df)
+
+    with metrics.phase('aggregate', file=file) as m:
+        refunds = df
+        if indexed is None:
+            refunds = df[df['payment_status'].isin(target_status)]
+        items = attach_items(refunds, catalog)
+        for position, error, value in items.errors:
+            dead_letters.add(file, refunds.index[position], error, value)
+        for categories in items.category_sets():
+            if len(categories) > 1:  # 只考虑组合情况
+                refund_combinations[categories] += 1
+        m.rows = len(refunds)
+
+    return encode_counter(refund_combinations)
+
+
+def load_refund_transactions():
+    """加载退款交易数据并提取商品组合"""
+    refund_combinations = defaultdict(int)
+    dead_letters.open(output_dir)
+    cache = PartialCache(
+        cache_dir or os.path.join(input_dir, ".partial_cache"),
+        "4_refund_analysis",
+        {
+            'target_status': sorted(target_status),
+            'catalog': catalog_fingerprint(load_catalog(catalog_file)),
+        },
+        enabled=use_cache,
+        code=code_fingerprint(__file__),
+    )
+
+    for file in list_data_files(input_dir):
+        file_path = os.path.join(input_dir, file)
+        partial = cache.get_or_compute(file_path, count_file_refunds, dead_letters)
+        merge_counts(refund_combinations, decode_counter(partial))
+
+    dead_letters.close(metrics)
+    metrics.count('cache_hits', cache.hits)
+    metrics.count('cache_misses', cache.misses)
+    print(f"缓存命中 {cache.hits} 个文件，新扫描 {cache.misses} 个文件")
+    return refund_combinations
+
+
+def analyze_refund_combinations(combinations_dict):
+    """分析退款组合模式"""
+    combinations_list = [
+        {'categories': ' & '.join(k), 'count': v} for k, v in combinations_dict.items()
+    ]
+    df = pd.DataFrame(combinations_list)
+    return df.sort_values('count', ascending=False).head(30)
+
+
+def visualize_refund_patterns(df):
+    """可视化退款组合模式"""
+    plt = load_pyplot(PLOT_STYLE)
+    os.makedirs(output_dir, exist_ok=True)
+
+    plt.figure(figsize=(16, 12))
+    ax = df.plot.barh(x='categories', y='count', color='#1f77b4', legend=False)
+
+    # 添加数据标签
+    for i, (value, name) in enumerate(zip(df['count'], df['categories'])):
+        ax.text(value + 0.5, i, str(value), ha='left', va='center', fontsize=10)
+
+    # 图表装饰
+    plt.title("高频退款商品组合TOP30", fontsize=14)
+    plt.xlabel("出现次数", fontsize=12)
+    plt.ylabel("商品组合", fontsize=12)
+    plt.gca().invert_yaxis()
+    plt.grid(axis='x', alpha=0.3)
+
+    # 调整布局
+    plt.tight_layout()
+
+    # 保存结果
+    img_path = os.path.join(output_dir, "refund_combinations.png")
+    csv_path = os.path.join(output_dir, "refund_combinations.csv")
+    plt.savefig(img_path, bbox_inches='tight', dpi=300)
+    df.to_csv(csv_path, index=False, encoding='utf-8-sig')
+    print(f"结果已保存至：\n{img_path}\n{csv_path}")
+
+
+def main():
+    print("开始加载退款数据...")
+    combinations = load_refund_transactions()
+    print(f"发现有效退款组合：{len(combinations)}种")
+
+    if not combinations:
+        print("没有找到退款组合记录")
+        return
+
+    print("\n分析高频退款组合...")
+    top_combinations = analyze_refund_combinations(combinations)
+    job = ChartJob(
+        "refund_combinations",
+        visualize_refund_patterns,
+        args=(top_combinations,),
+        config={'output_dir': output_dir},
+        outputs=["refund_combinations.png", "refund_combinations.csv"],
+    )
+    render_charts([job], output_dir, metrics=metrics)
+
+    metrics.write(output_dir)
+
+
+if __name__ == "__main__":
+    run_profiled(main, output_dir, "4_refund_analysis")
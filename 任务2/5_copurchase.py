@@ -0,0 +1,78 @@
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from run_metrics import RunMetrics
+from dataset_io import list_data_files, data_columns
+from profiling import run_profiled
+from copurchase import MATRIX_FILE, CoPurchaseMatrix, file_matrix
+
+# 配置参数
+input_dir = "C:/Users/East/Desktop/预处理数据/30G"
+output_dir = "C:/Users/East/Desktop/output2/30g/5"
+top_k = 10  # 每个商品输出的共购商品数
+min_co_orders = 5  # 共购订单数少于该值的商品对不参与排序（提升度不可靠）
+workers = min(os.cpu_count() or 1, 4)  # 并行构建各文件部分矩阵的进程数，1表示串行
+
+metrics = RunMetrics("5_copurchase")
+
+
+def build_matrix(files):
+    """各文件的部分矩阵（可在进程池中并行构建）依次合并为全量矩阵"""
+    paths = [os.path.join(input_dir, file) for file in files]
+    matrix = CoPurchaseMatrix()
+    if workers > 1 and len(paths) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(paths))) as executor:
+            partials = executor.map(file_matrix, paths)
+            for file, partial in zip(files, partials):
+                with metrics.phase('aggregate', file=file) as m:
+                    matrix.merge(partial)
+                    m.rows = partial.orders
+    else:
+        for file, path in zip(files, paths):
+            with metrics.phase('aggregate', file=file) as m:
+                partial = file_matrix(path)
+                matrix.merge(partial)
+                m.rows = partial.orders
+    return matrix
+
+
+def main():
+    files = list_data_files(input_dir)
+    missing = [
+        f for f in files if 'item_ids' not in data_columns(os.path.join(input_dir, f))
+    ]
+    if missing:
+        sys.exit(
+            f"{len(missing)} 个文件没有 item_ids 列（旧版预处理结果），"
+            "请重新运行 0_preprocess.py"
+        )
+
+    print(f"开始构建共购矩阵（{len(files)} 个文件）...")
+    matrix = build_matrix(files)
+    print(
+        f"共 {matrix.orders:,} 个订单、{(matrix.item_orders > 0).sum():,} 个商品，"
+        f"{matrix.pairs.nnz // 2:,} 个共购商品对"
+    )
+
+    os.makedirs(output_dir, exist_ok=True)
+    with metrics.phase('write', file=MATRIX_FILE) as m:
+        matrix.save(os.path.join(output_dir, MATRIX_FILE))
+        m.rows = matrix.pairs.nnz
+
+    print(f"\n计算每个商品的TOP{top_k}共购商品...")
+    with metrics.phase('aggregate', file="top_k") as m:
+        table = matrix.top_k_table(top_k, min_co_orders)
+        m.rows = len(table)
+    table.to_csv(
+        os.path.join(output_dir, f"商品共购TOP{top_k}.csv"),
+        index=False,
+        encoding='utf-8-sig',
+    )
+
+    metrics.write(output_dir)
+    print(f"分析结果已保存至：{output_dir}")
+
+
+if __name__ == "__main__":
+    run_profiled(main, output_dir, "5_copurchase")
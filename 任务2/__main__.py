@@ -0,0 +1,195 @@
+"""
+统一命令行入口（在仓库根目录运行）
+
+    python -m 任务2 [--config pipeline.json] <阶段> [--set 配置项=值 ...] [--profile sample]
+    python -m 任务2 [--config pipeline.json] run [阶段 ...] [--cpus N] [--memory-mb M]
+    python -m 任务2 [--config pipeline.json] query "SELECT ..."
+    python -m 任务2 [--config pipeline.json] serve [--port 8765]
+    python -m 任务2 export <trans.py 的参数>
+
+阶段只在运行时才加载对应脚本，matplotlib等重型依赖只在真正绘图时导入。
+"""
+
+import os
+import sys
+import json
+import runpy
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from stages import TASK1_DIR, TASK2_DIR, CATALOG_FILE, build_stages, load_script
+
+CONFIG_FILE = "pipeline.json"  # 未指定 --config 时读取当前目录下的该文件（若存在）
+
+# 自带命令行的工具：其后的参数原样交给脚本解析
+TOOLS = {
+    'export': os.path.join(TASK1_DIR, "trans.py"),
+    'query': os.path.join(TASK2_DIR, "query.py"),
+    'distinct': os.path.join(TASK2_DIR, "distinct_buyers.py"),
+    'neighbours': os.path.join(TASK2_DIR, "copurchase.py"),
+    'rerender': os.path.join(TASK2_DIR, "chart_render.py"),
+    'generate': os.path.join(TASK2_DIR, "gen_synthetic_data.py"),
+    'benchmark': os.path.join(TASK2_DIR, "benchmark.py"),
+}
+PIPELINE_COMMAND = 'run'  # 按依赖关系运行多个阶段
+SERVE_COMMAND = 'serve'  # 常驻分析服务
+
+
+def load_config(path):
+    """
+    读取JSON配置文件
+
+    {
+      "raw_dir": "原始数据目录",
+      "processed_dir": "预处理数据目录",
+      "output_dir": "分析结果根目录",
+      "catalog": "商品目录JSON（可选）",
+      "stages": {"payment": {"high_value_price": 8000}, ...},
+      "resources": {"time": {"cpus": 1, "memory_mb": 8192}, ...}
+    }
+    stages 中的键为对应脚本的模块级配置名；resources 覆盖 run 调度用的资源估计。
+    """
+    if path is None:
+        if not os.path.exists(CONFIG_FILE):
+            return {}
+        path = CONFIG_FILE
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def parse_overrides(items):
+    """--set key=value 列表 -> 字典（值按JSON解析，失败时作为字符串）"""
+    overrides = {}
+    for item in items:
+        key, value = item.split('=', 1)
+        try:
+            overrides[key] = json.loads(value)
+        except ValueError:
+            overrides[key] = value
+    return overrides
+
+
+def split_argv(argv, commands):
+    """以第一个命令名为界，把参数分为 全局选项 / 命令 / 命令自身的参数"""
+    for i, arg in enumerate(argv):
+        if arg in commands:
+            return argv[:i], arg, argv[i + 1 :]
+    return argv, None, []
+
+
+def build_parser(commands):
+    parser = argparse.ArgumentParser(
+        prog="python -m 任务2",
+        description="数据处理流水线统一入口",
+        allow_abbrev=False,
+    )
+    parser.add_argument('command', nargs='?', choices=commands, help="阶段或工具名")
+    parser.add_argument(
+        '--config', default=None, help=f"JSON配置文件（默认 {CONFIG_FILE}）"
+    )
+    parser.add_argument('--raw-dir', default=None)
+    parser.add_argument('--processed-dir', default=None)
+    parser.add_argument('--output-dir', default=None)
+    return parser
+
+
+def run_tool(script, argv):
+    """以 __main__ 方式运行自带命令行的脚本"""
+    sys.argv = [script] + argv
+    runpy.run_path(script, run_name='__main__')
+
+
+def run_stage(name, stage, config, argv):
+    """加载阶段脚本，依次应用目录配置、配置文件与 --set 覆盖，再运行入口函数"""
+    from profiling import parse_profile_args, run_profiled
+
+    parser = argparse.ArgumentParser(prog=f"python -m 任务2 {name}", allow_abbrev=False)
+    parser.add_argument(
+        '--set', action='append', default=[], help="覆盖脚本配置，如 --set top_n=20"
+    )
+    args, rest = parser.parse_known_args(argv)
+    # 剩余参数只能是分析开关（--profile 等）；脚本自身的命令行参数在此不生效，
+    # 须改用对应的配置项
+    _, unknown = parse_profile_args(rest)
+    if unknown:
+        parser.error(
+            f"无法识别的参数：{' '.join(unknown)}"
+            "（脚本配置请用 --set 覆盖，如 --set LOCAL_WORKERS=2）"
+        )
+
+    if any(a is None for a in stage.get('args', [])):
+        sys.exit(f"阶段 {name} 需要在配置文件或命令行中指定 raw_dir 与 output_dir")
+
+    sys.path.insert(0, os.path.dirname(stage['script']))
+    module = load_script(stage['script'], f"stage_{name}")
+    # 未配置的目录沿用脚本中的默认值
+    settings = {k: v for k, v in stage.get('config', {}).items() if v is not None}
+    settings.update(config.get('stages', {}).get(name, {}))
+    settings.update(parse_overrides(args.set))
+    for key, value in settings.items():
+        if not hasattr(module, key):
+            sys.exit(f"{os.path.basename(stage['script'])} 没有配置项：{key}")
+        setattr(module, key, value)
+
+    sys.argv = [stage['script']] + rest  # 剩余参数交给 run_profiled（--profile 等）
+    script_name = os.path.splitext(os.path.basename(stage['script']))[0]
+    entry = getattr(module, stage.get('entry', 'main'))
+    # 分析结果写入脚本最终生效的输出目录
+    output = getattr(module, 'output_dir', None) or getattr(
+        module, 'PROCESSED_DIR', stage['output']
+    )
+    return run_profiled(
+        entry,
+        output,
+        script_name,
+        *stage.get('args', []),
+        **stage.get('kwargs', {}),
+    )
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    stage_names = list(build_stages(None, None, None))
+    commands = stage_names + list(TOOLS) + [PIPELINE_COMMAND, SERVE_COMMAND]
+    global_argv, command, command_argv = split_argv(argv, commands)
+
+    parser = build_parser(commands)
+    args = parser.parse_args(global_argv + ([command] if command else []))
+    if args.command is None:
+        parser.print_help()
+        return
+
+    config = load_config(args.config)
+    raw = args.raw_dir or config.get('raw_dir')
+    processed = args.processed_dir or config.get('processed_dir')
+    out = args.output_dir or config.get('output_dir')
+
+    if command in TOOLS:
+        # 查询工具默认查询配置中的预处理目录
+        if command == 'query' and processed and '--input' not in command_argv:
+            command_argv = ['--input', processed] + command_argv
+        return run_tool(TOOLS[command], command_argv)
+
+    stages = build_stages(raw, processed, out, config.get('catalog') or CATALOG_FILE)
+    if command == PIPELINE_COMMAND:
+        from pipeline import run_pipeline
+
+        # 子进程沿用同一配置文件与目录参数
+        cli_args = [] if args.config is None else ['--config', args.config]
+        for flag, value in [
+            ('--raw-dir', args.raw_dir),
+            ('--processed-dir', args.processed_dir),
+            ('--output-dir', args.output_dir),
+        ]:
+            if value is not None:
+                cli_args += [flag, value]
+        return run_pipeline(stages, config, cli_args, out, command_argv)
+    if command == SERVE_COMMAND:
+        from analysis_server import serve
+
+        return serve(stages, config, processed, command_argv)
+    return run_stage(command, stages[command], config, command_argv)
+
+
+if __name__ == "__main__":
+    main()
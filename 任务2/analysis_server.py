@@ -0,0 +1,246 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import urllib.request
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl
+
+import pandas as pd
+import chart_render
+from stages import load_script
+from pipeline import stage_fingerprint
+from dataset_io import list_data_files, pin_files, resident_bytes
+
+# 可通过服务运行的分析阶段（都只读取预处理数据）
+ANALYSES = ['category_rules', 'new_rule', 'payment', 'time', 'refund']
+DEFAULT_HOST = "127.0.0.1"  # 只监听本机
+DEFAULT_PORT = 8765
+MAX_RESULTS = 64  # 内存中保留的分析结果数，超出时淘汰最久未使用的
+
+
+def parse_value(value):
+    """请求参数值按JSON解析，失败时作为字符串（与 --set 相同）"""
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+def file_mtimes(output_dir):
+    """输出目录中全部文件的 相对路径 -> 修改时间"""
+    mtimes = {}
+    for root, _, files in os.walk(output_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            mtimes[os.path.relpath(path, output_dir)] = os.stat(path).st_mtime_ns
+    return mtimes
+
+
+def read_table(path):
+    """CSV结果 -> {'columns': [...], 'data': [[...], ...]}"""
+    df = pd.read_csv(path, encoding='utf-8-sig')
+    return json.loads(df.to_json(orient='split', index=False, force_ascii=False))
+
+
+class AnalysisServer:
+    """
+    常驻分析服务：预处理数据常驻内存，分析结果按阶段指纹缓存
+
+    每个请求在本进程中加载阶段脚本（依赖库只导入一次）、应用配置后运行入口函数，
+    数据读取直接切片常驻的Arrow表，不再重复解压解码。阶段指纹与 run 命令相同，
+    包含代码、生效的配置与输入文件指纹，任一变化都会重新计算。脚本配置为模块级
+    变量，同一时间只运行一个分析。
+    """
+
+    def __init__(self, stages, config, processed_dir, max_results=MAX_RESULTS):
+        self.stages = stages
+        self.config = config
+        self.processed_dir = processed_dir
+        self.max_results = max_results
+        self.results = OrderedDict()  # 阶段指纹 -> 分析结果
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def refresh(self):
+        """常驻预处理目录中的数据文件（只重新读取变化的文件），返回新读取的文件数"""
+        files = list_data_files(self.processed_dir)
+        return pin_files(os.path.join(self.processed_dir, f) for f in files)
+
+    def settings(self, name, params):
+        """生效的配置：目录配置 < 配置文件 < 请求参数（与命令行 --set 的优先级相同）"""
+        stage = self.stages[name]
+        settings = {k: v for k, v in stage.get('config', {}).items() if v is not None}
+        settings.update(self.config.get('stages', {}).get(name, {}))
+        settings.update(params)
+        return settings
+
+    def run(self, name, params):
+        """运行（或从缓存返回）一个分析，返回结果字典"""
+        with self.lock:
+            self.refresh()
+            stage = self.stages[name]
+            settings = self.settings(name, params)
+            input_dir = settings.get('input_dir', stage['input'])
+            key = stage_fingerprint(dict(stage, input=input_dir), settings)
+            if key in self.results:
+                self.results.move_to_end(key)
+                self.hits += 1
+                return dict(self.results[key], cached=True)
+            self.misses += 1
+            result = self.compute(name, settings)
+            self.results[key] = result
+            if len(self.results) > self.max_results:
+                self.results.popitem(last=False)
+            return dict(result, cached=False)
+
+    def compute(self, name, settings):
+        stage = self.stages[name]
+        module = load_script(stage['script'], f"serve_{name}")
+        for key, value in settings.items():
+            if not hasattr(module, key):
+                raise ValueError(
+                    f"{os.path.basename(stage['script'])} 没有配置项：{key}"
+                )
+            setattr(module, key, value)
+
+        output_dir = module.output_dir
+        before = file_mtimes(output_dir)
+        start = time.perf_counter()
+        getattr(module, stage.get('entry', 'main'))()
+        seconds = time.perf_counter() - start
+
+        # 本次写出（新建或更新）的文件；CSV结果随响应返回
+        outputs = sorted(
+            path
+            for path, mtime in file_mtimes(output_dir).items()
+            if before.get(path) != mtime
+        )
+        tables = {
+            path: read_table(os.path.join(output_dir, path))
+            for path in outputs
+            if path.endswith(".csv") and os.path.dirname(path) == ""
+        }
+        return {
+            'analysis': name,
+            'settings': settings,
+            'seconds': round(seconds, 3),
+            'output_dir': output_dir,
+            'outputs': outputs,
+            'tables': tables,
+        }
+
+    def status(self):
+        return {
+            'processed_dir': self.processed_dir,
+            'files': list_data_files(self.processed_dir),
+            'resident_mb': round(resident_bytes() / 2**20, 1),
+            'analyses': ANALYSES,
+            'cached_results': len(self.results),
+            'cache_hits': self.hits,
+            'cache_misses': self.misses,
+        }
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """
+    GET  /                       服务状态
+    GET  /analyses/<分析>?k=v    运行分析，参数为脚本的模块级配置名（值按JSON解析）
+    POST /analyses/<分析>        同上，参数为请求体中的JSON对象
+    """
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path in ('/', '/status'):
+            return self.reply(200, self.server.analysis.status())
+        params = {k: parse_value(v) for k, v in parse_qsl(url.query)}
+        self.analyse(url.path, params)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            params = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError as e:
+            return self.reply(400, {'error': f"请求体不是有效的JSON：{e}"})
+        if not isinstance(params, dict):
+            return self.reply(400, {'error': "请求体应为JSON对象"})
+        self.analyse(urlsplit(self.path).path, params)
+
+    def analyse(self, path, params):
+        prefix, _, name = path.strip('/').partition('/')
+        if prefix != 'analyses' or name not in ANALYSES:
+            return self.reply(
+                404, {'error': f"未知的分析：{path}", 'analyses': ANALYSES}
+            )
+        try:
+            result = self.server.analysis.run(name, params)
+        except (ValueError, SystemExit) as e:
+            return self.reply(400, {'error': str(e)})
+        except Exception as e:
+            return self.reply(500, {'error': f"{type(e).__name__}: {e}"})
+        self.reply(200, result)
+
+    def reply(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def request(name, params=None, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    """客户端：向运行中的分析服务提交一个分析，返回结果字典"""
+    req = urllib.request.Request(
+        f"http://{host}:{port}/analyses/{name}",
+        data=json.dumps(params or {}).encode('utf-8'),
+        headers={'Content-Type': 'application/json'},
+    )
+    with urllib.request.urlopen(req) as response:
+        return json.load(response)
+
+
+def serve(stages, config, processed, argv):
+    """python -m 任务2 serve [--host H] [--port P] [--max-results N]"""
+    parser = argparse.ArgumentParser(
+        prog="python -m 任务2 serve",
+        description="常驻分析服务：预处理数据常驻内存，通过本机HTTP接口运行分析",
+        allow_abbrev=False,
+    )
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument(
+        '--max-results', type=int, default=MAX_RESULTS, help="缓存的分析结果数"
+    )
+    parser.add_argument(
+        '--render-workers',
+        type=int,
+        default=1,
+        help="图表渲染进程数，默认1（在服务进程内渲染，matplotlib只导入一次）",
+    )
+    args = parser.parse_args(argv)
+    if processed is None:
+        sys.exit("分析服务需要在配置文件或命令行中指定 processed_dir")
+
+    chart_render.render_workers = args.render_workers
+    analysis = AnalysisServer(stages, config, processed, args.max_results)
+    start = time.perf_counter()
+    loaded = analysis.refresh()
+    print(
+        f"常驻 {loaded} 个数据文件（{resident_bytes() / 2**20:,.0f} MB，"
+        f"{time.perf_counter() - start:.1f} 秒）"
+    )
+
+    httpd = ThreadingHTTPServer((args.host, args.port), RequestHandler)
+    httpd.analysis = analysis
+    print(f"分析服务已启动：http://{args.host}:{args.port}/（Ctrl+C 停止）")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        print("分析服务已停止")
+    finally:
+        httpd.server_close()
@@ -0,0 +1,271 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import subprocess
+from datetime import datetime
+
+import pyarrow.parquet as pq
+from run_metrics import peak_rss_mb
+from stages import TASK1_DIR, TASK2_DIR, load_script
+from stages import build_stages as pipeline_stages
+from dataset_io import ARROW_EXTENSION, list_data_files, read_arrow_table
+
+# 配置参数（命令行参数可覆盖）
+work_dir = "C:/Users/East/Desktop/benchmark"  # 合成数据与各阶段输出目录
+results_dir = "C:/Users/East/Desktop/benchmark/results"  # 基准结果JSON目录
+
+
+def build_stages(work_dir):
+    """
+    定义基准阶段
+
+    与命令行入口共用流水线阶段定义（见 stages.py），另加抽样导出阶段
+    """
+    raw = os.path.join(work_dir, "raw")
+    processed = os.path.join(work_dir, "processed")
+    out = os.path.join(work_dir, "output")
+    stages = pipeline_stages(raw, processed, out)
+    # 每次运行都完整扫描：部分结果缓存命中时测得的是读缓存的耗时，不同运行之间不可比
+    for name in ('category_rules', 'payment', 'refund'):
+        stages[name]['config']['use_cache'] = False
+    stages['export'] = {
+        'script': os.path.join(TASK1_DIR, "trans.py"),
+        'entry': 'export_parquet',
+        'args': [
+            os.path.join(processed, "processed_part-00000.parquet"),
+            os.path.join(out, "export", "sample.csv"),
+        ],
+        'kwargs': {'mode': 'sample', 'rows': 10000},
+        'input': processed,
+        'output': os.path.join(out, "export"),
+        'setup_dirs': [os.path.join(out, "export")],
+    }
+    return stages
+
+
+def dataset_stats(folder):
+    """统计输入目录的行数与字节数"""
+    rows = 0
+    size = 0
+    for file in list_data_files(folder):
+        path = os.path.join(folder, file)
+        if file.endswith(ARROW_EXTENSION):
+            rows += read_arrow_table(path).num_rows
+        else:
+            rows += pq.ParquetFile(path).metadata.num_rows
+        size += os.path.getsize(path)
+    return rows, size
+
+
+def run_stage_in_process(name, work_dir):
+    """在当前（子）进程中执行单个阶段并返回计时结果"""
+    stage = build_stages(work_dir)[name]
+    for folder in stage.get('setup_dirs', []):
+        os.makedirs(folder, exist_ok=True)
+
+    # 脚本所在目录加入搜索路径，保证脚本间的相对导入可用
+    sys.path.insert(0, os.path.dirname(stage['script']))
+    module = load_script(stage['script'], f"bench_{name}")
+    for key, value in stage.get('config', {}).items():
+        setattr(module, key, value)
+
+    entry = getattr(module, stage.get('entry', 'main'))
+    rows, size = dataset_stats(stage['input'])
+
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    entry(*stage.get('args', []), **stage.get('kwargs', {}))
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    return {
+        'stage': name,
+        'wall_seconds': round(wall, 4),
+        'cpu_seconds': round(cpu, 4),
+        'input_rows': rows,
+        'input_bytes': size,
+        'rows_per_second': round(rows / wall, 1) if wall > 0 else None,
+        'mb_per_second': round(size / 1024**2 / wall, 3) if wall > 0 else None,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def run_stage(name, work_dir):
+    """在独立子进程中运行阶段，使峰值内存互不干扰"""
+    env = dict(os.environ, MPLBACKEND='Agg')
+    proc = subprocess.run(
+        [
+            sys.executable,
+            os.path.abspath(__file__),
+            '--child',
+            name,
+            '--work-dir',
+            work_dir,
+        ],
+        env=env,
+        capture_output=True,
+        text=True,
+        encoding='utf-8',
+    )
+    # 子进程最后一行输出为结果JSON，其余为脚本自身日志
+    lines = proc.stdout.strip().splitlines()
+    if proc.returncode != 0 or not lines:
+        print(proc.stdout)
+        print(proc.stderr)
+        return {'stage': name, 'error': proc.stderr.strip().splitlines()[-1:]}
+    return json.loads(lines[-1])
+
+
+def git_revision():
+    """当前提交号，用于区分不同版本的基准结果"""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=TASK2_DIR,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    except OSError:
+        return ''
+
+
+def dataset_dir(work_dir, scale, files, rows, seed):
+    """合成数据及各阶段输出的目录，按规模/文件数/行数/种子区分"""
+    return os.path.join(work_dir, f"{scale}-{files}x{rows}-seed{seed}")
+
+
+def run_benchmark(work_dir, stages, scale, files, rows, seed, repeat=1):
+    """
+    生成合成数据并依次测量各阶段
+
+    每种数据参数使用单独的目录，只在该目录中复用已生成的原始数据；每次运行阶段前
+    清空其输出目录，部分结果缓存、图表跳过等不会使后续运行只测到缓存命中。
+    """
+    gen = load_script(os.path.join(TASK2_DIR, "gen_synthetic_data.py"), "gen_data")
+    n_files, rows_per_file = gen.SCALES[scale]
+    files = files or n_files
+    rows = rows or rows_per_file
+    data_dir = dataset_dir(work_dir, scale, files, rows, seed)
+    raw = os.path.join(data_dir, "raw")
+    if not os.path.isdir(raw) or not os.listdir(raw):
+        gen.generate_dataset(raw, files, rows, seed=seed)
+
+    definitions = build_stages(data_dir)
+    results = []
+    for name in stages:
+        for i in range(repeat):
+            print(f"运行阶段：{name}（第 {i + 1}/{repeat} 次）")
+            output = definitions[name].get('output')
+            if output:
+                shutil.rmtree(output, ignore_errors=True)
+            result = run_stage(name, data_dir)
+            result['repeat'] = i
+            results.append(result)
+            if 'error' in result:
+                print(f"  失败：{result['error']}")
+            else:
+                print(
+                    f"  耗时 {result['wall_seconds']:.2f}s | "
+                    f"{result['rows_per_second']:,} 行/秒 | "
+                    f"峰值内存 {result['peak_rss_mb']} MB"
+                )
+
+    return {
+        'revision': git_revision(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'scale': scale,
+        'files': files,
+        'rows_per_file': rows,
+        'seed': seed,
+        'work_dir': data_dir,
+        'python': sys.version.split()[0],
+        'results': results,
+    }
+
+
+def compare_reports(base_path, new_path):
+    """对比两次基准结果，按阶段输出耗时与内存变化"""
+    with open(base_path, encoding='utf-8') as f:
+        base = json.load(f)
+    with open(new_path, encoding='utf-8') as f:
+        new = json.load(f)
+
+    def best(report):
+        # 多次重复取最快一次
+        table = {}
+        for r in report['results']:
+            if 'error' in r:
+                continue
+            if (
+                r['stage'] not in table
+                or r['wall_seconds'] < table[r['stage']]['wall_seconds']
+            ):
+                table[r['stage']] = r
+        return table
+
+    keys = ('scale', 'files', 'rows_per_file', 'seed')
+    if [base.get(k) for k in keys] != [new.get(k) for k in keys]:
+        print("注意：两次基准的数据规模或种子不同，耗时不能直接比较")
+    base_best, new_best = best(base), best(new)
+    print(f"{'阶段':<16}{'基准(s)':>10}{'当前(s)':>10}{'变化':>10}{'内存变化(MB)':>14}")
+    for stage in base_best:
+        if stage not in new_best:
+            continue
+        b, n = base_best[stage], new_best[stage]
+        change = (n['wall_seconds'] - b['wall_seconds']) / b['wall_seconds']
+        mem = (n['peak_rss_mb'] or 0) - (b['peak_rss_mb'] or 0)
+        print(
+            f"{stage:<16}{b['wall_seconds']:>10.2f}{n['wall_seconds']:>10.2f}"
+            f"{change:>+10.1%}{mem:>+14.1f}"
+        )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="全流程规模基准测试")
+    parser.add_argument('--work-dir', default=work_dir)
+    parser.add_argument('--results-dir', default=results_dir)
+    parser.add_argument('--scale', default='tiny')
+    parser.add_argument('--files', type=int, default=None)
+    parser.add_argument('--rows', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--stages', default=None, help="逗号分隔，默认全部阶段")
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'))
+    parser.add_argument('--child', default=None, help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    if args.child:
+        result = run_stage_in_process(args.child, args.work_dir)
+        print(json.dumps(result, ensure_ascii=False))
+        return
+
+    if args.compare:
+        compare_reports(*args.compare)
+        return
+
+    stages = (
+        args.stages.split(',') if args.stages else list(build_stages(args.work_dir))
+    )
+    report = run_benchmark(
+        args.work_dir, stages, args.scale, args.files, args.rows, args.seed, args.repeat
+    )
+
+    os.makedirs(args.results_dir, exist_ok=True)
+    name = (
+        f"{report['timestamp'].replace(':', '')}_{report['revision'] or 'local'}.json"
+    )
+    path = os.path.join(args.results_dir, name)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"基准结果已保存至：{path}")
+
+
+if __name__ == "__main__":
+    main()
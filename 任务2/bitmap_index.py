@@ -0,0 +1,221 @@
+import os
+import json
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from dataset_io import list_row_groups, read_row_group
+from partial_cache import file_fingerprint
+from order_items import ITEMS, ITEMS_JSON, attach_items
+
+INDEX_EXTENSION = ".bitmap"  # 与数据文件同名的旁路索引（内容为Parquet表）
+CHUNK_BITS = 16  # 行号高16位选择容器，低16位存在容器内
+ARRAY_MAX = 4096  # 容器内不超过该数量时用有序数组，否则用8KB位图
+
+
+def index_path(data_path):
+    """数据文件对应的索引文件路径（.parquet 与 .arrow 同一份数据共用）"""
+    return os.path.splitext(data_path)[0] + INDEX_EXTENSION
+
+
+class RoaringBitmap:
+    """
+    压缩行号集合（Roaring位图）
+
+    行号按高16位分块，每块一个容器：稀疏时为uint16有序数组，稠密时为
+    65536位的位图（uint8，小端位序）。集合运算逐容器进行，两种容器的
+    结果按基数重新选择表示。
+    """
+
+    def __init__(self, containers=None):
+        self.containers = containers or {}  # 高16位 -> 容器
+
+    @staticmethod
+    def _container(lows):
+        if len(lows) <= ARRAY_MAX:
+            return lows.astype(np.uint16)
+        bits = np.zeros(1 << CHUNK_BITS, dtype=bool)
+        bits[lows] = True
+        return np.packbits(bits, bitorder='little')
+
+    @staticmethod
+    def _lows(container):
+        if container.dtype == np.uint16:
+            return container
+        bits = np.unpackbits(container, bitorder='little')
+        return np.flatnonzero(bits).astype(np.uint16)
+
+    @classmethod
+    def from_positions(cls, positions):
+        positions = np.unique(np.asarray(positions, dtype=np.int64))
+        containers = {}
+        if len(positions):
+            highs = positions >> CHUNK_BITS
+            starts = np.flatnonzero(np.diff(highs)) + 1
+            for chunk in np.split(positions, starts):
+                lows = chunk & ((1 << CHUNK_BITS) - 1)
+                containers[int(chunk[0] >> CHUNK_BITS)] = cls._container(lows)
+        return cls(containers)
+
+    def to_array(self):
+        """全部行号（int64，升序）"""
+        parts = [
+            (high << CHUNK_BITS) + self._lows(self.containers[high]).astype(np.int64)
+            for high in sorted(self.containers)
+        ]
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+    def __len__(self):
+        return sum(
+            len(c) if c.dtype == np.uint16 else int(np.unpackbits(c).sum())
+            for c in self.containers.values()
+        )
+
+    def __or__(self, other):
+        containers = dict(self.containers)
+        for high, container in other.containers.items():
+            mine = containers.get(high)
+            if mine is None:
+                containers[high] = container
+            elif mine.dtype == np.uint8 and container.dtype == np.uint8:
+                containers[high] = mine | container
+            else:
+                lows = np.union1d(self._lows(mine), self._lows(container))
+                containers[high] = self._container(lows)
+        return RoaringBitmap(containers)
+
+    def __and__(self, other):
+        containers = {}
+        for high in self.containers.keys() & other.containers.keys():
+            a, b = self.containers[high], other.containers[high]
+            if a.dtype == np.uint8 and b.dtype == np.uint8:
+                lows = self._lows(a & b)
+            else:
+                lows = np.intersect1d(self._lows(a), self._lows(b))
+            if len(lows):
+                containers[high] = self._container(lows)
+        return RoaringBitmap(containers)
+
+
+class BitmapIndex:
+    """
+    单个数据文件的位图索引：(列, 值) -> 含该值的行号集合
+
+    parent_category 为订单中出现过的商品父类别（按建索引时的商品目录），
+    payment_status 为支付状态。行号与数据文件中的行顺序一致（预处理写出排序之后）。
+    """
+
+    def __init__(self, bitmaps, num_rows, catalog=None):
+        self.bitmaps = bitmaps
+        self.num_rows = num_rows
+        self.catalog = catalog  # 建索引时商品目录的指纹
+
+    @classmethod
+    def build(cls, df):
+        positions = {}
+        if 'payment_status' in df.columns:
+            status = df['payment_status'].astype(str).to_numpy()
+            for value in np.unique(status):
+                positions[('payment_status', value)] = np.flatnonzero(status == value)
+        if ITEMS in df.columns or ITEMS_JSON in df.columns:
+            # 格式错误的行不进入任何位图，读取索引的分析不会再隔离它们
+            rows, codes, categories = attach_items(df).order_categories()
+            for code, category in enumerate(categories):
+                positions[('parent_category', category)] = rows[codes == code]
+        bitmaps = {
+            key: RoaringBitmap.from_positions(rows) for key, rows in positions.items()
+        }
+        return cls(bitmaps, len(df))
+
+    def lookup(self, column, values):
+        """列取值在values中的行（多个值取并集）"""
+        result = RoaringBitmap()
+        for value in values:
+            result = result | self.bitmaps.get((column, value), RoaringBitmap())
+        return result
+
+    def write(self, path, data_paths, catalog=None):
+        """
+        写出索引；data_paths 的指纹记入元数据，数据文件变化后索引自动失效
+
+        catalog 为建索引时商品目录的指纹（product_map_fingerprint）。
+        """
+        keys, highs, kinds, data = [], [], [], []
+        for key in sorted(self.bitmaps):
+            for high, container in sorted(self.bitmaps[key].containers.items()):
+                keys.append(key)
+                highs.append(high)
+                kinds.append('array' if container.dtype == np.uint16 else 'bitmap')
+                data.append(container.tobytes())
+        table = pa.table(
+            {
+                'column': [k[0] for k in keys],
+                'value': [k[1] for k in keys],
+                'chunk': pa.array(highs, type=pa.int32()),
+                'kind': kinds,
+                'data': pa.array(data, type=pa.binary()),
+            }
+        )
+        meta = {
+            'num_rows': self.num_rows,
+            'files': {os.path.basename(p): file_fingerprint(p) for p in data_paths},
+            'catalog': catalog,
+        }
+        table = table.replace_schema_metadata({'bitmap_index': json.dumps(meta)})
+        tmp_path = f"{path}.tmp"
+        pq.write_table(table, tmp_path, compression='zstd')
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, data_path):
+        """读取数据文件的索引；索引不存在或与数据文件不匹配时返回None"""
+        path = index_path(data_path)
+        if not os.path.exists(path):
+            return None
+        table = pq.read_table(path)
+        meta = json.loads(table.schema.metadata[b'bitmap_index'])
+        fingerprint = meta['files'].get(os.path.basename(data_path))
+        if fingerprint != file_fingerprint(data_path):
+            return None
+        containers = {}
+        for column, value, high, kind, data in zip(
+            *(table.column(name).to_pylist() for name in table.column_names)
+        ):
+            dtype = np.uint16 if kind == 'array' else np.uint8
+            containers.setdefault((column, value), {})[high] = np.frombuffer(
+                data, dtype=dtype
+            )
+        bitmaps = {key: RoaringBitmap(c) for key, c in containers.items()}
+        return cls(bitmaps, meta['num_rows'], meta.get('catalog'))
+
+
+def read_indexed_rows(path, columns, column, values, catalog=None):
+    """
+    只读取 column 取值在 values 中的行
+
+    按索引定位命中的行组，跳过没有命中行的行组，在读入的行组中只保留命中行；
+    返回 (DataFrame, 读取的行组序号列表)，DataFrame的索引为文件内行号。
+    没有可用索引时返回None，调用方应退回全表扫描。catalog 为扫描时关联的
+    商品目录，其与建索引时的目录不同时父类别索引已过期，同样返回None。
+    """
+    index = BitmapIndex.load(path)
+    if index is None:
+        return None
+    if column == 'parent_category' and catalog is not None:
+        if index.catalog != catalog.fingerprint:
+            return None
+    positions = index.lookup(column, values).to_array()
+    frames, row_groups = [], []
+    for group, first_row, rows in list_row_groups(path):
+        lo, hi = np.searchsorted(positions, [first_row, first_row + rows])
+        if lo == hi:
+            continue
+        selected = positions[lo:hi]
+        df = read_row_group(path, group, columns).take(selected - first_row)
+        df.index = selected
+        frames.append(df)
+        row_groups.append(group)
+    if not frames:
+        return pd.DataFrame(columns=columns), row_groups
+    return pd.concat(frames), row_groups
@@ -0,0 +1,91 @@
+import json
+import hashlib
+
+# 商品分类层级映射
+CATEGORY_TREE = {
+    "电子产品": [
+        "智能手机",
+        "笔记本电脑",
+        "平板电脑",
+        "智能手表",
+        "耳机",
+        "音响",
+        "相机",
+        "摄像机",
+        "游戏机",
+    ],
+    "服装": [
+        "上衣",
+        "裤子",
+        "裙子",
+        "内衣",
+        "鞋子",
+        "帽子",
+        "手套",
+        "围巾",
+        "外套",
+    ],
+    "食品": [
+        "零食",
+        "饮料",
+        "调味品",
+        "米面",
+        "水产",
+        "肉类",
+        "蛋奶",
+        "水果",
+        "蔬菜",
+    ],
+    "家居": ["家具", "床上用品", "厨具", "卫浴用品"],
+    "办公": ["文具", "办公用品"],
+    "运动户外": ["健身器材", "户外装备"],
+    "玩具": ["玩具", "模型", "益智玩具"],
+    "母婴": ["婴儿用品", "儿童课外读物"],
+    "汽车用品": ["车载电子", "汽车装饰"],
+}
+
+# 目录中可能出现的父类别（未归类的子类别记为"其他"）
+PARENT_CATEGORIES = list(CATEGORY_TREE) + ["其他"]
+
+
+def create_category_mapper():
+    # 反向映射：子类别 -> 父类别
+    reverse_mapper = {}
+    for parent, children in CATEGORY_TREE.items():
+        for child in children:
+            reverse_mapper[child] = parent
+    return reverse_mapper
+
+
+def load_product_catalog(catalog_file):
+    """加载商品目录并创建映射：商品ID -> 父类别/子类别/价格"""
+    with open(catalog_file, 'r', encoding='utf-8') as f:
+        catalog = json.load(f)
+
+    category_mapper = create_category_mapper()
+
+    product_map = {}
+    for product in catalog['products']:
+        parent_category = category_mapper.get(product['category'], "其他")
+        product_map[product['id']] = {
+            'parent_category': parent_category,
+            'sub_category': product['category'],
+            'price': product['price'],
+        }
+    return product_map
+
+
+def product_map_fingerprint(product_map):
+    """
+    解析后商品目录（商品ID -> 父类别/子类别/价格）的指纹
+
+    按解析结果而非目录文件计算，CATEGORY_TREE 调整导致的重新归类同样会改变指纹。
+    """
+    content = json.dumps(
+        sorted(
+            [product_id, p['parent_category'], p['sub_category'], p['price']]
+            for product_id, p in product_map.items()
+        ),
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
@@ -0,0 +1,329 @@
+import os
+import sys
+import json
+import pickle
+import hashlib
+import types
+import inspect
+import argparse
+import importlib.util
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+MANIFEST_FILE = ".render_manifest.json"  # 各图表上次渲染的指纹
+TABLES_DIR = "tables"  # 保存聚合结果，便于只改样式时重新出图
+render_workers = min(os.cpu_count() or 1, 4)  # 渲染进程数，1表示在当前进程串行渲染
+
+
+class ChartJob:
+    """
+    一个图表渲染任务
+
+    参数:
+        name: 任务名（清单与聚合表的文件名）
+        func: 脚本中的绘图函数（需为模块级函数）
+        args/kwargs: 传给绘图函数的聚合数据与参数
+        config: 绘图函数依赖的模块级配置（如 output_dir、top_n），子进程中会同步设置
+        outputs: 生成的文件（相对output_dir），全部存在且指纹未变时跳过
+    """
+
+    def __init__(self, name, func, args=(), kwargs=None, config=None, outputs=()):
+        self.name = name
+        self.script = os.path.abspath(inspect.getsourcefile(func))
+        self.module = func.__module__
+        self.func_name = func.__name__
+        self.source = inspect.getsource(func)
+        self.dependencies = referenced_globals(func)
+        self.args = tuple(args)
+        self.kwargs = kwargs or {}
+        self.config = config or {}
+        self.outputs = list(outputs)
+
+    def fingerprint(self):
+        """
+        数据、参数与绘图代码共同决定的指纹
+
+        绘图代码包括绘图函数源码，以及它用到的模块级样式常量（如 PLOT_STYLE）与
+        辅助函数（如 load_pyplot）的源码，只改样式或辅助函数同样会重新出图。
+        """
+        digest = hashlib.sha256()
+        digest.update(self.source.encode('utf-8'))
+        update_digest(
+            digest,
+            [self.dependencies, self.args, self.kwargs, self.config, self.outputs],
+        )
+        return digest.hexdigest()
+
+    def payload(self):
+        """子进程/重绘所需的全部信息（不含函数对象，避免按引用pickle的限制）"""
+        return {
+            'script': self.script,
+            'module': self.module,
+            'func_name': self.func_name,
+            'args': self.args,
+            'kwargs': self.kwargs,
+            'config': self.config,
+        }
+
+
+def _code_names(code):
+    """代码对象（含嵌套的推导式、lambda）引用的全局名"""
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names |= _code_names(const)
+    return names
+
+
+def referenced_globals(func):
+    """
+    绘图函数依赖的模块级对象：{名称: 源码或值}
+
+    沿全局名递归收集本仓库内（脚本目录与本目录）定义的函数源码，以及纯数据
+    常量（字符串、数字、字典、列表等）；第三方库与其他对象不计入。
+    """
+    roots = {
+        os.path.dirname(os.path.abspath(inspect.getsourcefile(func))),
+        os.path.dirname(os.path.abspath(__file__)),
+    }
+    found = {}
+    pending = [func]
+    while pending:
+        current = pending.pop()
+        for name in sorted(_code_names(current.__code__)):
+            if name in found or name not in current.__globals__:
+                continue
+            value = current.__globals__[name]
+            if inspect.isfunction(value):
+                source_file = inspect.getsourcefile(value)
+                if (
+                    source_file
+                    and os.path.dirname(os.path.abspath(source_file)) in roots
+                ):
+                    found[name] = inspect.getsource(value)
+                    pending.append(value)
+            elif _is_plain(value):
+                found[name] = value
+    return found
+
+
+def _is_plain(value):
+    """可稳定哈希的纯数据（repr不含对象地址）"""
+    if value is None or isinstance(value, (str, bytes, bool, int, float)):
+        return True
+    if isinstance(value, dict):
+        return all(_is_plain(k) and _is_plain(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return all(_is_plain(v) for v in value)
+    return False
+
+
+def update_digest(digest, obj):
+    """对常见数据结构做稳定哈希（与字典插入顺序无关）"""
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        digest.update(repr(type(obj)).encode())
+        if isinstance(obj, pd.DataFrame):
+            digest.update(repr(list(obj.columns)).encode('utf-8'))
+        digest.update(pd.util.hash_pandas_object(obj, index=True).values.tobytes())
+    elif isinstance(obj, np.ndarray):
+        digest.update(obj.tobytes())
+    elif isinstance(obj, dict):
+        digest.update(b'{')
+        for key in sorted(obj, key=repr):
+            digest.update(repr(key).encode('utf-8'))
+            update_digest(digest, obj[key])
+        digest.update(b'}')
+    elif isinstance(obj, (list, tuple)):
+        digest.update(b'[')
+        for item in obj:
+            update_digest(digest, item)
+        digest.update(b']')
+    else:
+        digest.update(repr(obj).encode('utf-8'))
+
+
+def load_module(script, module_name):
+    """取已加载的脚本模块；子进程（spawn）或重绘时按路径重新加载"""
+    module = sys.modules.get(module_name)
+    module_file = getattr(module, '__file__', None)
+    if module_file and os.path.abspath(module_file) == script:
+        return module
+    sys.path.insert(0, os.path.dirname(script))
+    spec = importlib.util.spec_from_file_location(
+        f"render_{os.path.splitext(os.path.basename(script))[0]}", script
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_pyplot(rc=None, seaborn_style=None):
+    """
+    延迟导入pyplot并应用绘图样式
+
+    matplotlib/seaborn导入耗时较长，脚本模块顶层不再导入，只有真正绘图的进程
+    （通常是渲染子进程）才付出这部分开销，只做统计的阶段启动更快。
+    """
+    import matplotlib.pyplot as plt
+
+    if rc:
+        plt.rcParams.update(rc)
+    if seaborn_style:
+        import seaborn as sns
+
+        sns.set_style(seaborn_style)
+    return plt
+
+
+def run_payload(payload):
+    """执行一个渲染任务（可在子进程中运行）"""
+    import matplotlib
+
+    matplotlib.use('Agg')  # 子进程无界面，统一使用非交互后端
+    module = load_module(payload['script'], payload['module'])
+    for key, value in payload['config'].items():
+        setattr(module, key, value)
+    getattr(module, payload['func_name'])(*payload['args'], **payload['kwargs'])
+
+
+def load_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(output_dir, manifest):
+    with open(os.path.join(output_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+
+def render_charts(jobs, output_dir, metrics=None, force=False, workers=None):
+    """
+    渲染一组图表：保存聚合表，跳过指纹未变的图表，其余在进程池中并行渲染
+
+    返回实际渲染的任务名列表
+    """
+    os.makedirs(os.path.join(output_dir, TABLES_DIR), exist_ok=True)
+    manifest = load_manifest(output_dir)
+
+    pending = []
+    for job in jobs:
+        payload = job.payload()
+        with open(os.path.join(output_dir, TABLES_DIR, f"{job.name}.pkl"), 'wb') as f:
+            pickle.dump(payload, f)
+
+        fingerprint = job.fingerprint()
+        outputs_exist = all(
+            os.path.exists(os.path.join(output_dir, p)) for p in job.outputs
+        )
+        if not force and outputs_exist and manifest.get(job.name) == fingerprint:
+            print(f"图表未变化，跳过：{job.name}")
+            continue
+        pending.append((job, payload, fingerprint))
+
+    if metrics is not None:
+        metrics.count('charts_skipped', len(jobs) - len(pending))
+        metrics.count('charts_rendered', len(pending))
+
+    workers = render_workers if workers is None else workers
+    workers = min(workers, len(pending))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                (job, fp, executor.submit(run_payload, payload))
+                for job, payload, fp in pending
+            ]
+            for job, fp, future in futures:
+                with _render_phase(metrics, job.name):
+                    future.result()
+                manifest[job.name] = fp
+    else:
+        for job, payload, fp in pending:
+            with _render_phase(metrics, job.name):
+                run_payload(payload)
+            manifest[job.name] = fp
+
+    save_manifest(output_dir, manifest)
+    return [job.name for job, _, _ in pending]
+
+
+def _render_phase(metrics, name):
+    """有计量对象时记录render阶段，否则为空上下文"""
+    if metrics is None:
+        return nullcontext()
+    return metrics.phase('render', file=name)
+
+
+def rerender(output_dir, names=None, overrides=None, workers=None):
+    """
+    不重新计算，直接用保存的聚合表重绘图表（调整样式后使用）
+
+    overrides: 覆盖绘图配置，如 {'top_n': 20}
+    """
+    table_dir = os.path.join(output_dir, TABLES_DIR)
+    manifest = load_manifest(output_dir)
+    payloads = []
+    for file in sorted(os.listdir(table_dir)):
+        if not file.endswith('.pkl'):
+            continue
+        name = file[: -len('.pkl')]
+        if names and name not in names:
+            continue
+        with open(os.path.join(table_dir, file), 'rb') as f:
+            payload = pickle.load(f)
+        payload['config'].update(overrides or {})
+        payloads.append((name, payload))
+
+    workers = render_workers if workers is None else workers
+    if min(workers, len(payloads)) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(payloads))) as executor:
+            for (name, _), future in zip(
+                payloads, [executor.submit(run_payload, p) for _, p in payloads]
+            ):
+                future.result()
+                print(f"已重绘：{name}")
+    else:
+        for name, payload in payloads:
+            run_payload(payload)
+            print(f"已重绘：{name}")
+
+    # 重绘后的图表与清单指纹不再对应，清除以便下次正常运行时重新判断
+    for name, _ in payloads:
+        manifest.pop(name, None)
+    save_manifest(output_dir, manifest)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="使用已保存的聚合表重绘图表")
+    parser.add_argument('output_dir')
+    parser.add_argument('--charts', default=None, help="逗号分隔的任务名，默认全部")
+    parser.add_argument(
+        '--set',
+        action='append',
+        default=[],
+        help="覆盖绘图配置，如 --set top_n=20（值按JSON解析）",
+    )
+    parser.add_argument('--workers', type=int, default=None)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    overrides = {}
+    for item in args.set:
+        key, value = item.split('=', 1)
+        try:
+            overrides[key] = json.loads(value)
+        except ValueError:
+            overrides[key] = value
+    rerender(
+        args.output_dir,
+        names=args.charts.split(',') if args.charts else None,
+        overrides=overrides,
+        workers=args.workers,
+    )
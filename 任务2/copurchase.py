@@ -0,0 +1,187 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from dataset_io import list_row_groups, read_row_group
+
+MATRIX_FILE = "copurchase_matrix.npz"  # 位于分析结果目录：合并后的共购矩阵
+
+
+class CoPurchaseMatrix:
+    """
+    商品×商品共购矩阵（CSR，行列下标为int32商品ID）
+
+    pairs[a, b] 为同时购买a与b的订单数（对称，对角线为0）；item_orders[a] 为
+    购买过a的订单数；orders 为订单总数。同一订单中重复出现的商品只计一次。
+    各文件/进程的部分矩阵可直接相加合并。scipy只在构建或读取矩阵时才导入。
+    """
+
+    def __init__(self, n_products=0):
+        from scipy import sparse
+
+        self.pairs = sparse.csr_matrix((n_products, n_products), dtype=np.int64)
+        self.item_orders = np.zeros(n_products, dtype=np.int64)
+        self.orders = 0
+
+    @property
+    def n_products(self):
+        return self.pairs.shape[0]
+
+    def _grow(self, n_products):
+        if n_products > self.n_products:
+            self.pairs.resize((n_products, n_products))
+            self.item_orders = np.pad(
+                self.item_orders, (0, n_products - len(self.item_orders))
+            )
+
+    def add_orders(self, lengths, ids):
+        """
+        并入一批订单：lengths 为各订单的商品数，ids 为按订单依次拼接的商品ID
+
+        整批向量化展开为 (a, b) 商品对后一次性累加，不逐单循环。
+        """
+        lengths = np.asarray(lengths, dtype=np.int64)
+        ids = np.asarray(ids, dtype=np.int32)
+        self.orders += len(lengths)
+        if not len(ids):
+            return
+        self._grow(int(ids.max()) + 1)
+        from scipy import sparse
+
+        # 订单内去重：按 (订单, 商品) 排序后去掉与前一项相同的元素
+        order = np.repeat(np.arange(len(lengths)), lengths)
+        sort = np.lexsort((ids, order))
+        order, ids = order[sort], ids[sort]
+        keep = np.ones(len(ids), dtype=bool)
+        keep[1:] = (order[1:] != order[:-1]) | (ids[1:] != ids[:-1])
+        order, ids = order[keep], ids[keep]
+        self.item_orders += np.bincount(ids, minlength=self.n_products)
+
+        # 每个元素与同一订单中的全部元素配对，去掉与自身的配对
+        counts = np.bincount(order, minlength=len(lengths))
+        starts = np.cumsum(counts) - counts
+        width = counts[order]
+        left = np.repeat(np.arange(len(ids)), width)
+        within = np.arange(len(left)) - np.repeat(np.cumsum(width) - width, width)
+        right = starts[order][left] + within
+        mask = left != right
+        batch = sparse.csr_matrix(
+            (
+                np.ones(int(mask.sum()), dtype=np.int64),
+                (ids[left[mask]], ids[right[mask]]),
+            ),
+            shape=self.pairs.shape,
+        )
+        self.pairs = self.pairs + batch
+
+    def merge(self, other):
+        self._grow(other.n_products)
+        other._grow(self.n_products)
+        self.pairs = self.pairs + other.pairs
+        self.item_orders = self.item_orders + other.item_orders
+        self.orders += other.orders
+        return self
+
+    def save(self, path):
+        pairs = self.pairs.tocsr()
+        np.savez_compressed(
+            path,
+            indptr=pairs.indptr,
+            indices=pairs.indices.astype(np.int32),
+            data=pairs.data,
+            item_orders=self.item_orders,
+            orders=np.array([self.orders]),
+        )
+
+    @classmethod
+    def load(cls, path):
+        from scipy import sparse
+
+        with np.load(path) as f:
+            matrix = cls()
+            n = len(f['item_orders'])
+            matrix.pairs = sparse.csr_matrix(
+                (f['data'], f['indices'], f['indptr']), shape=(n, n)
+            )
+            matrix.item_orders = f['item_orders']
+            matrix.orders = int(f['orders'][0])
+        return matrix
+
+    def neighbours(self, product, k=10, min_co_orders=1):
+        """
+        与product共购的前k个商品，按提升度降序
+
+        提升度 = P(a,b) / (P(a)·P(b))；共购订单数少于min_co_orders的商品对
+        不参与排序（样本太少时提升度不可靠）。
+        返回DataFrame：neighbour / co_orders / confidence / lift。
+        """
+        columns = ['neighbour', 'co_orders', 'confidence', 'lift']
+        if product >= self.n_products or not self.item_orders[product]:
+            return pd.DataFrame(columns=columns)
+        start, end = self.pairs.indptr[product], self.pairs.indptr[product + 1]
+        neighbour = self.pairs.indices[start:end]
+        co_orders = self.pairs.data[start:end]
+        keep = co_orders >= min_co_orders
+        neighbour, co_orders = neighbour[keep], co_orders[keep]
+        confidence = co_orders / self.item_orders[product]
+        lift = confidence * self.orders / self.item_orders[neighbour]
+        top = np.lexsort((-co_orders, -lift))[:k]
+        return pd.DataFrame(
+            {
+                'neighbour': neighbour[top],
+                'co_orders': co_orders[top],
+                'confidence': confidence[top],
+                'lift': lift[top],
+            },
+            columns=columns,
+        )
+
+    def top_k_table(self, k=10, min_co_orders=1):
+        """全部商品的前k个共购商品：product 列 + neighbours() 各列"""
+        frames = []
+        for product in np.flatnonzero(self.item_orders):
+            top = self.neighbours(product, k, min_co_orders)
+            if len(top):
+                top.insert(0, 'product', product)
+                frames.append(top)
+        if not frames:
+            return pd.DataFrame(
+                columns=['product', 'neighbour', 'co_orders', 'confidence', 'lift']
+            )
+        return pd.concat(frames, ignore_index=True)
+
+
+def file_matrix(path):
+    """单个预处理文件的部分共购矩阵（逐行组读取item_ids，可在工作进程中运行）"""
+    matrix = CoPurchaseMatrix()
+    for index, _, _ in list_row_groups(path):
+        item_ids = pa.array(read_row_group(path, index, ['item_ids'])['item_ids'].array)
+        lengths = pc.list_value_length(item_ids).fill_null(0).to_numpy()
+        matrix.add_orders(lengths, pc.list_flatten(item_ids).to_numpy())
+    return matrix
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="查询保存的共购矩阵中某些商品的共购商品"
+    )
+    parser.add_argument('matrix', help=f"共购矩阵文件，如 5/{MATRIX_FILE}")
+    parser.add_argument('products', nargs='+', type=int, help="商品ID")
+    parser.add_argument('-k', type=int, default=10, help="每个商品返回的数量")
+    parser.add_argument('--min-co-orders', type=int, default=1, help="最少共购订单数")
+    return parser.parse_args()
+
+
+def main(args):
+    matrix = CoPurchaseMatrix.load(args.matrix)
+    for product in args.products:
+        top = matrix.neighbours(product, args.k, args.min_co_orders)
+        orders = matrix.item_orders[product] if product < matrix.n_products else 0
+        print(f"商品 {product}（{orders:,} 个订单）：")
+        print(top.to_string(index=False) if len(top) else "  无共购记录")
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,182 @@
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from run_metrics import parquet_bytes
+from partial_cache import file_fingerprint
+
+PARQUET_EXTENSION = ".parquet"
+ARROW_EXTENSION = ".arrow"  # Arrow IPC文件格式（即Feather V2），不压缩以便内存映射
+
+# 常驻内存的数据文件（分析服务使用）：绝对路径 -> (Arrow表, 文件指纹, 行组列表)
+_resident = {}
+
+
+def arrow_path(parquet_path):
+    """同名Parquet文件对应的Arrow IPC文件路径"""
+    return os.path.splitext(parquet_path)[0] + ARROW_EXTENSION
+
+
+def list_data_files(input_dir):
+    """
+    列出预处理目录中的数据文件（文件名，已排序）
+
+    同一份数据同时有 .parquet 与 .arrow 时只取 .arrow：它可以直接内存映射，
+    无需解压和解码。
+    """
+    names = set(os.listdir(input_dir))
+    files = []
+    for name in sorted(names):
+        if name.endswith(ARROW_EXTENSION):
+            files.append(name)
+        elif name.endswith(PARQUET_EXTENSION):
+            if os.path.basename(arrow_path(name)) not in names:
+                files.append(name)
+    return files
+
+
+def to_pandas(table):
+    """
+    Arrow表/记录批 -> pandas DataFrame
+
+    列表列（item_ids、items）保留为Arrow支持的列（pd.ArrowDtype），不逐行转换为
+    Python列表；分析时直接对底层Arrow数组做列表展开。
+    """
+    return table.to_pandas(
+        types_mapper=lambda t: pd.ArrowDtype(t) if pa.types.is_list(t) else None
+    )
+
+
+def write_arrow(table, path, max_chunksize=None):
+    """
+    写出未压缩的Arrow IPC文件
+
+    max_chunksize 为每个记录批的最大行数（与Parquet的row_group_size相同），
+    使Arrow文件同样分成多个可独立读取的单元；None时每个表块写为一个记录批。
+    """
+    with pa.OSFile(path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table, max_chunksize=max_chunksize)
+
+
+def pin_files(paths):
+    """
+    把数据文件整表常驻内存，之后对这些文件的读取直接切片内存中的Arrow表
+
+    Arrow IPC文件为内存映射（零拷贝，热数据由页缓存保持），Parquet文件只解压
+    解码一次。已常驻且指纹未变的文件不重复读取，不在paths中的文件解除常驻。
+    返回本次新读取的文件数。
+    """
+    paths = {os.path.abspath(path) for path in paths}
+    for path in set(_resident) - paths:
+        del _resident[path]
+    loaded = 0
+    for path in sorted(paths):
+        fingerprint = file_fingerprint(path)
+        entry = _resident.get(path)
+        if entry is not None and entry[1] == fingerprint:
+            continue
+        _resident.pop(path, None)
+        units = list_row_groups(path)
+        if path.endswith(ARROW_EXTENSION):
+            table = read_arrow_table(path)
+        else:
+            table = pq.read_table(path)
+        _resident[path] = (table, fingerprint, units)
+        loaded += 1
+    return loaded
+
+
+def resident_bytes():
+    """常驻文件占用的字节数（Arrow IPC文件为映射的大小）"""
+    return sum(table.nbytes for table, _, _ in _resident.values())
+
+
+def _resident_table(path):
+    entry = _resident.get(os.path.abspath(path))
+    return None if entry is None else entry[0]
+
+
+def read_arrow_table(path, columns=None):
+    """
+    内存映射打开Arrow IPC文件
+
+    列数据直接引用映射的页面（零拷贝），同一台机器上重复运行的分析共享操作系统
+    页缓存；未选中的列不会被读入内存。
+    """
+    table = _resident_table(path)
+    if table is not None:
+        return table.select(columns) if columns else table
+    reader = pa.ipc.open_file(pa.memory_map(path, 'r'))
+    table = reader.read_all()
+    return table.select(columns) if columns else table
+
+
+def read_columns(path, columns=None):
+    """按扩展名读取 .parquet / .arrow 文件的指定列，返回pandas DataFrame"""
+    table = _resident_table(path)
+    if table is not None:
+        return to_pandas(table.select(columns) if columns else table)
+    if path.endswith(ARROW_EXTENSION):
+        return to_pandas(read_arrow_table(path, columns))
+    return to_pandas(pq.read_table(path, columns=columns))
+
+
+def list_row_groups(path):
+    """
+    文件的可独立读取单元：[(序号, 起始行号, 行数), ...]
+
+    Parquet为行组；Arrow IPC为记录批（预处理按row_group_size分批写出）。
+    """
+    entry = _resident.get(os.path.abspath(path))
+    if entry is not None:
+        return list(entry[2])
+    if path.endswith(ARROW_EXTENSION):
+        reader = pa.ipc.open_file(pa.memory_map(path, 'r'))
+        sizes = [reader.get_batch(i).num_rows for i in range(reader.num_record_batches)]
+    else:
+        metadata = pq.ParquetFile(path).metadata
+        sizes = [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)]
+    units = []
+    first_row = 0
+    for index, rows in enumerate(sizes):
+        units.append((index, first_row, rows))
+        first_row += rows
+    return units
+
+
+def read_row_group(path, index, columns=None):
+    """只读取一个行组（或记录批）的指定列，返回pandas DataFrame"""
+    entry = _resident.get(os.path.abspath(path))
+    if entry is not None:
+        table, _, units = entry
+        _, first_row, rows = units[index]
+        table = table.slice(first_row, rows)
+        return to_pandas(table.select(columns) if columns else table)
+    if path.endswith(ARROW_EXTENSION):
+        reader = pa.ipc.open_file(pa.memory_map(path, 'r'))
+        batch = reader.get_batch(index)
+        return to_pandas(batch.select(columns) if columns else batch)
+    return to_pandas(pq.ParquetFile(path).read_row_group(index, columns=columns))
+
+
+def data_columns(path):
+    """文件包含的列名（只读取schema）"""
+    if path.endswith(ARROW_EXTENSION):
+        return pa.ipc.open_file(pa.memory_map(path, 'r')).schema.names
+    return pq.read_schema(path).names
+
+
+def data_bytes(path, columns=None):
+    """读取指定列涉及的字节数：Parquet为压缩后字节，Arrow为映射的缓冲区大小"""
+    if not path.endswith(ARROW_EXTENSION):
+        return parquet_bytes(path, columns)
+    table = read_arrow_table(path, columns)
+    return sum(
+        buf.size
+        for column in table.columns
+        for chunk in column.chunks
+        for buf in chunk.buffers()
+        if buf is not None
+    )
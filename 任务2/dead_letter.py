@@ -0,0 +1,139 @@
+import os
+import json
+from collections import defaultdict
+from contextlib import contextmanager
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+DEAD_LETTER_DIR = "dead_letter"  # 隔离记录子目录（位于各脚本输出目录下）
+
+SCHEMA = pa.schema(
+    [
+        ('file', pa.string()),
+        ('row', pa.int64()),
+        ('reason', pa.string()),
+        ('error', pa.string()),
+        ('record', pa.string()),
+    ]
+)
+
+
+def reason_code(error):
+    """把异常归类为稳定的原因码，便于按类别统计"""
+    if isinstance(error, json.JSONDecodeError):
+        return 'json_decode'
+    if isinstance(error, KeyError):
+        return 'missing_field'
+    if isinstance(error, TypeError):
+        return 'bad_type'
+    if isinstance(error, ValueError):
+        return 'bad_value'
+    return 'error'
+
+
+class DeadLetterSink:
+    """
+    异常记录隔离输出
+
+    热循环中只把异常记录追加到内存缓冲区，满batch_size条后批量写入
+    Parquet（同一文件的多个行组），并按原因码累计计数，取代逐行print。
+    本次未重新处理的输入文件（命中部分结果缓存、增量运行时已处理过）的记录
+    由 replay 或 open(keep=...) 重新登记，隔离文件始终覆盖全部输入。
+    """
+
+    def __init__(self, script, batch_size=10000):
+        self.script = script
+        self.batch_size = batch_size
+        self.output_dir = None
+        self.counts = defaultdict(int)
+        self._buffer = []
+        self._writer = None
+        self._captured = None
+        self.path = None
+
+    def open(self, output_dir, keep=()):
+        """
+        指定输出目录（隔离文件位于 output_dir/dead_letter/<script>.parquet）
+
+        上次运行的隔离文件被替换，避免本次无异常时残留旧记录；keep 中的输入
+        文件本次不重新处理，其旧记录原样保留。
+        """
+        self.output_dir = output_dir
+        stale = os.path.join(output_dir, DEAD_LETTER_DIR, f"{self.script}.parquet")
+        if os.path.exists(stale):
+            kept = []
+            if keep:
+                kept = pq.read_table(stale, filters=[('file', 'in', list(keep))])
+                kept = kept.to_pylist()
+            os.remove(stale)
+            self.replay(kept)
+
+    def add(self, file, row, error, record=None):
+        self._append(
+            {
+                'file': file,
+                'row': int(row),  # 可能为numpy整数，缓存为JSON时需转换
+                'reason': reason_code(error),
+                'error': f"{type(error).__name__}: {error}",
+                'record': None if record is None else str(record),
+            }
+        )
+
+    def replay(self, entries):
+        """重新登记之前保存的隔离记录（如随部分结果缓存的记录）"""
+        for entry in entries:
+            self._append(dict(entry))
+
+    @contextmanager
+    def capture(self):
+        """收集块内新增的隔离记录（记录照常写出），供调用方与部分结果一并保存"""
+        captured = []
+        previous, self._captured = self._captured, captured
+        try:
+            yield captured
+        finally:
+            self._captured = previous
+
+    def _append(self, entry):
+        self.counts[entry['reason']] += 1
+        self._buffer.append(entry)
+        if self._captured is not None:
+            self._captured.append(entry)
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer or self.output_dir is None:
+            return
+        if self._writer is None:
+            folder = os.path.join(self.output_dir, DEAD_LETTER_DIR)
+            os.makedirs(folder, exist_ok=True)
+            self.path = os.path.join(folder, f"{self.script}.parquet")
+            self._writer = pq.ParquetWriter(self.path, SCHEMA, compression='zstd')
+        self._writer.write_table(pa.Table.from_pylist(self._buffer, schema=SCHEMA))
+        self._buffer = []
+
+    @property
+    def total(self):
+        return sum(self.counts.values())
+
+    def finish(self):
+        """写出剩余记录并关闭当前隔离文件，返回其路径（无异常记录时为None）"""
+        self.flush()
+        path, self.path = self.path, None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        return path
+
+    def close(self, metrics=None):
+        """写出剩余记录，把计数汇总进运行报告并打印一行摘要"""
+        path = self.finish()
+        if metrics is not None:
+            for reason, count in self.counts.items():
+                metrics.count(f"bad_records.{reason}", count)
+        if self.total:
+            detail = ', '.join(f"{k}: {v}" for k, v in sorted(self.counts.items()))
+            location = f"，已隔离至：{path}" if path else ""
+            print(f"发现 {self.total} 条异常记录（{detail}）{location}")
@@ -0,0 +1,39 @@
+import argparse
+
+import pandas as pd
+from sketches import rollup_distinct
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="由保存的HyperLogLog草图表计算任意并集/上卷的去重买家数"
+    )
+    parser.add_argument(
+        'path',
+        help="草图表，如 2/distinct_buyers_payment.parquet、"
+        "3/distinct_buyers_category_month.parquet",
+    )
+    parser.add_argument(
+        '--by', action='append', default=[], help="保留的键列，可重复；不指定则全部合并"
+    )
+    parser.add_argument(
+        '--where',
+        action='append',
+        default=[],
+        help="过滤条件 列=值[,值...]，如 --where month=2021-01,2021-02",
+    )
+    return parser.parse_args()
+
+
+def main(args):
+    filters = {}
+    for item in args.where:
+        column, values = item.split('=', 1)
+        filters[column] = values.split(',')
+    result = rollup_distinct(args.path, by=args.by, **filters)
+    with pd.option_context('display.max_rows', 200, 'display.width', 200):
+        print(result.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main(parse_args())
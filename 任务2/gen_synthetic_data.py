@@ -0,0 +1,140 @@
+import os
+import json
+import argparse
+import numpy as np
+import pandas as pd
+
+# 配置参数（命令行参数可覆盖）
+output_dir = "C:/Users/East/Desktop/原数据/synthetic"
+PRODUCT_CATALOG_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "product_catalog.json"
+)
+seed = 42
+dirty_ratio = 0.0  # 故意写入的损坏记录比例，用于测试容错
+
+# 预设规模：(文件数, 每文件行数)
+SCALES = {
+    'tiny': (2, 5_000),
+    'small': (4, 50_000),
+    'medium': (8, 250_000),
+    'large': (16, 1_000_000),
+}
+
+PAYMENT_METHODS = ["支付宝", "微信支付", "信用卡", "储蓄卡", "银联", "现金", "云闪付"]
+PAYMENT_WEIGHTS = [0.3, 0.3, 0.15, 0.1, 0.07, 0.03, 0.05]
+PAYMENT_STATUSES = ["已支付", "已退款", "部分退款"]
+STATUS_WEIGHTS = [0.9, 0.06, 0.04]
+GENDERS = ["Male", "Female", "其他"]
+GENDER_WEIGHTS = [0.49, 0.49, 0.02]
+DATE_START = np.datetime64('2020-01-01')
+DATE_DAYS = 5 * 365
+
+
+def load_catalog():
+    """加载商品目录，返回(商品ID数组, 价格数组)"""
+    with open(PRODUCT_CATALOG_FILE, 'r', encoding='utf-8') as f:
+        catalog = json.load(f)
+    ids = np.array([p['id'] for p in catalog['products']])
+    prices = np.array([p['price'] for p in catalog['products']])
+    return ids, prices
+
+
+def generate_frame(
+    rng, n_rows, id_offset, product_ids, product_prices, dirty_ratio=0.0
+):
+    """生成一个与原始数据结构一致的DataFrame"""
+    ages = rng.integers(18, 90, size=n_rows)
+    # 收入与年龄弱相关，对数正态分布
+    incomes = np.round(
+        rng.lognormal(mean=11.5, sigma=0.6, size=n_rows) * (1 + (ages - 18) / 150), 2
+    )
+    genders = rng.choice(GENDERS, size=n_rows, p=GENDER_WEIGHTS)
+    methods = rng.choice(PAYMENT_METHODS, size=n_rows, p=PAYMENT_WEIGHTS)
+    statuses = rng.choice(PAYMENT_STATUSES, size=n_rows, p=STATUS_WEIGHTS)
+    dates = DATE_START + rng.integers(0, DATE_DAYS, size=n_rows).astype(
+        'timedelta64[D]'
+    )
+    item_counts = rng.integers(1, 8, size=n_rows)
+    item_index = rng.integers(0, len(product_ids), size=int(item_counts.sum()))
+    dirty = rng.random(n_rows) < dirty_ratio
+
+    histories = []
+    pos = 0
+    for i in range(n_rows):
+        picked = item_index[pos : pos + item_counts[i]]
+        pos += item_counts[i]
+        if dirty[i]:
+            histories.append('{"items": [{"id": ')  # 截断的JSON
+            continue
+        histories.append(
+            json.dumps(
+                {
+                    'average_price': round(float(product_prices[picked].mean()), 2),
+                    'category': '',
+                    'items': [{'id': int(pid)} for pid in product_ids[picked]],
+                    'payment_method': methods[i],
+                    'payment_status': statuses[i],
+                    'purchase_date': str(dates[i]),
+                },
+                ensure_ascii=False,
+            )
+        )
+
+    return pd.DataFrame(
+        {
+            'id': np.arange(id_offset, id_offset + n_rows, dtype=np.int64),
+            'age': ages,
+            'income': incomes,
+            'gender': genders,
+            'purchase_history': histories,
+        }
+    )
+
+
+def generate_dataset(
+    output_dir, n_files, rows_per_file, seed=seed, dirty_ratio=dirty_ratio
+):
+    """生成n_files个原始parquet文件，结果只由种子和规模决定"""
+    os.makedirs(output_dir, exist_ok=True)
+    product_ids, product_prices = load_catalog()
+
+    paths = []
+    for i in range(n_files):
+        # 每个文件使用独立子种子，增加文件不改变已有文件内容
+        rng = np.random.default_rng([seed, i])
+        df = generate_frame(
+            rng,
+            rows_per_file,
+            i * rows_per_file,
+            product_ids,
+            product_prices,
+            dirty_ratio,
+        )
+        path = os.path.join(output_dir, f"part-{i:05d}.parquet")
+        df.to_parquet(path, index=False)
+        paths.append(path)
+        print(f"已生成：{os.path.basename(path)}（{rows_per_file:,} 行）")
+    return paths
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="生成合成原始数据")
+    parser.add_argument('--output', default=output_dir)
+    parser.add_argument('--scale', default='tiny', choices=sorted(SCALES))
+    parser.add_argument('--files', type=int, default=None, help="覆盖预设文件数")
+    parser.add_argument('--rows', type=int, default=None, help="覆盖预设每文件行数")
+    parser.add_argument('--seed', type=int, default=seed)
+    parser.add_argument('--dirty-ratio', type=float, default=dirty_ratio)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    n_files, rows_per_file = SCALES[args.scale]
+    generate_dataset(
+        args.output,
+        args.files or n_files,
+        args.rows or rows_per_file,
+        seed=args.seed,
+        dirty_ratio=args.dirty_ratio,
+    )
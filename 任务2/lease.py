@@ -0,0 +1,215 @@
+import os
+import re
+import json
+import time
+import uuid
+import zlib
+import socket
+import threading
+
+LEASE_SUFFIX = ".lease"  # 正在处理：内容为持有者令牌，修改时间即最近一次心跳
+DONE_SUFFIX = ".done"  # 已完成：输出已原子写入，签名相同时其他工作进程直接跳过
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def task_key(task):
+    """任务名 -> 可作文件名的键"""
+    return re.sub(r'[^\w.-]', '_', task)
+
+
+class Lease:
+    """
+    已认领的任务租约
+
+    后台线程每隔heartbeat秒刷新租约文件的修改时间；发现租约被他人回收后
+    停止心跳，commit时放弃结果，保证同一任务只有一份输出生效。
+    """
+
+    def __init__(self, task, path, token, heartbeat):
+        self.task = task
+        self.path = path
+        self.token = token
+        self.heartbeat = heartbeat
+        self.lost = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def held(self):
+        """租约文件仍存在且内容为本令牌"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f).get('token') == self.token
+        except (OSError, ValueError):
+            return False
+
+    def _run(self):
+        while not self._stop.wait(self.heartbeat):
+            if not self.held():
+                self.lost.set()
+                return
+            try:
+                os.utime(self.path)
+            except OSError:
+                self.lost.set()
+                return
+
+    def commit(self, files):
+        """
+        仍持有租约时把临时结果逐个原子替换为正式输出，否则丢弃并返回False
+
+        files: [(临时路径, 正式路径), ...]
+        """
+        if self.lost.is_set() or not self.held():
+            for tmp_path, _ in files:
+                os.remove(tmp_path)
+            return False
+        for tmp_path, final_path in files:
+            os.replace(tmp_path, final_path)
+        return True
+
+    def release(self):
+        self._stop.set()
+        self._thread.join()
+        if self.held():
+            os.remove(self.path)
+
+
+class LeaseManager:
+    """
+    基于共享目录的无协调者任务分配
+
+    多个工作进程（可在不同机器上，只需共享同一文件系统）各自扫描任务列表，
+    用 O_CREAT|O_EXCL 原子创建租约文件认领任务；超过ttl秒未心跳的租约视为
+    持有者已失效，由其他进程回收。时间以共享文件系统为准，避免机器间时钟偏差。
+    """
+
+    def __init__(self, lease_dir, worker_id=None, ttl=60.0, heartbeat=None):
+        self.lease_dir = lease_dir
+        self.worker_id = worker_id or default_worker_id()
+        self.ttl = ttl
+        self.heartbeat = heartbeat or ttl / 4
+        os.makedirs(lease_dir, exist_ok=True)
+        self._clock_path = os.path.join(lease_dir, f".clock.{task_key(self.worker_id)}")
+        open(self._clock_path, 'a').close()
+
+    def now(self):
+        """共享文件系统的当前时间"""
+        os.utime(self._clock_path)
+        return os.stat(self._clock_path).st_mtime
+
+    def _path(self, task, suffix):
+        return os.path.join(self.lease_dir, task_key(task) + suffix)
+
+    def is_done(self, task, signature=None):
+        """
+        任务已有完成标记，且标记中的签名与 signature 相同
+
+        签名记录输入文件、商品目录等的指纹，输入变化后旧的完成标记自动失效。
+        """
+        try:
+            with open(self._path(task, DONE_SUFFIX), 'r', encoding='utf-8') as f:
+                return json.load(f).get('signature') == signature
+        except (OSError, ValueError):
+            return False
+
+    def _age(self, path):
+        """租约文件的 (内容, 距最近一次心跳的秒数)"""
+        with open(path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        return content, self.now() - os.stat(path).st_mtime
+
+    def _reclaim_if_expired(self, path):
+        """租约已过期则移走，返回是否可以尝试认领"""
+        try:
+            content, age = self._age(path)
+        except FileNotFoundError:
+            return True
+        if age <= self.ttl:
+            return False
+        # 先改名再删除：多个进程同时回收时只有一个改名成功
+        stale = f"{path}.{uuid.uuid4().hex}.stale"
+        try:
+            os.rename(path, stale)
+        except FileNotFoundError:
+            return True
+        # 检查与改名之间，其他进程可能已回收并重新认领了该任务：移走的若不是
+        # 刚才判定过期的那份租约，或它已重新心跳，则放回原处
+        moved, age = self._age(stale)
+        if moved != content or age <= self.ttl:
+            try:
+                os.link(stale, path)  # 原处已有新租约时失败，不覆盖
+            except OSError:
+                pass
+            os.remove(stale)
+            return False
+        os.remove(stale)
+        print(f"已回收过期租约：{os.path.basename(path)}")
+        return True
+
+    def try_acquire(self, task):
+        """尝试认领任务，成功返回Lease，已被他人持有返回None"""
+        path = self._path(task, LEASE_SUFFIX)
+        if not self._reclaim_if_expired(path):
+            return None
+        token = f"{self.worker_id}:{uuid.uuid4().hex}"
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return None
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'token': token, 'worker': self.worker_id, 'task': task}, f)
+        return Lease(task, path, token, self.heartbeat)
+
+    def mark_done(self, task, signature=None):
+        done = {
+            'worker': self.worker_id,
+            'task': task,
+            'signature': signature,
+            'finished_at': time.time(),
+        }
+        tmp_path = f"{self._path(task, DONE_SUFFIX)}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(done, f, ensure_ascii=False)
+        os.replace(tmp_path, self._path(task, DONE_SUFFIX))
+
+    def run(self, tasks, process, poll=None, signatures=None):
+        """
+        循环认领并处理任务，直到所有任务都有签名一致的完成标记
+
+        process(task, lease) 返回True表示结果已提交。其余任务均被他人持有时
+        等待后重新扫描，以便回收中途退出的工作进程留下的任务。
+        signatures 为 任务 -> 签名，签名与完成标记中的不同时重新处理。
+        返回本进程完成的任务列表。
+        """
+        signatures = signatures or {}
+        completed = []
+        # 各进程从不同位置开始扫描，减少争抢同一任务
+        offset = zlib.crc32(self.worker_id.encode('utf-8'))
+        while True:
+            pending = [t for t in tasks if not self.is_done(t, signatures.get(t))]
+            if not pending:
+                break
+            start = offset % len(pending)
+            claimed = False
+            for task in pending[start:] + pending[:start]:
+                lease = self.try_acquire(task)
+                if lease is None:
+                    continue
+                claimed = True
+                try:
+                    # 认领前一刻可能刚被他人完成
+                    signature = signatures.get(task)
+                    if not self.is_done(task, signature) and process(task, lease):
+                        self.mark_done(task, signature)
+                        completed.append(task)
+                finally:
+                    lease.release()
+            if not claimed:
+                # 其他任务都在别人手中：短间隔轮询，尽快发现完成或过期
+                time.sleep(poll or min(self.heartbeat, 2.0))
+        os.remove(self._clock_path)
+        return completed
@@ -0,0 +1,123 @@
+import os
+import math
+import random
+from collections import defaultdict
+from statistics import NormalDist
+
+import pandas as pd
+from dataset_io import list_data_files, list_row_groups
+
+
+def list_units(input_dir):
+    """输入目录中全部行组：[(文件名, 行组序号, 起始行号, 行数), ...]"""
+    units = []
+    for file in list_data_files(input_dir):
+        for index, first_row, rows in list_row_groups(os.path.join(input_dir, file)):
+            units.append((file, index, first_row, rows))
+    return units
+
+
+class ProgressiveEstimator:
+    """
+    按行组整群抽样的在线比例估计
+
+    行组按随机顺序不放回地读取，每读完一个行组并入一份计数：
+        {表名: {(分组, 键): 次数}}
+    每个键报告两个量：全量计数的估计（样本总和 × 总行组数 / 已读行组数）
+    与组内占比 次数 / 同组合计（分组为None时即占全表的比例）。占比用比率
+    估计量，方差按整群抽样并做有限总体校正，读完全部行组时置信区间收缩为0。
+
+    方差只需各键的 Σy、Σy²、Σxy 与各组的 Σx、Σx²（y为键的计数，x为同组合计），
+    都可逐行组累加，每次更新只与本行组出现的键数有关。
+    """
+
+    def __init__(self, total_units, confidence=0.95):
+        self.total_units = total_units
+        self.z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        self.units = 0
+        # (表, 分组, 键) -> [Σy, Σy², Σxy]；(表, 分组) -> [Σx, Σx²]
+        self.keys = defaultdict(lambda: [0.0, 0.0, 0.0])
+        self.groups = defaultdict(lambda: [0.0, 0.0])
+
+    def add(self, tables):
+        self.units += 1
+        for table, counts in tables.items():
+            totals = defaultdict(float)
+            for (group, _), count in counts.items():
+                totals[group] += count
+            for group, x in totals.items():
+                sums = self.groups[(table, group)]
+                sums[0] += x
+                sums[1] += x * x
+            for (group, key), y in counts.items():
+                sums = self.keys[(table, group, key)]
+                x = totals[group]
+                sums[0] += y
+                sums[1] += y * y
+                sums[2] += x * y
+
+    def estimates(self, table=None):
+        """DataFrame：table / group / key / estimate / share / half_width"""
+        n = self.units
+        fpc = 1 - n / self.total_units
+        rows = []
+        for (name, group, key), (sy, syy, sxy) in self.keys.items():
+            if table is not None and name != table:
+                continue
+            sx, sxx = self.groups[(name, group)]
+            share = sy / sx if sx else 0.0
+            half_width = math.inf
+            if n > 1 and sx:
+                residual = max(syy - 2 * share * sxy + share * share * sxx, 0.0)
+                variance = fpc * residual / (n - 1) / n / (sx / n) ** 2
+                half_width = self.z * math.sqrt(variance)
+            rows.append(
+                {
+                    'table': name,
+                    'group': group,
+                    'key': key,
+                    'estimate': sy * self.total_units / n,
+                    'share': share,
+                    'half_width': half_width,
+                }
+            )
+        return pd.DataFrame(
+            rows,
+            columns=['table', 'group', 'key', 'estimate', 'share', 'half_width'],
+        )
+
+    def max_half_width(self):
+        """所有占比中最宽的置信区间半宽"""
+        widths = self.estimates()['half_width']
+        return widths.max() if len(widths) else math.inf
+
+
+def run_progressive(
+    units, process_unit, error, confidence=0.95, min_units=10, seed=None
+):
+    """
+    随机顺序读取行组直到所有占比的置信区间半宽都不超过error
+
+    process_unit(单元) 返回该行组的 {表名: {(分组, 键): 次数}}。
+    至少读取min_units个行组，避免早期样本恰好缺少某些键时误判收敛。
+    返回估计器，units 为实际读取的行组数。
+    """
+    order = list(units)
+    random.Random(seed).shuffle(order)
+    estimator = ProgressiveEstimator(len(order), confidence)
+    report_every = max(1, len(order) // 50)
+    for unit in order:
+        estimator.add(process_unit(unit))
+        n = estimator.units
+        if n < min(min_units, len(order)):
+            continue
+        widest = estimator.max_half_width()
+        converged = widest <= error
+        if converged or n % report_every == 0 or n == len(order):
+            print(
+                f"已读取 {n}/{len(order)} 个行组（{n / len(order):.1%}），"
+                f"占比最大误差 ±{widest:.2%}（置信度 {confidence:.0%}）"
+            )
+        if converged:
+            break
+    return estimator
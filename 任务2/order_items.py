@@ -0,0 +1,233 @@
+import os
+import json
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from catalog import load_product_catalog, product_map_fingerprint
+from dataset_io import data_columns
+from partial_cache import file_fingerprint
+
+ITEMS = 'items'  # 预处理时按当时的商品目录写入的商品明细（list<struct>嵌套列）
+ITEMS_JSON = 'items_json'  # 旧版预处理写入的商品明细JSON字符串
+ITEM_IDS = 'item_ids'  # 原始商品ID列表，扫描时按当前商品目录解析
+UNKNOWN = '未知'  # 目录中没有的商品ID，与预处理的处理一致
+DEFAULT_CATALOG_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "product_catalog.json"
+)
+# items 列中每个商品的结构；类别为低基数字符串，写为字典编码
+ITEM_TYPE = pa.struct(
+    [
+        ('parent_category', pa.dictionary(pa.int32(), pa.string())),
+        ('sub_category', pa.dictionary(pa.int32(), pa.string())),
+        ('price', pa.float64()),
+    ]
+)
+# 上述类别字段在Parquet中的叶子列路径，写出时对其启用字典编码
+ITEM_DICTIONARY_COLUMNS = [
+    f'{ITEMS}.list.element.parent_category',
+    f'{ITEMS}.list.element.sub_category',
+]
+
+
+class CatalogLookup:
+    """
+    商品目录的向量化查找表
+
+    以商品ID为下标的 父类别/子类别/价格 数组，最后一格为未知商品；
+    一批商品ID通过一次数组下标运算完成关联，不逐个查字典。
+    """
+
+    def __init__(self, product_map):
+        self.size = max(product_map, default=-1) + 1
+        self.parent = np.full(self.size + 1, UNKNOWN, dtype=object)
+        self.sub = np.full(self.size + 1, UNKNOWN, dtype=object)
+        self.price = np.zeros(self.size + 1)
+        for product_id, product in product_map.items():
+            self.parent[product_id] = product['parent_category']
+            self.sub[product_id] = product['sub_category']
+            self.price[product_id] = product['price']
+        # 解析后目录的指纹，计入缓存参数
+        self.fingerprint = product_map_fingerprint(product_map)
+
+    def join(self, ids):
+        """商品ID数组 -> (父类别, 子类别, 价格) 三个数组"""
+        ids = np.asarray(ids, dtype=np.int64)
+        ids = np.where((ids >= 0) & (ids < self.size), ids, self.size)
+        return self.parent[ids], self.sub[ids], self.price[ids]
+
+
+def load_catalog(catalog_file):
+    """
+    读取商品目录；catalog_file 为None时返回None
+
+    按目录文件指纹缓存：文件不变时同一进程内只解析一次，常驻的分析服务中
+    目录文件被修改后下次读取即为新目录。
+    """
+    if catalog_file is None:
+        return None
+    return _load_catalog(catalog_file, file_fingerprint(catalog_file))
+
+
+@lru_cache(maxsize=8)
+def _load_catalog(catalog_file, fingerprint):
+    return CatalogLookup(load_product_catalog(catalog_file))
+
+
+def catalog_fingerprint(catalog):
+    return None if catalog is None else catalog.fingerprint
+
+
+def item_columns(path, catalog=None):
+    """
+    读取商品明细需要的列
+
+    有商品目录且文件含item_ids时在扫描时关联当前目录（晚绑定），商品重新归类后
+    下次分析即生效；否则读取预处理写入的items嵌套列，旧版数据读取items_json。
+    """
+    columns = data_columns(path)
+    if catalog is not None and ITEM_IDS in columns:
+        return [ITEM_IDS]
+    return [ITEMS] if ITEMS in columns else [ITEMS_JSON]
+
+
+def _list_array(column, value_type):
+    """
+    DataFrame中的列表列 -> Arrow ListArray（Arrow支持的列直接取底层数组）
+
+    多行组文件读入的列由多个块组成，pa.array 返回ChunkedArray，需合并为一个数组。
+    """
+    if isinstance(column.dtype, pd.ArrowDtype):
+        array = pa.array(column.array)
+        if isinstance(array, pa.ChunkedArray):
+            array = array.combine_chunks()
+        if array.type.value_type != value_type:
+            array = array.cast(pa.list_(value_type))
+        return array
+    return pa.array(column.tolist(), type=pa.list_(value_type))
+
+
+def _strings(array):
+    """Arrow字符串数组（可为字典编码）-> numpy对象数组，字典只解码一次"""
+    if pa.types.is_dictionary(array.type):
+        values = array.dictionary.to_numpy(zero_copy_only=False)
+        return values[array.indices.fill_null(0).to_numpy()]
+    return array.to_numpy(zero_copy_only=False)
+
+
+class OrderItems:
+    """
+    一批订单的商品明细（列式），与df的行一一对应
+
+    lengths[i] 为第i单的商品数，parent/sub/price 为按订单依次拼接的各商品字段
+    （numpy数组），分析直接在这些数组上向量化统计，不为每个商品构造字典。
+    errors 为旧版items_json中无法解析的订单 [(订单序号, 异常, 原文), ...]，
+    这些订单的商品数记为0，由调用方隔离。
+    """
+
+    def __init__(self, lengths, parent, sub, price, errors=()):
+        self.lengths = np.asarray(lengths, dtype=np.int64)
+        self.parent = parent
+        self.sub = sub
+        self.price = np.asarray(price, dtype=np.float64)
+        self.errors = list(errors)
+
+    def __len__(self):
+        return len(self.lengths)
+
+    @property
+    def order(self):
+        """每个商品所属订单的序号"""
+        return np.repeat(np.arange(len(self)), self.lengths)
+
+    @property
+    def valid(self):
+        """可解析的订单（布尔数组）"""
+        valid = np.ones(len(self), dtype=bool)
+        valid[np.array([i for i, _, _ in self.errors], dtype=np.int64)] = False
+        return valid
+
+    def field(self, name):
+        return {'parent_category': self.parent, 'sub_category': self.sub}[name]
+
+    def total_price(self):
+        """各订单按当前商品目录计算的总价"""
+        return np.bincount(self.order, weights=self.price, minlength=len(self))
+
+    def contains(self, field, value):
+        """各订单是否含有该类别的商品（布尔数组）"""
+        hits = self.order[self.field(field) == value]
+        return np.bincount(hits, minlength=len(self)) > 0
+
+    def order_categories(self, field='parent_category'):
+        """
+        订单与类别的去重组合：(订单序号数组, 类别编码数组, 类别表)
+
+        按 (订单, 类别) 排序；类别表已排序，同一订单内的类别按名称排列。
+        """
+        codes, categories = pd.factorize(self.field(field), sort=True)
+        width = max(len(categories), 1)
+        orders, codes = np.divmod(np.unique(self.order * width + codes), width)
+        return orders, codes, np.asarray(categories, dtype=object)
+
+    def category_sets(self, field='parent_category'):
+        """各订单去重并排序后的类别元组"""
+        orders, codes, categories = self.order_categories(field)
+        names = categories[codes].tolist()
+        counts = np.bincount(orders, minlength=len(self))
+        ends = np.cumsum(counts).tolist()
+        return [tuple(names[end - n : end]) for end, n in zip(ends, counts.tolist())]
+
+
+def _parse_items_json(values):
+    """旧版items_json逐单解析为 OrderItems，无法解析的订单记入errors"""
+    lengths, parent, sub, price, errors = [], [], [], [], []
+    for position, value in enumerate(values):
+        try:
+            items = [
+                (i['parent_category'], i['sub_category'], float(i['price']))
+                for i in json.loads(value)
+            ]
+        except Exception as e:
+            errors.append((position, e, value))
+            lengths.append(0)
+            continue
+        lengths.append(len(items))
+        for p, s, v in items:
+            parent.append(p)
+            sub.append(s)
+            price.append(v)
+    return OrderItems(
+        lengths,
+        np.array(parent, dtype=object),
+        np.array(sub, dtype=object),
+        price,
+        errors,
+    )
+
+
+def attach_items(df, catalog=None):
+    """
+    每个订单的商品明细，返回 OrderItems
+
+    df含item_ids且给定目录时，整批商品ID一次关联目录；df含items时经Arrow列表
+    展开直接取出各字段，不做JSON解析。旧版数据逐单解析items_json。
+    """
+    if catalog is not None and ITEM_IDS in df.columns:
+        item_ids = _list_array(df[ITEM_IDS], pa.int32())
+        lengths = pc.list_value_length(item_ids).fill_null(0).to_numpy()
+        parent, sub, price = catalog.join(pc.list_flatten(item_ids).to_numpy())
+        return OrderItems(lengths, parent, sub, price)
+    if ITEMS in df.columns:
+        items = _list_array(df[ITEMS], ITEM_TYPE)
+        lengths = pc.list_value_length(items).fill_null(0).to_numpy()
+        values = pc.list_flatten(items)
+        return OrderItems(
+            lengths,
+            _strings(values.field('parent_category')),
+            _strings(values.field('sub_category')),
+            values.field('price').to_numpy(zero_copy_only=False),
+        )
+    return _parse_items_json(df[ITEMS_JSON].tolist())
@@ -0,0 +1,112 @@
+import os
+import json
+import hashlib
+
+# 参与文件指纹的尾部字节数：Parquet页脚包含各列块的统计信息与偏移，
+# 与文件大小一起足以区分内容不同的文件，无需通读整个文件
+FOOTER_BYTES = 64 * 1024
+
+
+def file_fingerprint(path):
+    """基于文件大小与页脚内容的指纹（与路径、修改时间无关，文件被复制/移动后仍可命中）"""
+    size = os.path.getsize(path)
+    digest = hashlib.sha256(str(size).encode())
+    if not path.endswith(".parquet"):
+        # Arrow IPC等格式的页脚只有偏移没有统计信息，内容变化可能不改变页脚，加入修改时间
+        digest.update(str(os.stat(path).st_mtime_ns).encode())
+    with open(path, 'rb') as f:
+        f.seek(max(size - FOOTER_BYTES, 0))
+        digest.update(f.read())
+    return digest.hexdigest()
+
+
+class PartialCache:
+    """
+    按文件缓存可合并的部分聚合结果
+
+    缓存键 = 文件指纹 + 分析名 + 参数 + 代码指纹；值为JSON。
+    重新运行时只需扫描新增或变化的文件，其余直接读取缓存后合并。code 为分析
+    脚本及其共享模块的指纹（pipeline.code_fingerprint），计算逻辑变化后旧缓存自动失效。
+    """
+
+    def __init__(self, cache_dir, analysis, params=None, enabled=True, code=None):
+        self.cache_dir = os.path.join(cache_dir, analysis)
+        self.analysis = analysis
+        self.params = json.dumps(params or {}, sort_keys=True, ensure_ascii=False)
+        self.code = code or ''
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        if enabled:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def key(self, path):
+        digest = hashlib.sha256()
+        for part in (file_fingerprint(path), self.analysis, self.params, self.code):
+            digest.update(part.encode('utf-8'))
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def load(self, path):
+        """返回缓存的部分结果，未命中返回None"""
+        if not self.enabled:
+            return None
+        cache_path = self._path(self.key(path))
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                partial = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return partial
+
+    def save(self, path, partial):
+        if not self.enabled:
+            return
+        cache_path = self._path(self.key(path))
+        # 先写临时文件再原子替换，避免中断时留下半截缓存
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(partial, f, ensure_ascii=False)
+        os.replace(tmp_path, cache_path)
+
+    def get_or_compute(self, path, compute, dead_letters=None):
+        """
+        命中则返回缓存，否则调用compute(path)计算并写入缓存
+
+        给定 dead_letters（DeadLetterSink）时，计算中隔离的记录随部分结果一并缓存，
+        命中时重新登记，文件未重新扫描时隔离记录与计数也不会丢失。
+        """
+        if dead_letters is None:
+            partial = self.load(path)
+            if partial is None:
+                partial = compute(path)
+                self.save(path, partial)
+            return partial
+        entry = self.load(path)
+        if entry is None:
+            with dead_letters.capture() as captured:
+                partial = compute(path)
+            self.save(path, {'partial': partial, 'dead_letters': captured})
+            return partial
+        dead_letters.replay(entry['dead_letters'])
+        return entry['partial']
+
+
+def encode_counter(counter):
+    """元组键计数器 -> JSON列表 [[键列表, 计数], ...]"""
+    return [[list(k), v] for k, v in counter.items()]
+
+
+def decode_counter(items):
+    """JSON列表 -> 元组键字典"""
+    return {tuple(k): v for k, v in items}
+
+
+def merge_counts(target, partial):
+    """把一个扁平计数字典累加到target"""
+    for key, count in partial.items():
+        target[key] += count
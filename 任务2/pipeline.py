@@ -0,0 +1,271 @@
+import os
+import ast
+import sys
+import json
+import time
+import hashlib
+import argparse
+import subprocess
+
+from stages import TASK2_DIR
+from partial_cache import file_fingerprint
+
+STATE_FILE = ".pipeline_state.json"  # 位于分析结果根目录：各阶段最近一次成功运行的指纹
+LOG_DIR = "logs"  # 位于分析结果根目录：各阶段子进程的输出
+DATA_EXTENSIONS = (".parquet", ".arrow")
+POLL_SECONDS = 0.2
+
+
+def default_memory_mb():
+    """默认内存预算：物理内存的75%，无法获取时不限制"""
+    try:
+        total = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (ValueError, OSError, AttributeError):
+        return None
+    return int(total / 2**20 * 0.75)
+
+
+def code_files(script):
+    """脚本本身及其（递归）导入的任务2共享模块，包括函数内的延迟导入"""
+    seen = []
+    pending = [os.path.abspath(script)]
+    while pending:
+        path = pending.pop()
+        if path in seen:
+            continue
+        seen.append(path)
+        with open(path, 'r', encoding='utf-8') as f:
+            tree = ast.parse(f.read())
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                modules = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module:
+                modules = [node.module]
+            else:
+                continue
+            for module in modules:
+                candidate = os.path.join(TASK2_DIR, module.split('.')[0] + ".py")
+                if os.path.exists(candidate):
+                    pending.append(candidate)
+    return sorted(seen)
+
+
+def code_fingerprint(script):
+    """脚本及其导入的共享模块的内容指纹，代码任一变化即改变"""
+    digest = hashlib.sha256()
+    for path in code_files(script):
+        with open(path, 'rb') as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+
+def input_listing(input_dir):
+    """输入目录中数据文件的 文件名 -> 指纹；上游阶段重写文件后指纹随之变化"""
+    if input_dir is None or not os.path.isdir(input_dir):
+        return {}
+    return {
+        name: file_fingerprint(os.path.join(input_dir, name))
+        for name in sorted(os.listdir(input_dir))
+        if name.endswith(DATA_EXTENSIONS)
+    }
+
+
+def stage_fingerprint(stage, settings):
+    """阶段指纹 = 代码 + 生效的配置 + 输入数据；任一变化都需要重新运行"""
+    digest = hashlib.sha256(code_fingerprint(stage['script']).encode())
+    # 配置中指向文件的值（如商品目录）按文件内容计入
+    files = {
+        key: file_fingerprint(value)
+        for key, value in settings.items()
+        if isinstance(value, str) and os.path.isfile(value)
+    }
+    payload = {
+        'settings': settings,
+        'args': [str(a) for a in stage.get('args', [])],
+        'files': files,
+        'input': input_listing(stage['input']),
+    }
+    digest.update(json.dumps(payload, sort_keys=True, default=str).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def load_state(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(path, state):
+    """原子写出，避免并发阶段结束时写出半个文件"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def select_stages(stages, targets):
+    """目标阶段及其全部上游阶段，保持定义顺序"""
+    selected = set()
+    pending = list(targets or stages)
+    while pending:
+        name = pending.pop()
+        if name not in selected:
+            selected.add(name)
+            pending.extend(stages[name]['deps'])
+    return [name for name in stages if name in selected]
+
+
+class Pipeline:
+    """
+    依赖感知的阶段调度
+
+    每个阶段在独立子进程中运行（python -m 任务2 <阶段>），上游全部成功后才就绪；
+    就绪阶段按定义顺序在CPU/内存预算内并发启动。阶段启动前计算指纹，与上次
+    成功运行时相同且输出目录仍在则跳过。某阶段失败时其下游全部标记为阻塞。
+    """
+
+    def __init__(self, stages, config, out, cli_args, cpus=None, memory_mb=None):
+        self.stages = stages
+        self.config = config
+        self.cli_args = cli_args  # 传给子进程的全局参数（--config、目录）
+        self.cpus = cpus or os.cpu_count() or 1
+        self.memory_mb = memory_mb or default_memory_mb()
+        self.state_path = os.path.join(out, STATE_FILE)
+        self.log_dir = os.path.join(out, LOG_DIR)
+        self.state = load_state(self.state_path)
+        self.status = {}
+        self.fingerprints = {}  # 就绪后计算一次：上游已结束，输入不会再变
+        self.running = {}  # 阶段名 -> (子进程, 日志文件, 指纹, 启动时间)
+
+    def settings(self, name):
+        """阶段生效的配置：目录配置 + 配置文件中的阶段配置"""
+        stage = self.stages[name]
+        settings = {k: v for k, v in stage.get('config', {}).items() if v is not None}
+        settings.update(self.config.get('stages', {}).get(name, {}))
+        return settings
+
+    def resources(self, name):
+        resources = dict(self.stages[name]['resources'])
+        resources.update(self.config.get('resources', {}).get(name, {}))
+        return resources
+
+    def fits(self, name):
+        """加入该阶段后不超出预算；没有阶段在运行时总是允许，避免估计偏大时卡死"""
+        if not self.running:
+            return True
+        used = [self.resources(n) for n in self.running]
+        need = self.resources(name)
+        if sum(r['cpus'] for r in used) + need['cpus'] > self.cpus:
+            return False
+        if self.memory_mb is None:
+            return True
+        return sum(r['memory_mb'] for r in used) + need['memory_mb'] <= self.memory_mb
+
+    def start(self, name, fingerprint):
+        os.makedirs(self.log_dir, exist_ok=True)
+        log = open(os.path.join(self.log_dir, f"{name}.log"), 'w', encoding='utf-8')
+        command = [sys.executable, os.path.join(TASK2_DIR, "__main__.py")]
+        proc = subprocess.Popen(
+            command + self.cli_args + [name],
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            env=dict(os.environ, MPLBACKEND='Agg', PYTHONIOENCODING='utf-8'),
+        )
+        self.running[name] = (proc, log, fingerprint, time.perf_counter())
+        self.status[name] = 'running'
+        print(f"[启动] {name}")
+
+    def finish(self, name, returncode):
+        proc, log, fingerprint, started = self.running.pop(name)
+        log.close()
+        elapsed = time.perf_counter() - started
+        if returncode == 0:
+            self.status[name] = 'done'
+            self.state[name] = {
+                'fingerprint': fingerprint,
+                'finished_at': time.time(),
+                'seconds': round(elapsed, 3),
+            }
+            save_state(self.state_path, self.state)
+            print(f"[完成] {name}（{elapsed:.1f} 秒）")
+        else:
+            self.status[name] = 'failed'
+            log_path = os.path.join(self.log_dir, f"{name}.log")
+            print(f"[失败] {name}（退出码 {returncode}，日志：{log_path}）")
+
+    def up_to_date(self, name, fingerprint):
+        output = self.stages[name]['output']
+        previous = self.state.get(name, {}).get('fingerprint')
+        return previous == fingerprint and output is not None and os.path.isdir(output)
+
+    def run(self, names, force=False):
+        """运行给定阶段（须已包含全部上游），返回 阶段名 -> 状态"""
+        pending = list(names)
+        while pending or self.running:
+            for name in list(pending):
+                deps = [self.status.get(d) for d in self.stages[name]['deps']]
+                if any(s in ('failed', 'blocked') for s in deps):
+                    pending.remove(name)
+                    self.status[name] = 'blocked'
+                    print(f"[阻塞] {name}：上游阶段失败")
+                    continue
+                if not all(s in ('done', 'skipped') for s in deps):
+                    continue
+                # 上游运行结束后再计算指纹，反映其最新输出
+                if name not in self.fingerprints:
+                    self.fingerprints[name] = stage_fingerprint(
+                        self.stages[name], self.settings(name)
+                    )
+                fingerprint = self.fingerprints[name]
+                if not force and self.up_to_date(name, fingerprint):
+                    pending.remove(name)
+                    self.status[name] = 'skipped'
+                    print(f"[跳过] {name}：输入与参数未变化")
+                elif self.fits(name):
+                    pending.remove(name)
+                    self.start(name, fingerprint)
+            if not self.running:
+                continue
+            time.sleep(POLL_SECONDS)
+            for name, (proc, *_) in list(self.running.items()):
+                if proc.poll() is not None:
+                    self.finish(name, proc.returncode)
+        return self.status
+
+
+def run_pipeline(stages, config, cli_args, out, argv):
+    """python -m 任务2 run [阶段 ...] [--cpus N] [--memory-mb M] [--force]"""
+    parser = argparse.ArgumentParser(
+        prog="python -m 任务2 run",
+        description="按依赖关系运行流水线，跳过输入与参数未变化的阶段",
+        allow_abbrev=False,
+    )
+    parser.add_argument('targets', nargs='*', help="目标阶段，默认全部")
+    parser.add_argument('--cpus', type=int, default=None, help="CPU预算（核数）")
+    parser.add_argument('--memory-mb', type=int, default=None, help="内存预算（MB）")
+    parser.add_argument('--force', action='store_true', help="忽略指纹，全部重新运行")
+    args = parser.parse_args(argv)
+    unknown = [t for t in args.targets if t not in stages]
+    if unknown:
+        parser.error(f"未知阶段：{', '.join(unknown)}（可选：{', '.join(stages)}）")
+    if out is None:
+        sys.exit("流水线需要在配置文件或命令行中指定 output_dir（用于保存阶段状态）")
+
+    names = select_stages(stages, args.targets)
+    pipeline = Pipeline(stages, config, out, cli_args, args.cpus, args.memory_mb)
+    budget = f"{pipeline.memory_mb} MB" if pipeline.memory_mb else "不限"
+    print(f"运行阶段：{', '.join(names)}（CPU {pipeline.cpus} 核，内存 {budget}）")
+    start = time.perf_counter()
+    status = pipeline.run(names, args.force)
+    counts = {}
+    for s in status.values():
+        counts[s] = counts.get(s, 0) + 1
+    print(
+        f"流水线结束（{time.perf_counter() - start:.1f} 秒）："
+        + "，".join(f"{k} {v}" for k, v in counts.items())
+    )
+    if any(s != 'done' and s != 'skipped' for s in status.values()):
+        sys.exit(1)
+    return status
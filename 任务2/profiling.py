@@ -0,0 +1,228 @@
+import os
+import sys
+import time
+import argparse
+import threading
+import tracemalloc
+from collections import defaultdict
+
+# 未传命令行参数时可用环境变量开启，便于调度系统统一配置
+ENV_PROFILE = "PIPELINE_PROFILE"  # trace / sample
+ENV_TRACE_ALLOC = "PIPELINE_TRACE_ALLOC"  # 分配报告显示前N项
+
+
+def frame_label(code):
+    """栈帧显示名：函数名 (文件名:行号)"""
+    return (
+        f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    )
+
+
+class TracingProfiler:
+    """
+    确定性分析器：基于sys.setprofile记录完整调用栈
+
+    每次函数返回时把自身耗时（扣除子调用）累加到完整调用路径上，
+    输出的折叠栈与火焰图工具（flamegraph.pl / speedscope）直接兼容。
+    每个线程维护自己的调用栈与耗时汇总，后台线程（租约心跳、服务请求等）互不
+    干扰；热路径上不加锁，输出时再合并各线程的汇总。
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._thread_stacks = []  # 各线程的 调用路径 -> 自身耗时（秒）
+        self._lock = threading.Lock()
+
+    def _state(self):
+        """当前线程的 (调用栈 [(调用路径, 开始时间, 子调用耗时)], 耗时汇总)"""
+        state = getattr(self._local, 'state', None)
+        if state is None:
+            stacks = defaultdict(float)
+            with self._lock:
+                self._thread_stacks.append(stacks)
+            state = self._local.state = ([], stacks)
+        return state
+
+    @property
+    def stacks(self):
+        """合并各线程的 调用路径 -> 自身耗时（秒）"""
+        merged = defaultdict(float)
+        with self._lock:
+            thread_stacks = list(self._thread_stacks)
+        for stacks in thread_stacks:
+            for path, t in list(stacks.items()):
+                merged[path] += t
+        return merged
+
+    def _callback(self, frame, event, arg):
+        now = time.perf_counter()
+        stack, stacks = self._state()
+        if event in ('call', 'c_call'):
+            label = (
+                frame_label(frame.f_code)
+                if event == 'call'
+                else f"{getattr(arg, '__qualname__', arg)} (builtin)"
+            )
+            # 调用路径在入栈时拼好，返回时无需再遍历整个栈
+            path = f"{stack[-1][0]};{label}" if stack else label
+            stack.append([path, now, 0.0])
+        elif event in ('return', 'c_return', 'c_exception') and stack:
+            path, start, child = stack.pop()
+            elapsed = now - start
+            stacks[path] += elapsed - child
+            if stack:
+                stack[-1][2] += elapsed
+
+    def start(self):
+        sys.setprofile(self._callback)
+        threading.setprofile(self._callback)
+
+    def stop(self):
+        sys.setprofile(None)
+        threading.setprofile(None)
+
+    def collapsed(self):
+        """折叠栈：值为自身耗时（微秒）"""
+        return {path: int(t * 1e6) for path, t in self.stacks.items() if t > 0}
+
+
+class SamplingProfiler:
+    """采样分析器：后台线程定期抓取目标线程的调用栈，开销低，适合长任务"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = defaultdict(int)  # 调用路径 -> 采样次数
+        self._lock = threading.Lock()  # 采样线程写入，collapsed() 可能在其他线程读取
+        self._target = threading.main_thread().ident
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            labels = []
+            while frame is not None:
+                labels.append(frame_label(frame.f_code))
+                frame = frame.f_back
+            if labels:
+                with self._lock:
+                    self.stacks[';'.join(reversed(labels))] += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self):
+        """折叠栈：值为采样次数"""
+        with self._lock:
+            return dict(self.stacks)
+
+
+def write_collapsed(stacks, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        for stack, value in sorted(stacks.items(), key=lambda x: -x[1]):
+            f.write(f"{stack} {value}\n")
+
+
+def write_top_functions(stacks, path, unit, top_n=30):
+    """按叶子函数汇总的自身耗时排行，便于不画火焰图时快速定位"""
+    self_totals = defaultdict(int)
+    for stack, value in stacks.items():
+        self_totals[stack.rsplit(';', 1)[-1]] += value
+    total = sum(self_totals.values()) or 1
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f"{'自身占比':>8}  {unit:>12}  函数\n")
+        for name, value in sorted(self_totals.items(), key=lambda x: -x[1])[:top_n]:
+            f.write(f"{value / total:>8.1%}  {value:>12,}  {name}\n")
+
+
+def write_alloc_report(snapshot, peak, path, top_n):
+    """按分配位置（含调用链）统计内存，输出前N项"""
+    stats = snapshot.statistics('traceback')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f"峰值跟踪内存: {peak / 1024**2:.1f} MB\n")
+        f.write(f"结束时仍占用: {sum(s.size for s in stats) / 1024**2:.1f} MB\n\n")
+        for i, stat in enumerate(stats[:top_n], 1):
+            f.write(f"#{i} {stat.size / 1024:.1f} KB, {stat.count} 个对象\n")
+            for line in stat.traceback.format():
+                f.write(f"    {line}\n")
+            f.write("\n")
+
+
+def parse_profile_args(argv=None):
+    """从命令行解析分析开关，其余参数原样保留给脚本自身"""
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument(
+        '--profile',
+        choices=['trace', 'sample'],
+        default=os.environ.get(ENV_PROFILE) or None,
+    )
+    parser.add_argument('--profile-interval', type=float, default=0.005)
+    parser.add_argument(
+        '--trace-alloc',
+        type=int,
+        nargs='?',
+        const=20,
+        default=int(os.environ.get(ENV_TRACE_ALLOC, 0)) or None,
+        help="开启内存分配跟踪并输出前N项",
+    )
+    args, rest = parser.parse_known_args(sys.argv[1:] if argv is None else argv)
+    return args, rest
+
+
+def run_profiled(func, output_dir, name, *args, **kwargs):
+    """
+    按命令行/环境变量开关运行入口函数
+
+    --profile trace      确定性分析（逐调用计时，开销较大）
+    --profile sample     采样分析（默认每5ms采样一次）
+    --trace-alloc [N]    跟踪内存分配并输出前N项（默认20）
+
+    结果写入 output_dir/profile/ 下，与分析结果放在一起。
+    """
+    options, rest = parse_profile_args()
+    sys.argv[1:] = rest  # 脚本自身的参数解析不受影响
+    if not options.profile and not options.trace_alloc:
+        return func(*args, **kwargs)
+
+    profiler = None
+    if options.profile == 'trace':
+        profiler = TracingProfiler()
+    elif options.profile == 'sample':
+        profiler = SamplingProfiler(options.profile_interval)
+
+    if options.trace_alloc:
+        tracemalloc.start(25)
+    if profiler:
+        profiler.start()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        if profiler:
+            profiler.stop()
+        profile_dir = os.path.join(output_dir, "profile")
+        os.makedirs(profile_dir, exist_ok=True)
+        if profiler:
+            unit = '微秒' if options.profile == 'trace' else '采样数'
+            stacks = profiler.collapsed()
+            collapsed_path = os.path.join(
+                profile_dir, f"{name}.{options.profile}.collapsed"
+            )
+            write_collapsed(stacks, collapsed_path)
+            write_top_functions(
+                stacks,
+                os.path.join(profile_dir, f"{name}.{options.profile}.top.txt"),
+                unit,
+            )
+            print(f"折叠栈已保存至：{collapsed_path}")
+        if options.trace_alloc:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            alloc_path = os.path.join(profile_dir, f"{name}.alloc.txt")
+            write_alloc_report(snapshot, peak, alloc_path, options.trace_alloc)
+            print(f"内存分配报告已保存至：{alloc_path}")
@@ -0,0 +1,164 @@
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from dataset_io import PARQUET_EXTENSION, list_data_files, read_arrow_table
+
+# 配置参数（命令行参数可覆盖）
+input_dir = "C:/Users/East/Desktop/预处理数据/30G"
+threads = None  # 查询并行线程数，默认使用全部核心
+
+# 旧版预处理数据 items_json 中每个商品的结构，用于把JSON数组展开为强类型的行
+ITEM_SCHEMA = (
+    '[{"parent_category": "VARCHAR", "sub_category": "VARCHAR", "price": "DOUBLE"}]'
+)
+
+# 注册的视图：
+#   orders  每行一个订单，即预处理输出的全部列，外加来源文件 filename 与文件内行号 file_row_number
+#   items   每行一个商品，订单列（不含items）+ parent_category / sub_category / price
+VIEWS = {
+    'orders': "{sources}",
+    'items': """
+        SELECT o.* EXCLUDE (items), item.parent_category, item.sub_category,
+               item.price
+        FROM orders o, unnest(o.items) AS t(item)
+    """,
+}
+# 旧版预处理数据（只有items_json字符串列）的 items 视图
+LEGACY_ITEMS_VIEW = """
+    SELECT o.* EXCLUDE (items_json), item.parent_category, item.sub_category,
+           item.price
+    FROM orders o, unnest(from_json(o.items_json, '{schema}')) AS t(item)
+    WHERE json_valid(o.items_json)
+"""
+
+
+def register_arrow_file(con, name, path):
+    """
+    把Arrow IPC文件（内存映射，零拷贝）注册为表，返回查询它的SQL
+
+    附加与 read_parquet 相同的 filename / file_row_number 列。
+    """
+    table = read_arrow_table(path)
+    rows = table.num_rows
+    filename = pa.DictionaryArray.from_arrays(
+        np.zeros(rows, dtype=np.int32), pa.array([path])
+    )
+    table = table.append_column('filename', filename)
+    table = table.append_column('file_row_number', pa.array(np.arange(rows)))
+    con.register(name, table)
+    return f"SELECT * FROM {name}"
+
+
+def order_sources(con, data_dir):
+    """
+    orders 视图的数据来源SQL
+
+    有Parquet文件的数据由 read_parquet 扫描（可按行组统计信息跳过数据）；只写出了
+    Arrow IPC格式的数据（OUTPUT_FORMAT = 'arrow'）逐个注册后合并。
+    """
+    parquet, arrow = [], []
+    for name in list_data_files(data_dir):
+        path = os.path.join(data_dir, name)
+        # 同时有两种格式时仍扫描Parquet
+        parquet_path = os.path.splitext(path)[0] + PARQUET_EXTENSION
+        if os.path.exists(parquet_path):
+            parquet.append(parquet_path.replace('\\', '/'))
+        else:
+            arrow.append(path)
+    if not parquet and not arrow:
+        raise FileNotFoundError(f"目录中没有预处理数据文件：{data_dir}")
+    sources = []
+    if parquet:
+        listing = ", ".join("'" + p.replace("'", "''") + "'" for p in parquet)
+        sources.append(
+            f"SELECT * FROM read_parquet([{listing}], filename = true, "
+            "file_row_number = true, union_by_name = true)"
+        )
+    for i, path in enumerate(arrow):
+        sources.append(register_arrow_file(con, f"arrow_file_{i}", path))
+    return " UNION ALL BY NAME ".join(sources)
+
+
+def connect(data_dir=None, n_threads=None):
+    """
+    打开内存中的DuckDB连接，把预处理目录注册为 orders / items 视图
+
+    视图不物化数据：查询时只读取用到的列，WHERE 条件下推到Parquet扫描并按行组
+    统计信息跳过数据，聚合在多个线程中向量化执行。
+    """
+    try:
+        import duckdb
+    except ImportError:
+        raise ImportError("查询功能需要安装 duckdb：pip install duckdb") from None
+
+    data_dir = data_dir or input_dir
+    con = duckdb.connect()
+    if n_threads or threads:
+        con.execute(f"SET threads = {int(n_threads or threads)}")
+    sources = order_sources(con, data_dir)
+    for name, sql in VIEWS.items():
+        if name == 'items':
+            columns = [row[0] for row in con.execute("DESCRIBE orders").fetchall()]
+            if 'items' not in columns:
+                sql = LEGACY_ITEMS_VIEW
+        con.execute(
+            f"CREATE VIEW {name} AS " + sql.format(sources=sources, schema=ITEM_SCHEMA)
+        )
+    return con
+
+
+def query(sql, data_dir=None, n_threads=None):
+    """执行一条SQL，返回pandas DataFrame"""
+    with connect(data_dir, n_threads) as con:
+        return con.execute(sql).df()
+
+
+def export_query(sql, output_path, data_dir=None, n_threads=None):
+    """把查询结果直接写出为CSV或Parquet（由DuckDB流式写出，不经过pandas）"""
+    fmt = 'PARQUET' if output_path.endswith('.parquet') else 'CSV, HEADER'
+    escaped = output_path.replace("'", "''")
+    with connect(data_dir, n_threads) as con:
+        con.execute(f"COPY ({sql}) TO '{escaped}' (FORMAT {fmt})")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="对预处理数据执行SQL（视图：orders 订单，items 展开后的商品）"
+    )
+    parser.add_argument('sql', help="SQL语句，或以@开头的SQL文件路径")
+    parser.add_argument('--input', default=None, help="预处理数据目录")
+    parser.add_argument('--output', default=None, help="结果写出为 .csv / .parquet")
+    parser.add_argument('--threads', type=int, default=None)
+    parser.add_argument('--explain', action='store_true', help="显示执行计划")
+    return parser.parse_args()
+
+
+def main(args):
+    sql = args.sql
+    if sql.startswith('@'):
+        with open(sql[1:], 'r', encoding='utf-8') as f:
+            sql = f.read()
+    if args.explain:
+        sql = f"EXPLAIN {sql}"
+
+    start = time.perf_counter()
+    if args.output:
+        export_query(sql, args.output, args.input, args.threads)
+        print(f"查询结果已保存至：{args.output}")
+    else:
+        result = query(sql, args.input, args.threads)
+        if args.explain:
+            print(result.iloc[0, -1])
+        else:
+            with pd.option_context('display.max_rows', 200, 'display.width', 200):
+                print(result)
+    print(f"耗时 {time.perf_counter() - start:.2f} 秒", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,265 @@
+import os
+import sys
+import json
+import time
+import socket
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+import pyarrow.parquet as pq
+
+RSS_SAMPLE_INTERVAL = 0.05  # 阶段内采样常驻内存的间隔（秒）
+
+
+def peak_rss_mb():
+    """当前进程自启动以来的峰值常驻内存（MB），平台不支持时返回None"""
+    try:
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux 单位为KB，macOS 为字节
+        return round(peak / (1024**2 if sys.platform == 'darwin' else 1024), 1)
+    except ImportError:
+        pass
+    try:
+        import psutil
+
+        info = psutil.Process().memory_info()
+        return round(getattr(info, 'peak_wset', info.rss) / 1024**2, 1)
+    except ImportError:
+        return None
+
+
+def current_rss_mb():
+    """当前进程此刻的常驻内存（MB），平台不支持时返回None"""
+    try:
+        # Linux：第二个字段为常驻页数，读取开销只有几微秒
+        with open('/proc/self/statm', 'r') as f:
+            pages = int(f.read().split()[1])
+        return round(pages * os.sysconf('SC_PAGE_SIZE') / 1024**2, 1)
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+
+        return round(psutil.Process().memory_info().rss / 1024**2, 1)
+    except ImportError:
+        return None
+
+
+class RssSampler:
+    """
+    后台线程按固定间隔采样常驻内存，更新所有进行中阶段的峰值
+
+    ru_maxrss 是进程生命周期的峰值，只增不减，无法区分各阶段；阶段开始与结束时
+    各采样一次，期间由采样线程补充，得到阶段内的峰值与净增量。
+    """
+
+    def __init__(self, interval=RSS_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.active = set()
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def start(self, record):
+        rss = current_rss_mb()
+        if rss is None:
+            return
+        record.rss_start_mb = record.peak_rss_mb = rss
+        with self._lock:
+            self.active.add(record)
+            # fork出的子进程中没有采样线程，按进程号判断后重新启动
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                threading.Thread(target=self._run, daemon=True).start()
+
+    def stop(self, record):
+        with self._lock:
+            self.active.discard(record)
+        rss = current_rss_mb()
+        if rss is None or record.rss_start_mb is None:
+            return
+        record.peak_rss_mb = max(record.peak_rss_mb, rss)
+        record.rss_delta_mb = round(rss - record.rss_start_mb, 1)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                records = list(self.active)
+            if not records:
+                continue
+            rss = current_rss_mb()
+            for record in records:
+                record.peak_rss_mb = max(record.peak_rss_mb, rss)
+
+
+_sampler = RssSampler()
+
+
+def parquet_bytes(path, columns=None, row_groups=None):
+    """按元数据计算读取指定列（及行组）需要的压缩字节数（比文件大小更准确）"""
+    metadata = pq.ParquetFile(path).metadata
+    total = 0
+    for rg in range(metadata.num_row_groups) if row_groups is None else row_groups:
+        row_group = metadata.row_group(rg)
+        for i in range(row_group.num_columns):
+            column = row_group.column(i)
+            # 嵌套列的路径形如 items.list.element，取顶层列名
+            if columns is None or column.path_in_schema.split('.')[0] in columns:
+                total += column.total_compressed_size
+    return total
+
+
+class PhaseRecord:
+    """单个阶段（可按文件区分）的计量结果"""
+
+    def __init__(self, phase, file=None):
+        self.phase = phase
+        self.file = file
+        self.rows = 0
+        self.bytes = 0
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.rss_start_mb = None
+        self.peak_rss_mb = None  # 阶段内的峰值常驻内存
+        self.rss_delta_mb = None  # 阶段结束与开始时常驻内存之差
+        self.calls = 0
+
+    def merge(self, other):
+        """合并同一阶段、同一文件的多次计量（如按批循环）"""
+        self.rows += other.rows
+        self.bytes += other.bytes
+        self.wall_seconds += other.wall_seconds
+        self.cpu_seconds += other.cpu_seconds
+        if other.peak_rss_mb is not None:
+            self.peak_rss_mb = max(self.peak_rss_mb or 0, other.peak_rss_mb)
+        if other.rss_delta_mb is not None:
+            self.rss_delta_mb = round((self.rss_delta_mb or 0) + other.rss_delta_mb, 1)
+        self.calls += other.calls
+
+    def to_dict(self):
+        return {
+            'phase': self.phase,
+            'file': self.file,
+            'rows': self.rows,
+            'bytes': self.bytes,
+            'wall_seconds': round(self.wall_seconds, 4),
+            'cpu_seconds': round(self.cpu_seconds, 4),
+            'rows_per_second': (
+                round(self.rows / self.wall_seconds, 1)
+                if self.wall_seconds > 0 and self.rows
+                else None
+            ),
+            'peak_rss_mb': self.peak_rss_mb,
+            'rss_delta_mb': self.rss_delta_mb,
+            'calls': self.calls,
+        }
+
+
+class RunMetrics:
+    """
+    轻量级运行计量：按阶段记录墙钟/CPU时间、行数、字节数和阶段内的峰值内存
+
+    各阶段的 peak_rss_mb 为阶段内采样到的峰值、rss_delta_mb 为阶段的内存净增量；
+    报告顶层的 peak_rss_mb 为整个进程的峰值。
+
+    用法:
+        metrics = RunMetrics("2_payment_analysis")
+        with metrics.phase('read', file=file) as m:
+            df = pd.read_parquet(path)
+            m.rows = len(df)
+        metrics.write(output_dir)
+    """
+
+    def __init__(self, script):
+        self.script = script
+        self.records = {}
+        self.counters = {}
+        self.started_at = datetime.now()
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+
+    @contextmanager
+    def phase(self, name, file=None):
+        record = PhaseRecord(name, file)
+        _sampler.start(record)
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield record
+        finally:
+            record.wall_seconds = time.perf_counter() - wall_start
+            record.cpu_seconds = time.process_time() - cpu_start
+            _sampler.stop(record)
+            record.calls = 1
+            key = (name, file)
+            if key in self.records:
+                self.records[key].merge(record)
+            else:
+                self.records[key] = record
+
+    def count(self, name, n=1):
+        """累加自定义计数器（如错误记录数）"""
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def totals(self):
+        """按阶段汇总所有文件"""
+        totals = {}
+        for record in self.records.values():
+            t = totals.setdefault(
+                record.phase,
+                {
+                    'rows': 0,
+                    'bytes': 0,
+                    'wall_seconds': 0.0,
+                    'cpu_seconds': 0.0,
+                    'peak_rss_mb': None,
+                },
+            )
+            if record.peak_rss_mb is not None:
+                t['peak_rss_mb'] = max(t['peak_rss_mb'] or 0, record.peak_rss_mb)
+            t['rows'] += record.rows
+            t['bytes'] += record.bytes
+            t['wall_seconds'] += record.wall_seconds
+            t['cpu_seconds'] += record.cpu_seconds
+        for t in totals.values():
+            t['rows_per_second'] = (
+                round(t['rows'] / t['wall_seconds'], 1)
+                if t['wall_seconds'] > 0 and t['rows']
+                else None
+            )
+            t['wall_seconds'] = round(t['wall_seconds'], 4)
+            t['cpu_seconds'] = round(t['cpu_seconds'], 4)
+        return totals
+
+    def report(self):
+        totals = self.totals()
+        dominant = max(totals, key=lambda p: totals[p]['wall_seconds'], default=None)
+        return {
+            'script': self.script,
+            'host': socket.gethostname(),
+            'pid': os.getpid(),
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'wall_seconds': round(time.perf_counter() - self._wall_start, 4),
+            'cpu_seconds': round(time.process_time() - self._cpu_start, 4),
+            'peak_rss_mb': peak_rss_mb(),
+            'dominant_phase': dominant,
+            'totals': totals,
+            'counters': self.counters,
+            'phases': [r.to_dict() for r in self.records.values()],
+        }
+
+    def write(self, output_dir, filename=None):
+        """写出JSON运行报告，返回报告路径"""
+        os.makedirs(output_dir, exist_ok=True)
+        path = os.path.join(output_dir, filename or f"run_report_{self.script}.json")
+        report = self.report()
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(
+            f"运行报告已保存至：{path}"
+            f"（总耗时 {report['wall_seconds']:.2f} 秒，主要阶段：{report['dominant_phase']}）"
+        )
+        return path
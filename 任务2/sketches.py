@@ -0,0 +1,367 @@
+import os
+import math
+import base64
+import hashlib
+
+import numpy as np
+
+KEY_SEPARATOR = "\x1f"  # 元组键拼接为字符串时的分隔符（不会出现在类别名中）
+
+
+def stable_hash64(keys):
+    """
+    元组键 -> 64位哈希数组
+
+    使用blake2b而不是内置hash()：后者对字符串按进程随机化，不同文件、不同
+    工作进程算出的草图无法合并。
+    """
+    return np.array(
+        [
+            int.from_bytes(
+                hashlib.blake2b(
+                    KEY_SEPARATOR.join(key).encode('utf-8'), digest_size=8
+                ).digest(),
+                'little',
+            )
+            for key in keys
+        ],
+        dtype=np.uint64,
+    )
+
+
+def hash_int64(values):
+    """
+    整数ID -> 64位哈希数组（splitmix64 终结函数，向量化计算）
+
+    同一ID在任何进程中得到相同哈希，且低位规律的自增ID也能均匀打散。
+    """
+    x = np.asarray(values).astype(np.uint64)
+    with np.errstate(over='ignore'):
+        x = x + np.uint64(0x9E3779B97F4A7C15)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+class SpaceSaving:
+    """
+    Space-Saving 频繁项摘要（Metwally 等，2005）
+
+    最多保留capacity个键，每个键记录计数上界count与最大高估量error：
+    真实频次在 [count - error, count] 之间，且 error ≤ total / capacity；
+    未保留的键真实频次不超过 min_count()。两份摘要按 Agarwal 等（2012）
+    的方法合并后仍满足这些界，因此可以按文件、按工作进程分别计算再汇总。
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self.total = 0
+
+    def min_count(self):
+        """未保留键的频次上界：摘要未满时为0"""
+        if len(self.counts) < self.capacity:
+            return 0
+        return min(self.counts.values())
+
+    def update(self, counts):
+        """并入一批精确计数 {键: 次数}"""
+        self._combine(counts, {}, 0, sum(counts.values()))
+
+    def merge(self, other):
+        self._combine(other.counts, other.errors, other.min_count(), other.total)
+
+    def _combine(self, counts, errors, floor, total):
+        # 一方缺失的键按该方的 min_count 计入：它可能曾出现但被淘汰
+        own_floor = self.min_count()
+        merged_counts = {}
+        merged_errors = {}
+        for key in self.counts.keys() | counts.keys():
+            if key in self.counts:
+                count, error = self.counts[key], self.errors[key]
+            else:
+                count, error = own_floor, own_floor
+            if key in counts:
+                count += counts[key]
+                error += errors.get(key, 0)
+            else:
+                count += floor
+                error += floor
+            merged_counts[key] = count
+            merged_errors[key] = error
+        # 按计数降序截断，计数相同按键排序，结果不受集合遍历顺序影响
+        keep = sorted(merged_counts, key=lambda k: (-merged_counts[k], k))
+        keep = keep[: self.capacity]
+        self.counts = {k: merged_counts[k] for k in keep}
+        self.errors = {k: merged_errors[k] for k in keep}
+        self.total += total
+
+
+class CountMinSketch:
+    """
+    Count-Min 草图（Cormode & Muthukrishnan，2005）
+
+    depth行、每行width个计数器；估计值不低于真实频次，且以 1 - delta 的
+    概率不超过 真实频次 + epsilon × total。同尺寸的草图直接相加即可合并。
+    """
+
+    def __init__(self, width, depth):
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.int64)
+
+    @classmethod
+    def from_error(cls, epsilon, delta):
+        """按误差要求确定尺寸：width = ⌈e/ε⌉，depth = ⌈ln(1/δ)⌉"""
+        return cls(math.ceil(math.e / epsilon), math.ceil(math.log(1 / delta)))
+
+    def _columns(self, keys):
+        # 双重哈希：第i行的列号 = (h1 + i × h2) mod width
+        hashes = stable_hash64(keys)
+        h1 = hashes & np.uint64(0xFFFFFFFF)
+        h2 = (hashes >> np.uint64(32)) | np.uint64(1)
+        rows = np.arange(self.depth, dtype=np.uint64)[:, None]
+        return ((h1[None, :] + rows * h2[None, :]) % np.uint64(self.width)).astype(
+            np.int64
+        )
+
+    def update(self, counts):
+        """并入一批计数 {键: 次数}"""
+        if not counts:
+            return
+        columns = self._columns(list(counts))
+        values = np.fromiter(counts.values(), dtype=np.int64, count=len(counts))
+        for row in range(self.depth):
+            np.add.at(self.table[row], columns[row], values)
+
+    def estimate(self, keys):
+        """各键的频次上界"""
+        if not keys:
+            return np.zeros(0, dtype=np.int64)
+        columns = self._columns(keys)
+        rows = np.arange(self.depth)[:, None]
+        return self.table[rows, columns].min(axis=0)
+
+    def merge(self, other):
+        if self.table.shape != other.table.shape:
+            raise ValueError("只能合并相同尺寸的Count-Min草图")
+        self.table += other.table
+
+
+class HeavyHitters:
+    """
+    固定内存的高频键统计：Space-Saving 负责找出候选键，Count-Min 收紧其上界
+
+    键先在缓冲区中精确计数，缓冲区达到 capacity × buffer_factor 个键时并入
+    两份摘要并清空，内存与数据量无关。top() 返回每个候选键的估计频次（两种
+    上界中较小者）与下界（Space-Saving 的 count - error）。
+    """
+
+    def __init__(self, capacity, epsilon=0.001, delta=0.01, buffer_factor=4):
+        self.summary = SpaceSaving(capacity)
+        self.sketch = CountMinSketch.from_error(epsilon, delta)
+        self.buffer_size = capacity * buffer_factor
+        self.buffer = {}
+
+    def add(self, key, count=1):
+        self.buffer[key] = self.buffer.get(key, 0) + count
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.summary.update(self.buffer)
+            self.sketch.update(self.buffer)
+            self.buffer = {}
+
+    def merge(self, other):
+        self.flush()
+        other.flush()
+        self.summary.merge(other.summary)
+        self.sketch.merge(other.sketch)
+
+    @property
+    def total(self):
+        return self.summary.total + sum(self.buffer.values())
+
+    def top(self, n=None):
+        """[(键, 估计频次, 频次下界), ...]，按估计频次降序"""
+        self.flush()
+        keys = list(self.summary.counts)
+        upper = np.minimum(
+            np.array([self.summary.counts[k] for k in keys], dtype=np.int64),
+            self.sketch.estimate(keys),
+        )
+        result = [
+            (
+                key,
+                int(estimate),
+                max(self.summary.counts[key] - self.summary.errors[key], 0),
+            )
+            for key, estimate in zip(keys, upper)
+        ]
+        result.sort(key=lambda r: (-r[1], r[0]))
+        return result[:n] if n else result
+
+    def error_bound(self):
+        """任一键估计频次的最大高估量（Count-Min 部分以 1 - delta 的概率成立）"""
+        self.flush()
+        return min(
+            self.summary.total / self.summary.capacity,
+            math.e / self.sketch.width * self.summary.total,
+        )
+
+    def to_dict(self):
+        """JSON可序列化的部分结果，用于按文件缓存与跨进程合并"""
+        self.flush()
+        return {
+            'capacity': self.summary.capacity,
+            'total': self.summary.total,
+            'items': [
+                [list(k), c, self.summary.errors[k]]
+                for k, c in self.summary.counts.items()
+            ],
+            'cms_width': self.sketch.width,
+            'cms_depth': self.sketch.depth,
+            'cms_table': self.sketch.table.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, data, buffer_factor=4):
+        hitters = cls.__new__(cls)
+        hitters.summary = SpaceSaving(data['capacity'])
+        hitters.summary.total = data['total']
+        for key, count, error in data['items']:
+            hitters.summary.counts[tuple(key)] = count
+            hitters.summary.errors[tuple(key)] = error
+        hitters.sketch = CountMinSketch(data['cms_width'], data['cms_depth'])
+        hitters.sketch.table[:] = np.array(data['cms_table'], dtype=np.int64)
+        hitters.buffer_size = data['capacity'] * buffer_factor
+        hitters.buffer = {}
+        return hitters
+
+
+class HyperLogLog:
+    """
+    HyperLogLog 基数估计（Flajolet 等，2007）
+
+    2^precision 个单字节寄存器（precision=12 时4KB），相对标准误差约
+    1.04 / √(2^precision)，与去重对象的数量无关。两份草图逐寄存器取最大值
+    即为并集的草图，因此按文件、按月份、按类别分别保存后，任意组合的去重数
+    都可以由草图合并得到，无需回到原始数据。
+    """
+
+    def __init__(self, precision=12, registers=None):
+        if not 11 <= precision <= 16:
+            raise ValueError("precision 需在 11 到 16 之间")
+        self.precision = precision
+        self.registers = (
+            np.zeros(1 << precision, dtype=np.uint8) if registers is None else registers
+        )
+
+    def add_hashes(self, hashes):
+        """并入一批64位哈希值"""
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        if not len(hashes):
+            return
+        p = self.precision
+        index = (hashes >> np.uint64(64 - p)).astype(np.int64)
+        rest = hashes & np.uint64((1 << (64 - p)) - 1)
+        # rest 不超过53位，转为float64是精确的，frexp的指数即其二进制位数
+        bit_length = np.frexp(rest.astype(np.float64))[1]
+        rank = (64 - p) - bit_length + 1
+        np.maximum.at(self.registers, index, rank.astype(np.uint8))
+
+    def add_ints(self, values):
+        self.add_hashes(hash_int64(values))
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError("只能合并相同精度的HyperLogLog草图")
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def count(self):
+        """去重数估计值"""
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.exp2(-self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # 小基数时改用线性计数，偏差更小
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def to_bytes(self):
+        return self.registers.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data):
+        registers = np.frombuffer(data, dtype=np.uint8).copy()
+        return cls(int(math.log2(len(registers))), registers)
+
+    def to_text(self):
+        """base64文本，用于写入JSON缓存"""
+        return base64.b64encode(self.to_bytes()).decode('ascii')
+
+    @classmethod
+    def from_text(cls, text):
+        return cls.from_bytes(base64.b64decode(text))
+
+
+def merge_sketches(target, sketches):
+    """把 {键: 草图} 并入target（同键合并）"""
+    for key, sketch in sketches.items():
+        if key in target:
+            target[key].merge(sketch)
+        else:
+            target[key] = sketch
+
+
+def write_hll_table(path, key_columns, sketches):
+    """
+    把 {键元组: HyperLogLog} 保存为Parquet：每个键一行，键列 + 寄存器列registers
+
+    同时写出每行的去重数估计distinct，便于直接查看。
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    keys = sorted(sketches)
+    columns = {name: [key[i] for key in keys] for i, name in enumerate(key_columns)}
+    columns['distinct'] = [sketches[key].count() for key in keys]
+    columns['registers'] = pa.array(
+        [sketches[key].to_bytes() for key in keys], type=pa.binary()
+    )
+    tmp_path = f"{path}.tmp"
+    pq.write_table(pa.table(columns), tmp_path, compression='zstd')
+    os.replace(tmp_path, path)
+
+
+def rollup_distinct(path, by=(), **filters):
+    """
+    从保存的草图表回答任意并集/上卷的去重数
+
+    by: 保留的键列，其余键列被合并（如按类别汇总全部月份）；
+    filters: 键列 = 值 或 值列表，只合并满足条件的行。
+    返回DataFrame：by 各列 + distinct。
+    """
+    import pandas as pd
+
+    table = pd.read_parquet(path)
+    for column, value in filters.items():
+        values = value if isinstance(value, (list, tuple, set)) else [value]
+        table = table[table[column].isin(values)]
+    groups = table.groupby(list(by), sort=True) if by else [((), table)]
+    rows = []
+    for key, group in groups:
+        sketch = None
+        for data in group['registers']:
+            part = HyperLogLog.from_bytes(data)
+            if sketch is None:
+                sketch = part
+            else:
+                sketch.merge(part)
+        key = key if isinstance(key, tuple) else (key,)
+        rows.append(dict(zip(by, key), distinct=sketch.count() if sketch else 0))
+    return pd.DataFrame(rows, columns=list(by) + ['distinct'])
@@ -0,0 +1,156 @@
+import os
+import sys
+import heapq
+import pickle
+import shutil
+import tempfile
+
+ENTRY_OVERHEAD = 100  # 字典项/列表槽位及计数对象的大致开销（字节）
+
+
+def approx_size(obj):
+    """对象的大致内存占用：容器本身加一层元素（足以估计元组/列表记录）"""
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (tuple, list)):
+        size += sum(approx_size(x) for x in obj)
+    return size
+
+
+class SpillDir:
+    """溢写文件所在的临时目录，退出时删除"""
+
+    def __init__(self, spill_dir=None, prefix="spill-"):
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+        self.path = tempfile.mkdtemp(prefix=prefix, dir=spill_dir)
+        self.runs = 0  # 溢写次数
+
+    def close(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _read_chunks(path):
+    """依次读出文件中用pickle连续写入的各块"""
+    with open(path, 'rb') as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
+
+
+class SpillingCounter(SpillDir):
+    """
+    内存预算内的分组计数
+
+    计数先累加在内存字典中；估计占用超过budget_bytes时按键的哈希分成partitions
+    个分区，各自追加写入磁盘后清空字典。items() 逐个分区读回全部溢写段并合并，
+    合并时内存中只有一个分区的键。
+    """
+
+    def __init__(self, budget_bytes, spill_dir=None, partitions=16):
+        super().__init__(spill_dir, prefix="counter-")
+        self.budget_bytes = budget_bytes
+        self.partitions = partitions
+        self.counts = {}
+        self.used_bytes = 0
+
+    def add(self, key, count=1):
+        if key in self.counts:
+            self.counts[key] += count
+            return
+        self.counts[key] = count
+        self.used_bytes += approx_size(key) + ENTRY_OVERHEAD
+        if self.used_bytes > self.budget_bytes:
+            self.spill()
+
+    def _partition_path(self, partition):
+        return os.path.join(self.path, f"part-{partition:03d}.pkl")
+
+    def spill(self):
+        if not self.counts:
+            return
+        parts = [[] for _ in range(self.partitions)]
+        for key, count in self.counts.items():
+            parts[hash(key) % self.partitions].append((key, count))
+        for partition, entries in enumerate(parts):
+            if entries:
+                with open(self._partition_path(partition), 'ab') as f:
+                    pickle.dump(entries, f, protocol=pickle.HIGHEST_PROTOCOL)
+        self.runs += 1
+        self.counts = {}
+        self.used_bytes = 0
+
+    def items(self):
+        """合并后的 (键, 计数)；未发生溢写时直接返回内存中的结果"""
+        if not self.runs:
+            yield from self.counts.items()
+            return
+        self.spill()
+        for partition in range(self.partitions):
+            path = self._partition_path(partition)
+            if not os.path.exists(path):
+                continue
+            merged = {}
+            for entries in _read_chunks(path):
+                for key, count in entries:
+                    merged[key] = merged.get(key, 0) + count
+            yield from merged.items()
+
+
+class ExternalSorter(SpillDir):
+    """
+    内存预算内的外部排序
+
+    记录先缓存在内存中；估计占用超过budget_bytes时排序后写出一个有序段。
+    sorted() 多路归并各有序段与剩余缓冲区，逐条产出。排序与归并都是稳定的：
+    键相同的记录保持加入时的先后顺序。
+    """
+
+    def __init__(self, budget_bytes, key=None, spill_dir=None, chunk_records=10000):
+        super().__init__(spill_dir, prefix="sort-")
+        self.budget_bytes = budget_bytes
+        self.key = key
+        self.chunk_records = chunk_records  # 有序段按块写出，归并时每段只读入一块
+        self.buffer = []
+        self.used_bytes = 0
+        self.run_paths = []
+
+    def add(self, record):
+        self.buffer.append(record)
+        self.used_bytes += approx_size(record) + ENTRY_OVERHEAD
+        if self.used_bytes > self.budget_bytes:
+            self.spill()
+
+    def spill(self):
+        if not self.buffer:
+            return
+        self.buffer.sort(key=self.key)
+        path = os.path.join(self.path, f"run-{len(self.run_paths):05d}.pkl")
+        with open(path, 'wb') as f:
+            for start in range(0, len(self.buffer), self.chunk_records):
+                pickle.dump(
+                    self.buffer[start : start + self.chunk_records],
+                    f,
+                    protocol=pickle.HIGHEST_PROTOCOL,
+                )
+        self.run_paths.append(path)
+        self.runs += 1
+        self.buffer = []
+        self.used_bytes = 0
+
+    def _read_run(self, path):
+        for chunk in _read_chunks(path):
+            yield from chunk
+
+    def sorted(self):
+        self.buffer.sort(key=self.key)
+        runs = [self._read_run(path) for path in self.run_paths]
+        # 缓冲区中的记录最后加入，放在最后一路，保证归并稳定
+        return heapq.merge(*runs, self.buffer, key=self.key)
@@ -0,0 +1,163 @@
+import os
+import importlib.util
+from pathlib import Path
+
+TASK2_DIR = os.path.dirname(os.path.abspath(__file__))
+TASK1_DIR = os.path.join(os.path.dirname(TASK2_DIR), "任务1")
+CATALOG_FILE = os.path.join(TASK2_DIR, "product_catalog.json")
+# user_features.py 写出的特征表文件名（FEATURE_FILE）
+FEATURE_FILE = "user_features.parquet"
+
+
+def _join(base, *parts):
+    return None if base is None else os.path.join(base, *parts)
+
+
+def _as_path(path):
+    """可视化.py 使用 pathlib.Path 参数"""
+    return None if path is None else Path(path)
+
+
+def build_stages(raw, processed, out, catalog=CATALOG_FILE):
+    """
+    流水线各阶段的定义（命令行入口与基准测试共用）
+
+    每个阶段：脚本路径、需要覆盖的模块级配置、入口函数及参数、输入目录、输出目录，
+    以及流水线调度用的上游阶段 deps 与资源估计 resources（核数、峰值内存MB，
+    按30G数据的单文件处理粗略估计，可在配置文件的 resources 中覆盖）。
+    目录为None时对应配置不覆盖，沿用脚本中的默认值。商品目录 catalog 同时传给
+    预处理与各分析阶段（分析在扫描时按商品ID关联当前目录）。用户画像与可视化
+    读取 user_features 阶段写出的特征表，不再各自解析原始数据。
+    """
+    features = _join(out, "features")
+    return {
+        'preprocess': {
+            'script': os.path.join(TASK2_DIR, "0_preprocess.py"),
+            'config': {
+                'INPUT_DIR': raw,
+                'PROCESSED_DIR': processed,
+                'PRODUCT_CATALOG_FILE': catalog,
+            },
+            'input': raw,
+            'output': processed,
+            'deps': [],
+            'resources': {'cpus': 1, 'memory_mb': 2048},
+        },
+        'category_rules': {
+            'script': os.path.join(TASK2_DIR, "1_category_rules.py"),
+            'config': {
+                'input_dir': processed,
+                'output_dir': _join(out, "1"),
+                'catalog_file': catalog,
+            },
+            'input': processed,
+            'output': _join(out, "1"),
+            'deps': ['preprocess'],
+            'resources': {'cpus': 1, 'memory_mb': 1024},
+        },
+        'new_rule': {
+            'script': os.path.join(TASK2_DIR, "1_new_rule.py"),
+            'config': {
+                'input_dir': processed,
+                'output_dir': _join(out, "1_rule"),
+                'catalog_file': catalog,
+            },
+            'input': processed,
+            'output': _join(out, "1_rule"),
+            'deps': ['preprocess'],
+            'resources': {'cpus': 1, 'memory_mb': 2048},
+        },
+        'payment': {
+            'script': os.path.join(TASK2_DIR, "2_payment_analysis.py"),
+            'config': {
+                'input_dir': processed,
+                'output_dir': _join(out, "2"),
+                'catalog_file': catalog,
+            },
+            'input': processed,
+            'output': _join(out, "2"),
+            'deps': ['preprocess'],
+            'resources': {'cpus': 1, 'memory_mb': 1024},
+        },
+        'time': {
+            'script': os.path.join(TASK2_DIR, "3_time_analysis.py"),
+            'config': {
+                'input_dir': processed,
+                'output_dir': _join(out, "3"),
+                'catalog_file': catalog,
+            },
+            'input': processed,
+            'output': _join(out, "3"),
+            'deps': ['preprocess'],
+            'resources': {'cpus': 1, 'memory_mb': 3072},
+        },
+        'refund': {
+            'script': os.path.join(TASK2_DIR, "4_refund_analysis.py"),
+            'config': {
+                'input_dir': processed,
+                'output_dir': _join(out, "4"),
+                'catalog_file': catalog,
+            },
+            'input': processed,
+            'output': _join(out, "4"),
+            'deps': ['preprocess'],
+            'resources': {'cpus': 1, 'memory_mb': 1024},
+        },
+        'copurchase': {
+            'script': os.path.join(TASK2_DIR, "5_copurchase.py"),
+            'config': {'input_dir': processed, 'output_dir': _join(out, "5")},
+            'input': processed,
+            'output': _join(out, "5"),
+            'deps': ['preprocess'],
+            'resources': {'cpus': 4, 'memory_mb': 4096},
+        },
+        'user_features': {
+            'script': os.path.join(TASK2_DIR, "user_features.py"),
+            'config': {
+                'input_dir': raw,
+                'output_dir': features,
+                'PRODUCT_CATALOG_FILE': catalog,
+            },
+            'input': raw,
+            'output': features,
+            'deps': [],
+            'resources': {'cpus': 1, 'memory_mb': 2048},
+        },
+        'user_profile': {
+            'script': os.path.join(TASK1_DIR, "用户画像.py"),
+            'config': {'FEATURE_TABLE': _join(features, FEATURE_FILE)},
+            'args': [raw, _join(out, "profile")],
+            'input': raw,
+            'output': _join(out, "profile"),
+            'deps': ['user_features'],
+            'resources': {'cpus': 1, 'memory_mb': 4096},
+        },
+        'visualize': {
+            'script': os.path.join(TASK1_DIR, "可视化.py"),
+            'config': {'FEATURE_TABLE': _join(features, FEATURE_FILE)},
+            'args': [_as_path(raw), _as_path(_join(out, "visualize"))],
+            'input': raw,
+            'output': _join(out, "visualize"),
+            'deps': ['user_features'],
+            'resources': {'cpus': 1, 'memory_mb': 2048},
+        },
+    }
+
+
+def load_script(path, name):
+    """按文件路径加载脚本模块（脚本名以数字开头，无法直接import）"""
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def run_script_function(path, func_name, *args):
+    """
+    按文件路径加载脚本并调用其中的函数（供子进程使用）
+
+    以文件路径加载的脚本函数无法按模块名pickle，子进程的target改为本函数，
+    在子进程中重新加载脚本后再调用。
+    """
+    name = os.path.splitext(os.path.basename(path))[0]
+    return getattr(load_script(path, name), func_name)(*args)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 任务2 的脚本按同目录模块互相导入
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,33 @@
+import os
+import json
+
+import pandas as pd
+from benchmark import run_benchmark
+
+
+def test_benchmark_export_tiny(tmp_path):
+    work_dir = str(tmp_path)
+    report = run_benchmark(
+        work_dir, ['preprocess', 'export'], 'tiny', files=1, rows=500, seed=42
+    )
+    assert [r['stage'] for r in report['results']] == ['preprocess', 'export']
+    assert not [r for r in report['results'] if 'error' in r]
+
+    # 预处理写出的列表列（item_ids、items）以JSON字符串导出
+    df = pd.read_csv(
+        os.path.join(report['work_dir'], "output", "export", "sample.csv"),
+        encoding='utf-8-sig',
+    )
+    assert len(df) == 500
+    item_ids = df['item_ids'].map(json.loads)
+    assert (item_ids.map(len) == df['item_count']).all()
+    assert all(isinstance(i, int) for ids in item_ids for i in ids)
+    assert 'parent_category' in json.loads(df['items'][0])[0]
+
+
+def test_benchmark_data_keyed_by_parameters(tmp_path):
+    work_dir = str(tmp_path)
+    small = run_benchmark(work_dir, ['preprocess'], 'tiny', 1, 200, seed=1)
+    large = run_benchmark(work_dir, ['preprocess'], 'tiny', 1, 300, seed=1)
+    assert small['work_dir'] != large['work_dir']
+    assert [r['input_rows'] for r in small['results'] + large['results']] == [200, 300]
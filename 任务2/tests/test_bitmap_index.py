@@ -0,0 +1,90 @@
+import json
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from bitmap_index import BitmapIndex, RoaringBitmap, index_path, read_indexed_rows
+
+
+def positions(seed):
+    """跨多个容器的行号：稠密块（位图容器）与稀疏块（数组容器）混合"""
+    rng = np.random.default_rng(seed)
+    dense = rng.choice(1 << 16, size=30000, replace=False)
+    sparse = rng.choice(np.arange(1 << 16, 4 << 16), size=3000, replace=False)
+    return np.concatenate([dense, sparse])
+
+
+def test_roaring_set_operations_match_numpy():
+    a, b = positions(0), positions(1)
+    ra, rb = RoaringBitmap.from_positions(a), RoaringBitmap.from_positions(b)
+    kinds = {c.dtype for c in ra.containers.values()}
+    assert kinds == {np.dtype(np.uint8), np.dtype(np.uint16)}
+    assert np.array_equal(ra.to_array(), np.unique(a))
+    assert len(ra) == len(np.unique(a))
+    assert np.array_equal((ra | rb).to_array(), np.union1d(a, b))
+    assert np.array_equal((ra & rb).to_array(), np.intersect1d(a, b))
+    sparse = RoaringBitmap.from_positions(b[-100:])
+    assert np.array_equal((ra & sparse).to_array(), np.intersect1d(a, b[-100:]))
+    assert len(RoaringBitmap() | RoaringBitmap()) == 0
+
+
+def order_frame(n=1000):
+    rng = np.random.default_rng(2)
+    categories = np.array(['服装', '食品', '电子产品'])
+    items = [
+        json.dumps(
+            [
+                {'parent_category': c, 'sub_category': c, 'price': 1.0}
+                for c in rng.choice(categories, size=rng.integers(1, 3))
+            ],
+            ensure_ascii=False,
+        )
+        for _ in range(n)
+    ]
+    status = rng.choice(['已支付', '已退款', '部分退款'], size=n)
+    return pd.DataFrame({'payment_status': status, 'items_json': items})
+
+
+def write_indexed(tmp_path, df, catalog="catalog-v1"):
+    path = str(tmp_path / "processed_part.parquet")
+    pq.write_table(
+        pa.Table.from_pandas(df, preserve_index=False), path, row_group_size=200
+    )
+    BitmapIndex.build(df).write(index_path(path), [path], catalog)
+    return path
+
+
+def test_indexed_rows_match_filter(tmp_path):
+    df = order_frame()
+    path = write_indexed(tmp_path, df)
+    rows, row_groups = read_indexed_rows(
+        path, ['payment_status'], 'payment_status', ['已退款', '部分退款']
+    )
+    expected = df[df['payment_status'].isin(['已退款', '部分退款'])]
+    assert list(rows.index) == list(expected.index)
+    assert list(rows['payment_status']) == list(expected['payment_status'])
+    assert row_groups == [0, 1, 2, 3, 4]
+
+    catalog = SimpleNamespace(fingerprint="catalog-v1")
+    rows, _ = read_indexed_rows(
+        path, ['items_json'], 'parent_category', ['食品'], catalog
+    )
+    assert list(rows.index) == list(df.index[df['items_json'].str.contains('食品')])
+
+
+def test_stale_index_is_ignored(tmp_path):
+    df = order_frame()
+    path = write_indexed(tmp_path, df)
+    assert BitmapIndex.load(path) is not None
+    # 建索引时的商品目录已变化：父类别索引过期，状态索引仍可用
+    catalog = SimpleNamespace(fingerprint="catalog-v2")
+    assert read_indexed_rows(path, None, 'parent_category', ['食品'], catalog) is None
+    assert read_indexed_rows(path, None, 'payment_status', ['已支付'], catalog)
+
+    # 数据文件被重写后索引不再匹配
+    pq.write_table(pa.Table.from_pandas(df.iloc[::-1], preserve_index=False), path)
+    assert BitmapIndex.load(path) is None
+    assert read_indexed_rows(path, None, 'payment_status', ['已支付']) is None
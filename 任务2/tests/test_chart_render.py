@@ -0,0 +1,33 @@
+from chart_render import ChartJob
+from stages import load_script
+
+SCRIPT = '''
+STYLE = {'font.size': %d}
+
+
+def apply_style(rc):
+    return dict(rc)
+
+
+def plot(data):
+    return apply_style(STYLE), data
+'''
+
+
+def fingerprint(tmp_path, font_size):
+    script = tmp_path / "charts.py"
+    script.write_text(SCRIPT % font_size, encoding='utf-8')
+    module = load_script(str(script), "charts")
+    return ChartJob("plot", module.plot, args=([1, 2],)).fingerprint()
+
+
+def test_fingerprint_covers_style_and_helpers(tmp_path):
+    base = fingerprint(tmp_path, 12)
+    assert fingerprint(tmp_path, 12) == base
+    assert fingerprint(tmp_path, 14) != base
+    script = tmp_path / "charts.py"
+    script.write_text(
+        (SCRIPT % 12).replace("dict(rc)", "dict(rc, dpi=300)"), encoding='utf-8'
+    )
+    module = load_script(str(script), "charts")
+    assert ChartJob("plot", module.plot, args=([1, 2],)).fingerprint() != base
@@ -0,0 +1,48 @@
+import os
+
+import pyarrow.parquet as pq
+
+from dead_letter import DeadLetterSink
+from partial_cache import PartialCache
+
+
+def run(tmp_path, files, keep=()):
+    sink = DeadLetterSink("analysis")
+    sink.open(str(tmp_path / "out"), keep=keep)
+    cache = PartialCache(str(tmp_path / "cache"), "analysis")
+
+    def compute(path):
+        sink.add(os.path.basename(path), 3, ValueError("bad price"), "{}")
+        return {'total': 1}
+
+    for path in files:
+        assert cache.get_or_compute(path, compute, sink) == {'total': 1}
+    sink.close()
+    return dict(sink.counts), pq.read_table(sink_path(tmp_path)).to_pylist()
+
+
+def sink_path(tmp_path):
+    return tmp_path / "out" / "dead_letter" / "analysis.parquet"
+
+
+def test_cached_partials_keep_dead_letters(tmp_path):
+    data = tmp_path / "part.parquet"
+    data.write_bytes(b"PAR1" + b"x" * 100)
+    first = run(tmp_path, [str(data)])
+    assert first[0] == {'bad_value': 1}
+    assert run(tmp_path, [str(data)]) == first
+
+
+def test_open_keeps_unprocessed_files(tmp_path):
+    sink = DeadLetterSink("analysis")
+    sink.open(str(tmp_path / "out"))
+    sink.add("a.parquet", 1, KeyError("price"))
+    sink.add("b.parquet", 2, KeyError("price"))
+    sink.close()
+
+    sink = DeadLetterSink("analysis")
+    sink.open(str(tmp_path / "out"), keep=["a.parquet"])
+    sink.close()
+    rows = pq.read_table(sink_path(tmp_path)).to_pylist()
+    assert [(r['file'], r['row']) for r in rows] == [("a.parquet", 1)]
+    assert sink.counts == {'missing_field': 1}
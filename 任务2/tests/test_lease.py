@@ -0,0 +1,18 @@
+from lease import LeaseManager
+
+
+def test_done_marker_requires_matching_signature(tmp_path):
+    leases = LeaseManager(str(tmp_path), 'w0', ttl=5)
+    processed = []
+
+    def process(task, lease):
+        processed.append(task)
+        return True
+
+    assert leases.run(['a', 'b'], process, signatures={'a': 1, 'b': 1}) == ['a', 'b']
+    leases = LeaseManager(str(tmp_path), 'w0', ttl=5)
+    assert leases.run(['a', 'b'], process, signatures={'a': 1, 'b': 1}) == []
+    # 输入变化后旧的完成标记失效，只重新处理签名变化的任务
+    leases = LeaseManager(str(tmp_path), 'w0', ttl=5)
+    assert leases.run(['a', 'b'], process, signatures={'a': 1, 'b': 2}) == ['b']
+    assert processed == ['a', 'b', 'b']
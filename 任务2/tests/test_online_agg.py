@@ -0,0 +1,66 @@
+import random
+
+import numpy as np
+
+from online_agg import ProgressiveEstimator, run_progressive
+
+
+def population(seed=0, units=200):
+    """各行组的计数：行组大小与键a的占比都随行组变化（整群抽样）"""
+    rng = np.random.default_rng(seed)
+    sizes = rng.integers(500, 1500, size=units)
+    a = rng.binomial(sizes, rng.uniform(0.2, 0.4, size=units))
+    return [
+        {'t': {(None, 'a'): int(y), (None, 'b'): int(x - y)}} for x, y in zip(sizes, a)
+    ]
+
+
+def true_share(units):
+    a = sum(u['t'][(None, 'a')] for u in units)
+    return a, a / sum(sum(u['t'].values()) for u in units)
+
+
+def share_row(estimator):
+    rows = estimator.estimates('t')
+    return rows[rows['key'] == 'a'].iloc[0]
+
+
+def test_confidence_interval_coverage():
+    units = population()
+    _, share = true_share(units)
+    rng = random.Random(0)
+    trials, covered = 400, 0
+    for _ in range(trials):
+        estimator = ProgressiveEstimator(len(units), confidence=0.95)
+        for unit in rng.sample(units, 30):
+            estimator.add(unit)
+        row = share_row(estimator)
+        covered += abs(row['share'] - share) <= row['half_width']
+    # 95%置信区间在固定种子下的实际覆盖率
+    assert 0.90 <= covered / trials <= 0.99
+
+
+def test_full_read_is_exact():
+    units = population(1, units=20)
+    count, share = true_share(units)
+    estimator = ProgressiveEstimator(len(units))
+    for unit in units:
+        estimator.add(unit)
+    row = share_row(estimator)
+    assert row['half_width'] == 0
+    assert row['estimate'] == count
+    assert abs(row['share'] - share) < 1e-12
+
+
+def test_run_progressive_stops_when_converged():
+    units = population(2)
+    estimator = run_progressive(
+        list(range(len(units))), units.__getitem__, error=0.02, min_units=10, seed=3
+    )
+    assert 10 <= estimator.units < len(units)
+    assert estimator.max_half_width() <= 0.02
+    # 同一种子的读取顺序与结果可重现
+    again = run_progressive(
+        list(range(len(units))), units.__getitem__, error=0.02, min_units=10, seed=3
+    )
+    assert again.units == estimator.units
@@ -0,0 +1,99 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from catalog import load_product_catalog
+from dataset_io import list_row_groups, read_columns
+from order_items import (
+    DEFAULT_CATALOG_FILE,
+    ITEM_TYPE,
+    attach_items,
+    load_catalog,
+)
+
+ORDERS = [
+    [{'parent_category': '电子产品', 'sub_category': '智能手机', 'price': 10.0}],
+    [],
+    [
+        {'parent_category': '服装', 'sub_category': '上衣', 'price': 1.5},
+        {'parent_category': '食品', 'sub_category': '零食', 'price': 2.0},
+    ],
+    [{'parent_category': '未知', 'sub_category': '未知', 'price': 0.0}],
+    [{'parent_category': '服装', 'sub_category': '裤子', 'price': 3.0}],
+]
+
+
+def write_orders(path, **columns):
+    """按每行组2行写出，文件的行组数多于1"""
+    pq.write_table(pa.table(columns), path, row_group_size=2)
+    assert len(list_row_groups(path)) > 1
+
+
+def as_dicts(items):
+    """OrderItems -> 每单的商品字典列表，便于与预期比较"""
+    fields = zip(items.parent.tolist(), items.sub.tolist(), items.price.tolist())
+    flat = [{'parent_category': p, 'sub_category': s, 'price': v} for p, s, v in fields]
+    ends = np.cumsum(items.lengths).tolist()
+    return [flat[end - n : end] for end, n in zip(ends, items.lengths.tolist())]
+
+
+def test_attach_items_multiple_row_groups(tmp_path):
+    path = str(tmp_path / "orders.parquet")
+    write_orders(path, items=pa.array(ORDERS, type=pa.list_(ITEM_TYPE)))
+
+    items = attach_items(read_columns(path, ['items']))
+    assert as_dicts(items) == ORDERS
+    assert items.total_price().tolist() == [10.0, 0.0, 3.5, 0.0, 3.0]
+    assert items.category_sets() == [
+        ('电子产品',),
+        (),
+        ('服装', '食品'),
+        ('未知',),
+        ('服装',),
+    ]
+    assert items.contains('parent_category', '服装').tolist() == [
+        False,
+        False,
+        True,
+        False,
+        True,
+    ]
+
+
+def test_attach_items_item_ids_multiple_row_groups(tmp_path):
+    product_map = load_product_catalog(DEFAULT_CATALOG_FILE)
+    ids = sorted(product_map)[:4]
+    orders = [[ids[0], ids[1]], [], [ids[2]], [-1], [ids[3], ids[0]]]
+    path = str(tmp_path / "orders.parquet")
+    write_orders(path, item_ids=pa.array(orders, type=pa.list_(pa.int32())))
+
+    items = as_dicts(
+        attach_items(
+            read_columns(path, ['item_ids']), load_catalog(DEFAULT_CATALOG_FILE)
+        )
+    )
+    assert [len(order) for order in items] == [2, 0, 1, 1, 2]
+    assert items[0][1]['sub_category'] == product_map[ids[1]]['sub_category']
+    assert items[3] == [
+        {'parent_category': '未知', 'sub_category': '未知', 'price': 0.0}
+    ]
+    assert items[4][0]['price'] == product_map[ids[3]]['price']
+
+
+def test_attach_items_json_errors():
+    df = pd.DataFrame(
+        {
+            'items_json': [
+                json.dumps(ORDERS[2], ensure_ascii=False),
+                '{bad',
+                json.dumps([{'parent_category': '服装'}], ensure_ascii=False),
+                '[]',
+            ]
+        }
+    )
+    items = attach_items(df)
+    assert [position for position, _, _ in items.errors] == [1, 2]
+    assert items.valid.tolist() == [True, False, False, True]
+    assert as_dicts(items) == [ORDERS[2], [], [], []]
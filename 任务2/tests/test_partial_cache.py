@@ -0,0 +1,22 @@
+import os
+
+from partial_cache import PartialCache
+from pipeline import code_fingerprint
+
+
+def test_key_changes_with_code(tmp_path):
+    data = tmp_path / "data.parquet"
+    data.write_bytes(b"PAR1" + b"x" * 100)
+    script = tmp_path / "analysis.py"
+    script.write_text("import partial_cache\nTOTAL = 1\n", encoding='utf-8')
+
+    def cache():
+        return PartialCache(
+            str(tmp_path / "cache"), "a", {'k': 1}, code=code_fingerprint(str(script))
+        )
+
+    cache().save(str(data), {'total': 1})
+    assert cache().load(str(data)) == {'total': 1}
+    script.write_text("import partial_cache\nTOTAL = 2\n", encoding='utf-8')
+    assert cache().load(str(data)) is None
+    assert os.listdir(tmp_path / "cache" / "a")
@@ -0,0 +1,56 @@
+import os
+import json
+
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+from dataset_io import arrow_path, list_row_groups
+from stages import TASK2_DIR, load_script
+
+preprocess = load_script(os.path.join(TASK2_DIR, "0_preprocess.py"), "test_preprocess")
+PRODUCT_MAP = {1: {'parent_category': '服装', 'sub_category': '上衣', 'price': 5.0}}
+
+
+def record(*ids):
+    return json.dumps(
+        {'purchase_date': '2024-01-02', 'items': [{'id': i} for i in ids]}
+    )
+
+
+def test_item_ids_are_validated():
+    processed = preprocess.process_purchase_history(record(1, 7), PRODUCT_MAP)
+    assert processed['item_ids'] == [1, 7]
+    assert [i['parent_category'] for i in processed['items']] == ['服装', '未知']
+    for bad in ["sku-9", 1.5, True, 2**31]:
+        with pytest.raises((TypeError, ValueError)):
+            preprocess.process_purchase_history(record(1, bad), PRODUCT_MAP)
+
+
+@pytest.mark.parametrize('profile', ['balanced', 'compact'])
+def test_write_processed_empty_frame(tmp_path, profile):
+    full = str(tmp_path / "full.parquet")
+    empty = str(tmp_path / "empty.parquet")
+    row = {'user_id': 1, 'payment_method': '现金', 'payment_status': '已支付'}
+    row.update(preprocess.process_purchase_history(record(1), PRODUCT_MAP))
+    preprocess.write_processed(
+        pd.DataFrame([row]), full, preprocess.OUTPUT_PROFILES[profile]
+    )
+    preprocess.write_processed(
+        pd.DataFrame([]), empty, preprocess.OUTPUT_PROFILES[profile]
+    )
+    assert pq.read_metadata(empty).num_rows == 0
+    assert (
+        pq.read_schema(empty).remove_metadata()
+        == pq.read_schema(full).remove_metadata()
+    )
+
+
+def test_arrow_batches_match_row_groups(tmp_path):
+    path = str(tmp_path / "part.parquet")
+    row = {'user_id': 1, 'payment_method': '现金', 'payment_status': '已支付'}
+    row.update(preprocess.process_purchase_history(record(1), PRODUCT_MAP))
+    profile = dict(preprocess.OUTPUT_PROFILES['balanced'], row_group_size=4)
+    preprocess.write_processed(pd.DataFrame([row] * 10), path, profile, "both")
+    units = [(0, 0, 4), (1, 4, 4), (2, 8, 2)]
+    assert list_row_groups(path) == units
+    assert list_row_groups(arrow_path(path)) == units
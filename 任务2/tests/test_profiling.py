@@ -0,0 +1,42 @@
+import threading
+
+from profiling import SamplingProfiler, TracingProfiler
+
+
+def work(n):
+    return sum(i * i for i in range(n))
+
+
+def run_threads(target, count=4):
+    threads = [threading.Thread(target=target) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_tracing_profiler_merges_threads():
+    profiler = TracingProfiler()
+    profiler.start()
+    try:
+        run_threads(lambda: [work(1000) for _ in range(50)])
+    finally:
+        profiler.stop()
+    stacks = profiler.collapsed()
+    work_paths = [
+        path for path in stacks if path.rsplit(';', 1)[-1].startswith('work ')
+    ]
+    assert work_paths
+    assert all(stacks[path] > 0 for path in work_paths)
+
+
+def test_sampling_profiler_collects_main_thread():
+    profiler = SamplingProfiler(interval=0.001)
+    profiler.start()
+    try:
+        for _ in range(200):
+            work(5000)
+            profiler.collapsed()
+    finally:
+        profiler.stop()
+    assert any('work' in path for path in profiler.collapsed())
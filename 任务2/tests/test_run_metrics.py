@@ -0,0 +1,23 @@
+import time
+
+import numpy as np
+import pytest
+
+from run_metrics import RunMetrics, current_rss_mb
+
+
+@pytest.mark.skipif(current_rss_mb() is None, reason="无法读取常驻内存")
+def test_phase_memory_is_per_phase():
+    metrics = RunMetrics("test")
+    with metrics.phase('allocate') as m:
+        data = np.ones(200 * 1024**2 // 8)
+        time.sleep(0.2)
+        del data
+    with metrics.phase('idle'):
+        time.sleep(0.1)
+    allocate, idle = metrics.records.values()
+    assert allocate.peak_rss_mb - allocate.rss_start_mb >= 150
+    assert abs(allocate.rss_delta_mb) < 50
+    # 之前阶段的峰值不会计入后续阶段
+    assert idle.peak_rss_mb < allocate.peak_rss_mb - 150
+    assert m.to_dict()['rss_delta_mb'] == allocate.rss_delta_mb
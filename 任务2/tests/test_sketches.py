@@ -0,0 +1,110 @@
+import numpy as np
+import pytest
+
+from collections import Counter
+
+from sketches import (
+    HeavyHitters,
+    HyperLogLog,
+    SpaceSaving,
+    rollup_distinct,
+    write_hll_table,
+)
+
+
+@pytest.mark.parametrize('n', [1000, 20000, 300000])
+def test_hll_error_within_bounds(n):
+    sketch = HyperLogLog(precision=12)
+    ids = np.arange(n, dtype=np.int64)
+    sketch.add_ints(ids)
+    sketch.add_ints(ids[: n // 2])  # 重复ID不影响去重数
+    # 相对标准误差 1.04 / √4096 ≈ 1.6%，取4倍标准误差
+    assert abs(sketch.count() - n) <= 4 * 1.04 / 64 * n
+
+
+def test_hll_small_cardinality_is_near_exact():
+    sketch = HyperLogLog(precision=12)
+    sketch.add_ints(np.arange(100))
+    # 线性计数只受寄存器碰撞影响（期望约 100² / 2m ≈ 1.2 次）
+    assert abs(sketch.count() - 100) <= 5
+
+
+def test_hll_merge_is_union():
+    a, b, union = HyperLogLog(), HyperLogLog(), HyperLogLog()
+    a.add_ints(np.arange(0, 6000))
+    b.add_ints(np.arange(4000, 10000))
+    union.add_ints(np.arange(0, 10000))
+    a.merge(HyperLogLog.from_text(b.to_text()))
+    assert np.array_equal(a.registers, union.registers)
+    with pytest.raises(ValueError):
+        a.merge(HyperLogLog(precision=11))
+
+
+def test_rollup_distinct_merges_rows(tmp_path):
+    sketches = {}
+    for month, (lo, hi) in {'2024-01': (0, 3000), '2024-02': (2000, 5000)}.items():
+        for category in ['服装', '食品']:
+            sketch = HyperLogLog()
+            sketch.add_ints(np.arange(lo, hi))
+            sketches[(category, month)] = sketch
+    path = str(tmp_path / "distinct.parquet")
+    write_hll_table(path, ['parent_category', 'month'], sketches)
+    total = rollup_distinct(path, by=['parent_category'])
+    assert list(total['parent_category']) == ['服装', '食品']
+    assert all(abs(total['distinct'] - 5000) <= 4 * 1.04 / 64 * 5000)
+    january = rollup_distinct(path, month='2024-01')
+    assert abs(january['distinct'][0] - 3000) <= 4 * 1.04 / 64 * 3000
+
+
+def zipf_stream(seed, n=50000, keys=2000):
+    rng = np.random.default_rng(seed)
+    ranks = np.minimum(rng.zipf(1.3, n), keys)
+    return [(f"c{r}", f"d{r % 7}") for r in ranks]
+
+
+def test_space_saving_bounds_after_merge():
+    capacity = 100
+    parts = [zipf_stream(seed) for seed in range(4)]
+    truth = Counter(key for part in parts for key in part)
+    summary = SpaceSaving(capacity)
+    for part in parts:
+        # 各文件分别摘要再合并，与实际的按文件缓存一致
+        partial = SpaceSaving(capacity)
+        for start in range(0, len(part), 5000):
+            partial.update(Counter(part[start : start + 5000]))
+        summary.merge(partial)
+
+    total = sum(truth.values())
+    assert summary.total == total
+    assert len(summary.counts) <= capacity
+    for key, count in summary.counts.items():
+        error = summary.errors[key]
+        assert count - error <= truth[key] <= count
+        assert error <= total / capacity
+    floor = summary.min_count()
+    for key, true_count in truth.items():
+        if key not in summary.counts:
+            assert true_count <= floor
+        # 频次超过 total / capacity 的键一定被保留
+        if true_count > total / capacity:
+            assert key in summary.counts
+
+
+def test_heavy_hitters_estimates_bracket_truth():
+    stream = zipf_stream(7)
+    truth = Counter(stream)
+    hitters = HeavyHitters(capacity=50, epsilon=0.001, delta=0.01)
+    for key in stream:
+        hitters.add(key)
+    restored = HeavyHitters.from_dict(hitters.to_dict())
+    assert restored.top() == hitters.top()
+
+    bound = hitters.error_bound()
+    top = hitters.top()
+    assert [estimate for _, estimate, _ in top] == sorted(
+        (estimate for _, estimate, _ in top), reverse=True
+    )
+    for key, estimate, lower in top:
+        assert lower <= truth[key] <= estimate <= truth[key] + bound
+    most_common = [key for key, _ in truth.most_common(5)]
+    assert [key for key, _, _ in top[:5]] == most_common
@@ -0,0 +1,38 @@
+import random
+from collections import Counter
+
+from spill import ExternalSorter, SpillingCounter
+
+
+def test_spilling_counter_matches_in_memory(tmp_path):
+    rng = random.Random(0)
+    keys = [(rng.choice("abcdefgh"), rng.randrange(500)) for _ in range(20000)]
+    with SpillingCounter(budget_bytes=20000, spill_dir=str(tmp_path)) as counter:
+        for key in keys:
+            counter.add(key)
+        assert counter.runs > 1
+        assert dict(counter.items()) == Counter(keys)
+
+
+def test_spilling_counter_without_spill(tmp_path):
+    with SpillingCounter(budget_bytes=10**9, spill_dir=str(tmp_path)) as counter:
+        counter.add('a', 2)
+        counter.add('a', 3)
+        assert counter.runs == 0
+        assert dict(counter.items()) == {'a': 5}
+
+
+def test_external_sort_is_stable(tmp_path):
+    rng = random.Random(1)
+    records = [(rng.randrange(100), i) for i in range(10000)]
+    with ExternalSorter(
+        budget_bytes=30000,
+        key=lambda r: r[0],
+        spill_dir=str(tmp_path),
+        chunk_records=50,
+    ) as sorter:
+        for record in records:
+            sorter.add(record)
+        assert sorter.runs > 1
+        # 与内存中的稳定排序完全一致：键相同的记录保持加入顺序
+        assert list(sorter.sorted()) == sorted(records, key=lambda r: r[0])
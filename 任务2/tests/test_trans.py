@@ -0,0 +1,39 @@
+import os
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from stages import TASK1_DIR, load_script
+
+trans = load_script(os.path.join(TASK1_DIR, "trans.py"), "test_trans")
+
+
+@pytest.fixture
+def parquet_file(tmp_path, monkeypatch):
+    path = str(tmp_path / "data.parquet")
+    pq.write_table(pa.table({'id': list(range(1000))}), path, row_group_size=300)
+    monkeypatch.setattr(trans, 'batch_size', 100)
+    return pq.ParquetFile(path)
+
+
+@pytest.mark.parametrize(
+    'start, stop', [(0, 1000), (250, 620), (299, 301), (500, 500), (0, 0), (950, 2000)]
+)
+def test_iter_range_rows(parquet_file, start, stop):
+    batches = trans.iter_range(parquet_file, start, stop)
+    ids = [i for batch in batches for i in batch.column('id').to_pylist()]
+    assert ids == list(range(start, min(stop, 1000)))
+
+
+def test_iter_range_stops_at_stop(parquet_file, monkeypatch):
+    read = []
+    iter_row_groups = trans.iter_row_groups
+
+    def counting(*args, **kwargs):
+        for rg, batch in iter_row_groups(*args, **kwargs):
+            read.append(batch.num_rows)
+            yield rg, batch
+
+    monkeypatch.setattr(trans, 'iter_row_groups', counting)
+    list(trans.iter_range(parquet_file, 0, 150))
+    assert read == [100, 100]
@@ -0,0 +1,220 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from run_metrics import RunMetrics, parquet_bytes
+from profiling import run_profiled
+from dead_letter import DeadLetterSink
+from partial_cache import file_fingerprint
+from catalog import PARENT_CATEGORIES, load_product_catalog, product_map_fingerprint
+
+# 配置参数
+input_dir = "C:/Users/East/Desktop/原数据/30G_data_new"  # 原始数据目录
+output_dir = "C:/Users/East/Desktop/预处理数据/user_features"  # 特征表目录
+PRODUCT_CATALOG_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "product_catalog.json"
+)
+refund_statuses = ["已退款", "部分退款"]
+
+FEATURE_FILE = "user_features.parquet"
+MANIFEST_FILE = "user_features.manifest.json"  # 已并入特征表的文件及其指纹
+
+# 特征表结构：每个用户一行
+#   人口属性取最新文件中的值；消费类特征可直接按用户相加，新文件到达时增量合并
+DEMOGRAPHIC_COLUMNS = ['age', 'income', 'gender']
+SPEND_COLUMNS = [f"spend_{c}" for c in PARENT_CATEGORIES]
+SHARE_COLUMNS = [f"share_{c}" for c in PARENT_CATEGORIES]
+SUM_COLUMNS = [
+    'total_spend',
+    'order_count',
+    'item_count',
+    'refund_count',
+] + SPEND_COLUMNS
+
+metrics = RunMetrics("user_features")
+dead_letters = DeadLetterSink("user_features")
+
+
+def aggregate_users(frame):
+    """按用户合并：消费类特征求和，人口属性取最后出现的值"""
+    agg = {c: 'sum' for c in SUM_COLUMNS}
+    agg.update({c: 'last' for c in DEMOGRAPHIC_COLUMNS})
+    return frame.groupby('user_id', sort=False).agg(agg).reset_index()
+
+
+def compute_file_features(file_path, product_map):
+    """单个原始文件 -> 按用户聚合的部分特征"""
+    file = os.path.basename(file_path)
+    columns = ['id', 'age', 'income', 'gender', 'purchase_history']
+    with metrics.phase('read', file=file) as m:
+        df = pd.read_parquet(file_path, columns=columns)
+        m.rows = len(df)
+        m.bytes = parquet_bytes(file_path, columns)
+
+    with metrics.phase('decode', file=file) as m:
+        n = len(df)
+        category_index = {c: i for i, c in enumerate(PARENT_CATEGORIES)}
+        valid = np.zeros(n, dtype=bool)
+        total_spend = np.zeros(n)
+        item_count = np.zeros(n, dtype=np.int32)
+        refund_count = np.zeros(n, dtype=np.int32)
+        category_spend = np.zeros((n, len(PARENT_CATEGORIES)))
+
+        for row, record in enumerate(df['purchase_history']):
+            try:
+                history = json.loads(record)
+                items = history.get('items', [])
+                for item in items:
+                    product = product_map.get(item['id'])
+                    if product is not None:  # 目录中查不到的商品没有价格
+                        index = category_index[product['parent_category']]
+                        category_spend[row, index] += product['price']
+                # 与用户画像的口径一致：平均单价 × 商品数
+                total_spend[row] = history.get('average_price', 0) * len(items)
+                item_count[row] = len(items)
+                refund_count[row] = history.get('payment_status') in refund_statuses
+            except Exception as e:
+                category_spend[row] = 0.0
+                dead_letters.add(file, row, e, record)
+                continue
+            valid[row] = True
+        m.rows = n
+
+    with metrics.phase('aggregate', file=file) as m:
+        frame = pd.DataFrame(
+            {
+                'user_id': df['id'].to_numpy(),
+                'age': df['age'].to_numpy(),
+                'income': df['income'].to_numpy(),
+                'gender': df['gender'].to_numpy(),
+                'total_spend': total_spend,
+                'order_count': np.ones(n, dtype=np.int32),
+                'item_count': item_count,
+                'refund_count': refund_count,
+            }
+        )
+        frame[SPEND_COLUMNS] = category_spend
+        partial = aggregate_users(frame[valid])
+        m.rows = int(valid.sum())
+    return partial
+
+
+def finalize(frame):
+    """
+    计算各父类别消费占比，并转换为紧凑类型，按用户ID排序便于按ID查找
+
+    消费额是增量合并时继续累加的部分和，保持float64，保证增量合并与全量重建
+    结果一致；只有由它算出的占比在写出时降为float32。年龄可能缺失，为可空整数。
+    """
+    result = frame.sort_values('user_id', ignore_index=True)
+    result = result.astype(
+        {
+            'user_id': 'int64',
+            'age': 'Int16',
+            'income': 'float64',
+            'gender': 'category',
+            'total_spend': 'float64',
+            'order_count': 'int32',
+            'item_count': 'int32',
+            'refund_count': 'int32',
+            **{c: 'float64' for c in SPEND_COLUMNS},
+        }
+    )
+    spend = result[SPEND_COLUMNS].to_numpy(dtype='float64')
+    spend_sum = spend.sum(axis=1, keepdims=True)
+    shares = np.divide(spend, spend_sum, out=np.zeros_like(spend), where=spend_sum > 0)
+    result[SHARE_COLUMNS] = shares.astype('float32')
+    return result[['user_id'] + DEMOGRAPHIC_COLUMNS + SUM_COLUMNS + SHARE_COLUMNS]
+
+
+def load_manifest():
+    try:
+        with open(os.path.join(output_dir, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_features(frame, manifest):
+    """原子写出特征表与清单"""
+    feature_path = os.path.join(output_dir, FEATURE_FILE)
+    tmp_path = f"{feature_path}.tmp"
+    pq.write_table(
+        pa.Table.from_pandas(frame, preserve_index=False),
+        tmp_path,
+        compression='zstd',
+        row_group_size=65536,
+    )
+    os.replace(tmp_path, feature_path)
+    with open(os.path.join(output_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return feature_path
+
+
+def main():
+    os.makedirs(output_dir, exist_ok=True)
+    feature_path = os.path.join(output_dir, FEATURE_FILE)
+
+    files = {
+        f: file_fingerprint(os.path.join(input_dir, f))
+        for f in sorted(os.listdir(input_dir))
+        if f.endswith(".parquet")
+    }
+    # 按解析后的目录计算指纹：CATEGORY_TREE 调整导致的重新归类同样需要重建
+    product_map = load_product_catalog(PRODUCT_CATALOG_FILE)
+    catalog = product_map_fingerprint(product_map)
+    manifest = load_manifest()
+    previous = manifest.get('files', {})
+
+    # 已并入的文件被修改/删除或商品目录变化时，求和结果无法扣减，只能全量重建
+    rebuild = (
+        not os.path.exists(feature_path)
+        or manifest.get('catalog') != catalog
+        or any(files.get(f) != fp for f, fp in previous.items())
+    )
+    new_files = [f for f in files if rebuild or f not in previous]
+    # 已并入且本次不重新处理的文件保留上次的隔离记录
+    dead_letters.open(output_dir, keep=[f for f in files if f not in new_files])
+    if not new_files:
+        print(f"特征表已是最新（{len(previous)} 个文件）：{feature_path}")
+        dead_letters.close(metrics)
+        metrics.write(output_dir)
+        return feature_path
+    print(
+        f"{'全量重建' if rebuild else '增量更新'}特征表：处理 {len(new_files)} 个文件"
+    )
+
+    partials = []
+    if not rebuild:
+        with metrics.phase('read', file=FEATURE_FILE) as m:
+            partials.append(
+                pd.read_parquet(
+                    feature_path,
+                    columns=['user_id'] + DEMOGRAPHIC_COLUMNS + SUM_COLUMNS,
+                )
+            )
+            m.rows = len(partials[0])
+    for file in new_files:
+        partials.append(
+            compute_file_features(os.path.join(input_dir, file), product_map)
+        )
+
+    with metrics.phase('aggregate', file=FEATURE_FILE) as m:
+        features = finalize(aggregate_users(pd.concat(partials, ignore_index=True)))
+        m.rows = len(features)
+
+    with metrics.phase('write', file=FEATURE_FILE) as m:
+        write_features(features, {'catalog': catalog, 'files': files})
+        m.rows = len(features)
+        m.bytes = os.path.getsize(feature_path)
+
+    print(f"特征表已保存至：{feature_path}（{len(features):,} 个用户）")
+    dead_letters.close(metrics)
+    metrics.write(output_dir)
+    return feature_path
+
+
+if __name__ == "__main__":
+    run_profiled(main, output_dir, "user_features")